@@ -0,0 +1,187 @@
+"""
+Benchmark the rglob directory discovery against the single-pass os.scandir walk
+used by copy_mp3_files.
+"""
+
+import argparse
+import os
+import pathlib
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Tuple
+from tools.copy_mp3_files import scan_mp3_dirs
+
+# file system calls counted while discovering
+COUNTED_CALLS = ("stat", "lstat", "scandir", "listdir")
+
+# (mp3 files, other files) keyed by MP3 directory
+DirMap = Dict[Path, Tuple[List[Path], List[Path]]]
+
+
+@contextmanager
+def count_calls() -> Iterator[Counter]:
+    """
+    Count the file system calls made through `os` and, on Python 3.10, the
+    pathlib accessor. Type checks answered from cached `DirEntry` info are free
+    and not counted.
+    """
+
+    counts: Counter = Counter()
+    patched: List[Tuple[object, str, object]] = []
+
+    def counting(name: str, func: Callable) -> Callable:
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    targets: List[object] = [os]
+    accessor = getattr(pathlib, "_NormalAccessor", None)
+    if accessor is not None:
+        targets.append(accessor)
+
+    for target in targets:
+        for name in COUNTED_CALLS:
+            original = target.__dict__.get(name)
+            if original is None:
+                continue
+            wrapper = counting(name, original)
+            if target is not os:
+                wrapper = staticmethod(wrapper)
+            setattr(target, name, wrapper)
+            patched.append((target, name, original))
+
+    try:
+        yield counts
+    finally:
+        for target, name, original in patched:
+            setattr(target, name, original)
+
+
+def create_tree(root_dir: Path, artists: int, albums: int, tracks: int) -> int:
+    """
+    Create an artist/album tree of empty files with an artwork and info file per
+    album. Returns the number of files created.
+    """
+
+    count = 0
+    for artist in range(artists):
+        for album in range(albums):
+            album_dir = root_dir / f"Artist {artist:04d}" / f"Album {album:02d}"
+            album_dir.mkdir(parents=True)
+            for track in range(tracks):
+                (album_dir / f"{track + 1:02d} - Track {track + 1}.mp3").touch()
+            (album_dir / "_cover.jpg").touch()
+            (album_dir / "info.txt").touch()
+            count += tracks + 2
+    return count
+
+
+def rglob_discovery(source_dir: Path) -> DirMap:
+    """
+    Discover MP3 directories the way copy_mp3_files did before the single-pass
+    walk: rglob the tree, list every directory again to find MP3 files, then
+    rglob each MP3 directory for its files.
+    """
+
+    def is_mp3_dir(user_dir: Path) -> bool:
+        if not user_dir.exists() or not user_dir.is_dir():
+            return False
+        for item in user_dir.iterdir():
+            if item.is_file() and item.suffix == ".mp3":
+                return True
+        return False
+
+    mp3_dirs = sorted(
+        item for item in source_dir.rglob("*") if item.is_dir() and is_mp3_dir(item)
+    )
+
+    dir_map: DirMap = {}
+    for mp3_dir in mp3_dirs:
+        mp3_files: List[Path] = []
+        other_files: List[Path] = []
+        for source_file in mp3_dir.rglob("*"):
+            if not source_file.is_file():
+                continue
+            if source_file.suffix.lower() == ".mp3":
+                mp3_files.append(source_file)
+            else:
+                other_files.append(source_file)
+        dir_map[mp3_dir] = (sorted(mp3_files), sorted(other_files))
+    return dir_map
+
+
+def scandir_discovery(source_dir: Path) -> DirMap:
+    """
+    Discover MP3 directories with the single-pass os.scandir walk.
+    """
+
+    return {
+        mp3_dir["path"]: (mp3_dir["mp3_files"], mp3_dir["other_files"])
+        for mp3_dir in scan_mp3_dirs(source_dir=source_dir)
+    }
+
+
+def bench_copy_discovery(artists: int, albums: int, tracks: int) -> None:
+    """
+    Main entry point.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        source_dir = Path(temp_dir)
+        file_count = create_tree(source_dir, artists, albums, tracks)
+        print(f"Created {file_count} files in {artists * albums} albums.")
+
+        results = []
+        dir_maps = []
+        for name, discover in (
+            ("rglob", rglob_discovery),
+            ("scandir", scandir_discovery),
+        ):
+            with count_calls() as counts:
+                start = time.perf_counter()
+                dir_maps.append(discover(source_dir))
+                elapsed = time.perf_counter() - start
+            results.append((name, elapsed, counts))
+
+        if dir_maps[0] != dir_maps[1]:
+            raise RuntimeError("Discovery results differ.")
+
+    print("Results".center(72, "-"))
+    for name, elapsed, counts in results:
+        calls = ", ".join(f"{call} {counts[call]}" for call in COUNTED_CALLS)
+        print(
+            name.ljust(10)
+            + f"{elapsed:.2f}s".rjust(8)
+            + f"{sum(counts.values())} calls".rjust(16)
+            + f"  ({calls})"
+        )
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Compare rglob discovery with the single-pass os.scandir walk "
+        "on a synthetic library.",
+        usage="python -m benchmarks.bench_copy_discovery [--artists ARTISTS] "
+        "[--albums ALBUMS] [--tracks TRACKS]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--artists", type=int, default=500, help="Number of artist folders."
+    )
+    parser.add_argument(
+        "--albums", type=int, default=10, help="Number of albums per artist."
+    )
+    parser.add_argument(
+        "--tracks", type=int, default=18, help="Number of MP3 files per album."
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    bench_copy_discovery(artists=args.artists, albums=args.albums, tracks=args.tracks)
@@ -0,0 +1,104 @@
+"""
+Benchmark download_mp3 against a fake yt_dlp backend.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Optional
+import yt_dlp
+from yt_music import download
+from benchmarks.fake_ytdlp import FakeYoutubeDL, install_fake_ffmpeg
+
+PLAYLIST_URL = "https://music.youtube.com/playlist?list=OLAK5uy_fake"
+
+
+def run_once(jobs: int, transcode_jobs: Optional[int]) -> float:
+    """
+    Download the fixture playlist into a temporary home directory.
+    Returns the elapsed time in seconds.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.environ["HOME"] = temp_dir
+        (Path(temp_dir) / "Downloads").mkdir()
+
+        start = time.perf_counter()
+        download.download_mp3(
+            youtube_url=PLAYLIST_URL,
+            artist="Artist",
+            album="Album",
+            year=2025,
+            jobs=jobs,
+            transcode_jobs=transcode_jobs,
+        )
+        return time.perf_counter() - start
+
+
+def bench_download_mp3(
+    jobs_list: List[int],
+    latency: float,
+    transcode_time: float,
+    transcode_jobs: Optional[int] = None,
+) -> None:
+    """
+    Main entry point.
+    """
+
+    FakeYoutubeDL.latency = latency
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+
+    home = os.environ.get("HOME")
+    with tempfile.TemporaryDirectory() as bin_dir:
+        install_fake_ffmpeg(Path(bin_dir), cpu_time=transcode_time)
+        try:
+            results = [(jobs, run_once(jobs, transcode_jobs)) for jobs in jobs_list]
+        finally:
+            if home is not None:
+                os.environ["HOME"] = home
+
+    baseline = results[0][1]
+    print("Results".center(40, "-"))
+    for jobs, elapsed in results:
+        print(
+            f"jobs={jobs}".ljust(10)
+            + f"{elapsed:.2f}s".rjust(10)
+            + f"{baseline / elapsed:.2f}x".rjust(10)
+        )
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Benchmark download_mp3 with a stubbed yt_dlp.YoutubeDL.",
+        usage="python -m benchmarks.bench_download_mp3 [--jobs JOBS ...] "
+        "[--latency LATENCY] [--transcode-time TIME] [--transcode-jobs JOBS]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--jobs", type=int, nargs="+", default=[1, 4, 8], help="Pool sizes to run."
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.5, help="Fake download time per track."
+    )
+    parser.add_argument(
+        "--transcode-time",
+        type=float,
+        default=0.2,
+        help="Fake CPU time per transcode.",
+    )
+    parser.add_argument(
+        "--transcode-jobs", type=int, help="Number of transcode workers."
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    bench_download_mp3(
+        jobs_list=args.jobs,
+        latency=args.latency,
+        transcode_time=args.transcode_time,
+        transcode_jobs=args.transcode_jobs,
+    )
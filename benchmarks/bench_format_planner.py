@@ -0,0 +1,100 @@
+"""
+Compare the bytes fetched with the format planner against `bestaudio/best` on
+the bundled video info fixtures. The planner's guarantees are checked by
+`tests/test_formats.py`.
+"""
+
+import argparse
+import sys
+from typing import List, Tuple
+from yt_music.utils.formats import (
+    OUTPUT_CODECS,
+    FormatInfo,
+    estimate_duration,
+    get_baseline_format,
+    get_filesize,
+    is_audio_only,
+    plan_audio_format,
+)
+from benchmarks.fake_ytdlp import load_fixture
+
+# fixtures with a full formats list
+FORMAT_FIXTURES = ("video_info.json", "video_song_info.json")
+
+
+def bench_format_planner(target_bitrates: List[int]) -> int:
+    """
+    Main entry point. Returns the exit status, 1 if no format is chosen for a case.
+    """
+
+    cases: List[Tuple[str, List[FormatInfo]]] = []
+    for fixture in FORMAT_FIXTURES:
+        formats = load_fixture(fixture)["formats"]
+        cases.append((fixture, formats))
+        # a video whose audio is only served together with the picture
+        cases.append(
+            (f"{fixture} (no audio-only)", [f for f in formats if not is_audio_only(f)])
+        )
+
+    failures = 0
+    print(
+        "Case".ljust(40)
+        + "Output".ljust(8)
+        + "Target".rjust(8)
+        + "Format".rjust(10)
+        + "Size".rjust(12)
+        + "Baseline".rjust(12)
+        + "Avoided".rjust(12)
+    )
+    for case, formats in cases:
+        baseline = get_baseline_format(formats)
+        baseline_size = get_filesize(baseline) if baseline is not None else None
+        for output_format in OUTPUT_CODECS:
+            for target_bitrate in target_bitrates:
+                plan = plan_audio_format(
+                    formats=formats,
+                    output_format=output_format,
+                    target_bitrate=target_bitrate,
+                    duration=estimate_duration(formats),
+                )
+                if plan is None:
+                    print(f"\tFAILED: no format chosen for {case} {output_format}")
+                    failures += 1
+                else:
+                    print(
+                        case.ljust(40)
+                        + output_format.ljust(8)
+                        + f"{target_bitrate}k".rjust(8)
+                        + plan["format_id"].rjust(10)
+                        + f"{plan['filesize'] / 1e6:.2f} MB".rjust(12)
+                        + f"{(baseline_size or 0) / 1e6:.2f} MB".rjust(12)
+                        + f"{plan['bytes_avoided'] / 1e6:.2f} MB".rjust(12)
+                    )
+
+    if failures:
+        print(f"{failures} cases without a format.")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Report the bytes the format planner avoids compared to "
+        "bestaudio/best on the bundled video info fixtures.",
+        usage="python -m benchmarks.bench_format_planner [--target-bitrates ...]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--target-bitrates",
+        type=int,
+        nargs="+",
+        default=[64, 96, 128, 160],
+        help="Target bitrates in kbps to plan for.",
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    sys.exit(bench_format_planner(target_bitrates=args.target_bitrates))
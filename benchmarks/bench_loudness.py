@@ -0,0 +1,114 @@
+"""
+Benchmark ReplayGain analysis of an album with a fake ffmpeg decoder, and
+check the measured loudness of its tones.
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Optional
+from yt_music.utils.loudness import (
+    analyze_track,
+    get_integrated_loudness,
+    get_replaygain,
+)
+from benchmarks.fake_ytdlp import install_fake_ffmpeg
+
+# a stereo 1 kHz tone measures at its peak level in dBFS, within this many LU
+TOLERANCE = 0.1
+
+
+def bench_loudness(
+    tracks: int, duration: float, jobs: Optional[int], min_speed: float
+) -> int:
+    """
+    Main entry point. Returns the exit status, 1 if a track is measured wrong or
+    each process analyzes less than `min_speed` seconds of audio per second.
+    """
+
+    processes = min(jobs or os.cpu_count() or 1, tracks)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        install_fake_ffmpeg(Path(temp_dir), decode_duration=duration)
+        track_paths = [Path(temp_dir) / f"{n:02d} - Track.mp3" for n in range(tracks)]
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            measurements = list(executor.map(analyze_track, track_paths))
+        replaygains = get_replaygain(measurements)
+        seconds = time.perf_counter() - start
+
+    failures = 0
+    print("Track".ljust(20) + "Peak".rjust(10) + "LUFS".rjust(10) + "Gain".rjust(10))
+    for track_path, measurement, replaygain in zip(
+        track_paths, measurements, replaygains
+    ):
+        loudness = get_integrated_loudness(measurement["blocks"])
+        expected = 20 * math.log10(measurement["peak"])
+        print(
+            track_path.stem.ljust(20)
+            + f"{measurement['peak']:.3f}".rjust(10)
+            + f"{loudness:.2f}".rjust(10)
+            + f"{replaygain['track_gain']:+.2f}".rjust(10)
+        )
+        if abs(loudness - expected) > TOLERANCE:
+            print(f"\tFAILED: expected {expected:.2f} LUFS")
+            failures += 1
+
+    print(f"Album gain: {replaygains[0]['album_gain']:+.2f} dB")
+    speed = tracks * duration / seconds / processes
+    print(
+        f"Analyzed {tracks} tracks of {duration:.0f}s in {seconds:.2f}s "
+        f"with {processes} processes, {speed:.0f}x realtime per process."
+    )
+
+    if speed < min_speed:
+        print(f"FAILED: slower than {min_speed:.0f}x realtime.")
+        failures += 1
+
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Benchmark ReplayGain analysis of an album of synthetic tones.",
+        usage="python -m benchmarks.bench_loudness [--tracks N] [--duration SECONDS] "
+        "[--jobs JOBS] [--min-speed SPEED]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--tracks", type=int, default=20, help="Number of tracks in the album."
+    )
+    parser.add_argument(
+        "--duration", type=float, default=240, help="Length of each track in seconds."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Number of processes. Defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--min-speed",
+        type=float,
+        default=100.0,
+        help="Seconds of audio each process must analyze per second, decoding "
+        "included.",
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    sys.exit(
+        bench_loudness(
+            tracks=args.tracks,
+            duration=args.duration,
+            jobs=args.jobs,
+            min_speed=args.min_speed,
+        )
+    )
@@ -0,0 +1,221 @@
+"""
+Benchmark the rate limiter against a local stand-in server that throttles
+clients sending more than a set number of requests per second per host.
+"""
+
+import argparse
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from yt_music.utils.http import create_session, request_with_retries
+from yt_music.utils.ratelimit import (
+    configure_rate_limits,
+    get_host_stats,
+    throttle_bytes,
+)
+
+# both resolve to the stand-in server, but are paced as separate hosts
+HOSTS = ("127.0.0.1", "localhost")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def start_server(
+    server_rps: float, body_size: int, retry_after: float
+) -> Tuple[ThreadingHTTPServer, Dict[str, int]]:
+    """
+    Start a server that answers with `body_size` bytes, or with HTTP 429 when a
+    host sent more than `server_rps` requests in the last second.
+    Returns the server and its count of throttled requests by host.
+    """
+
+    lock = threading.Lock()
+    recent: Dict[str, List[float]] = {}
+    throttled: Dict[str, int] = {}
+    body = b"\0" * body_size
+
+    class Handler(BaseHTTPRequestHandler):
+        """Stand-in for a rate limited service."""
+
+        def do_GET(self) -> None:  # pylint: disable=invalid-name
+            host = (self.headers.get("Host") or "").split(":")[0]
+            now = time.monotonic()
+            with lock:
+                times = [t for t in recent.get(host, []) if now - t < 1.0]
+                times.append(now)
+                recent[host] = times
+                over_limit = len(times) > server_rps
+                if over_limit:
+                    throttled[host] = throttled.get(host, 0) + 1
+
+            if over_limit:
+                self.send_response(429)
+                self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, throttled
+
+
+def fetch(url: str, session) -> int:
+    """
+    Download a URL through the rate limiter. Returns the bytes read.
+    """
+
+    num_bytes = 0
+    with request_with_retries(url, session=session, retries=10) as response:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            throttle_bytes(len(chunk))
+            num_bytes += len(chunk)
+    return num_bytes
+
+
+def run_once(
+    port: int,
+    requests: int,
+    workers: int,
+    requests_per_second: Optional[float],
+    max_bandwidth: Optional[float],
+) -> Tuple[float, int]:
+    """
+    Fetch `requests` URLs from each host at once. Returns the elapsed time and
+    bytes read.
+    """
+
+    configure_rate_limits(
+        requests_per_second=requests_per_second,
+        bytes_per_second=max_bandwidth * 1e6 if max_bandwidth is not None else None,
+    )
+    session = create_session(pool_size=workers)
+    urls = [f"http://{host}:{port}/{n}" for n in range(requests) for host in HOSTS]
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        num_bytes = sum(executor.map(lambda url: fetch(url, session), urls))
+    return time.perf_counter() - start, num_bytes
+
+
+def bench_rate_limit(
+    requests: int,
+    workers: int,
+    server_rps: float,
+    requests_per_second: float,
+    max_bandwidth: Optional[float],
+    body_size: int,
+) -> int:
+    """
+    Main entry point. Returns the exit status, 1 if the limited run was throttled
+    more than the unlimited one.
+    """
+
+    print(
+        "Run".ljust(12)
+        + "Host".ljust(12)
+        + "Requests".rjust(10)
+        + "429s".rjust(8)
+        + "Waited".rjust(10)
+        + "Req/s".rjust(10)
+        + "MB/s".rjust(10)
+    )
+
+    throttled_runs: List[int] = []
+    for name, rps in (("unlimited", None), ("limited", requests_per_second)):
+        server, throttled = start_server(server_rps, body_size, retry_after=0.5)
+        try:
+            seconds, num_bytes = run_once(
+                port=server.server_address[1],
+                requests=requests,
+                workers=workers,
+                requests_per_second=rps,
+                max_bandwidth=max_bandwidth if rps is not None else None,
+            )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        for host, host_stats in sorted(get_host_stats().items()):
+            print(
+                name.ljust(12)
+                + host.ljust(12)
+                + str(host_stats["requests"]).rjust(10)
+                + str(throttled.get(host, 0)).rjust(8)
+                + f"{host_stats['waited']:.1f}s".rjust(10)
+                + f"{requests / seconds:.1f}".rjust(10)
+                + f"{num_bytes / len(HOSTS) / seconds / 1e6:.2f}".rjust(10)
+            )
+        print(f"{name}: {seconds:.2f}s, {num_bytes / seconds / 1e6:.2f} MB/s in total")
+        throttled_runs.append(sum(throttled.values()))
+
+    if throttled_runs[1] > throttled_runs[0]:
+        print("FAILED: the limited run was throttled more often.")
+        return 1
+
+    print(
+        f"Throttled {throttled_runs[0]} times unlimited, {throttled_runs[1]} limited."
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Benchmark the request and bandwidth limits against a local "
+        "server that throttles with HTTP 429.",
+        usage="python -m benchmarks.bench_rate_limit [--requests N] "
+        "[--server-rps RPS] [--requests-per-second RPS] [OPTIONS]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--requests", type=int, default=40, help="Requests to send to each host."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=8, help="Number of requests sent at once."
+    )
+    parser.add_argument(
+        "--server-rps",
+        type=float,
+        default=20,
+        help="Requests per second per host the server allows before sending 429.",
+    )
+    parser.add_argument(
+        "--requests-per-second",
+        type=float,
+        default=15,
+        help="Request limit per host of the limited run.",
+    )
+    parser.add_argument(
+        "--max-bandwidth",
+        type=float,
+        help="Bandwidth limit in MB/s of the limited run.",
+    )
+    parser.add_argument(
+        "--body-size", type=int, default=256 * 1024, help="Bytes per response."
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    sys.exit(
+        bench_rate_limit(
+            requests=args.requests,
+            workers=args.workers,
+            server_rps=args.server_rps,
+            requests_per_second=args.requests_per_second,
+            max_bandwidth=args.max_bandwidth,
+            body_size=args.body_size,
+        )
+    )
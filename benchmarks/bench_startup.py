@@ -0,0 +1,147 @@
+"""
+Benchmark CLI and GUI startup time against a regression budget.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# wall time budgets in milliseconds, including interpreter startup
+CLI_BUDGET_MS = 250.0
+GUI_BUDGET_MS = 1000.0
+
+# modules that must not be imported before they are needed
+HEAVY_MODULES = ("yt_dlp", "eyed3", "requests", "PIL")
+
+GUI_SCRIPT = """
+import sys
+sys.path.insert(0, {ui_dir!r})
+from PyQt5 import QtWidgets
+from app import MainWindow
+
+app = QtWidgets.QApplication(sys.argv)
+window = MainWindow()
+window.show()
+app.processEvents()
+"""
+
+
+def run_timed(command: List[str], env: Dict[str, str]) -> Tuple[float, str]:
+    """
+    Run a command. Returns the wall time in milliseconds and its stderr.
+    """
+
+    start = time.perf_counter()
+    process = subprocess.run(
+        command, env=env, capture_output=True, text=True, check=True
+    )
+    return (time.perf_counter() - start) * 1000, process.stderr
+
+
+def get_imported_modules(importtime_output: str) -> Dict[str, float]:
+    """
+    Parse `-X importtime` output into cumulative import time in milliseconds by module.
+    """
+
+    modules: Dict[str, float] = {}
+    for line in importtime_output.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules[name.strip()] = int(cumulative_us) / 1000
+    return modules
+
+
+def bench_command(
+    name: str, command: List[str], env: Dict[str, str], runs: int, budget_ms: float
+) -> bool:
+    """
+    Time a command `runs` times and check it against the budget and heavy imports.
+    Returns `True` if the command is within budget.
+    """
+
+    timings = [run_timed(command, env)[0] for _ in range(runs)]
+    median_ms = statistics.median(timings)
+
+    _elapsed, importtime_output = run_timed(
+        [command[0], "-X", "importtime", *command[1:]], env
+    )
+    modules = get_imported_modules(importtime_output)
+    heavy = [module for module in modules if module in HEAVY_MODULES]
+
+    within_budget = median_ms <= budget_ms and not heavy
+    status = "OK" if within_budget else "REGRESSION"
+    print(
+        name.ljust(12)
+        + f"{median_ms:.0f} ms".rjust(10)
+        + f"budget {budget_ms:.0f} ms".rjust(18)
+        + f"  {status}"
+    )
+    for module in heavy:
+        print(f"\tImported at startup: {module} ({modules[module]:.0f} ms)")
+
+    return within_budget
+
+
+def bench_startup(runs: int, gui: bool) -> bool:
+    """
+    Main entry point.
+    """
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [str(ROOT_DIR / "src"), env.get("PYTHONPATH", "")]
+    )
+
+    print("Startup".center(60, "-"))
+    results = [
+        bench_command(
+            "cli --help",
+            [sys.executable, "-m", "yt_music.download", "--help"],
+            env,
+            runs,
+            CLI_BUDGET_MS,
+        )
+    ]
+
+    if gui:
+        env["QT_QPA_PLATFORM"] = env.get("QT_QPA_PLATFORM", "offscreen")
+        gui_script = GUI_SCRIPT.format(ui_dir=str(ROOT_DIR / "ui"))
+        results.append(
+            bench_command(
+                "gui show",
+                [sys.executable, "-c", gui_script],
+                env,
+                runs,
+                GUI_BUDGET_MS,
+            )
+        )
+
+    return all(results)
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Measure startup time of the CLI and GUI against a budget. "
+        "Exits with status 1 on a regression.",
+        usage="python -m benchmarks.bench_startup [--runs RUNS] [--no-gui]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Number of timed runs.")
+    parser.add_argument(
+        "--no-gui", action="store_true", help="Skip the GUI benchmark (needs PyQt5)."
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    if not bench_startup(runs=args.runs, gui=not args.no_gui):
+        sys.exit(1)
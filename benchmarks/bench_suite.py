@@ -0,0 +1,596 @@
+"""
+End-to-end benchmark suite over the fake yt_dlp backend and synthetic MP3 files.
+
+Each scenario runs in its own process so its peak RSS can be measured. Results
+are saved per commit in `benchmarks/results` and compared with the latest
+results of another commit run with the same options.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple, TypedDict
+from benchmarks.fake_ytdlp import (
+    ROOT_DIR,
+    install_fake_ffmpeg,
+    install_fake_youtube_dl,
+    track_info,
+    write_synthetic_mp3,
+)
+
+RESULTS_DIR = ROOT_DIR / "benchmarks" / "results"
+
+PLAYLIST_URL = "https://music.youtube.com/playlist?list=OLAK5uy_fake"
+
+SCENARIOS = ("download_mp3", "set_mp3_tags", "copy_mp3_files", "append_track_numbers")
+
+# relative change in throughput or p90 latency reported as a regression
+REGRESSION_THRESHOLD = 0.1
+
+
+class SuiteOptions(TypedDict):
+    """Type for the options shared by all scenarios."""
+
+    albums: int
+    files: int
+    latency: float
+    jitter: float
+    duration: float
+    transcode_time: float
+    jobs: int
+    runs: int
+
+
+class ScenarioResult(TypedDict):
+    """Type for the result of one scenario."""
+
+    scenario: str
+    items: int
+    megabytes: float
+    seconds: float
+    items_per_second: float
+    megabytes_per_second: float
+    # what one latency sample covers, e.g. a track or a whole run
+    latency_unit: str
+    p50_ms: float
+    p90_ms: float
+    p99_ms: float
+    peak_rss_mb: float
+
+
+def percentile(samples: List[float], fraction: float) -> float:
+    """
+    Return a percentile of the samples, interpolating between the closest ranks.
+    """
+
+    if not samples:
+        return 0.0
+
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def get_peak_rss_mb() -> float:
+    """
+    Return the peak resident set size of this process in megabytes.
+    """
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == "darwin":
+        return peak_rss / 1024 / 1024
+    return peak_rss / 1024
+
+
+def summarize(
+    scenario: str,
+    latencies: List[float],
+    latency_unit: str,
+    items: int,
+    num_bytes: int,
+    seconds: float,
+) -> ScenarioResult:
+    """
+    Build the result of a scenario from its latency samples and totals.
+    """
+
+    return {
+        "scenario": scenario,
+        "items": items,
+        "megabytes": num_bytes / 1e6,
+        "seconds": seconds,
+        "items_per_second": items / seconds if seconds else 0.0,
+        "megabytes_per_second": num_bytes / 1e6 / seconds if seconds else 0.0,
+        "latency_unit": latency_unit,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p90_ms": percentile(latencies, 0.9) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "peak_rss_mb": get_peak_rss_mb(),
+    }
+
+
+def create_library(library_dir: Path, albums: int, files: int, duration: float) -> int:
+    """
+    Create `albums` album folders with `files` synthetic MP3 files spread over
+    them, each with a cover image. Returns the number of bytes written.
+    """
+
+    num_bytes = 0
+    for index in range(files):
+        album_dir = library_dir / f"Artist - Album {index % albums} (2025)"
+        album_dir.mkdir(parents=True, exist_ok=True)
+        mp3_file = write_synthetic_mp3(
+            album_dir / f"{index + 1:04d} - Track {index}.mp3", duration=duration
+        )
+        num_bytes += mp3_file.stat().st_size
+    for album_dir in library_dir.iterdir():
+        (album_dir / "_Album.jpg").write_bytes(b"\xff\xd8\xff\xe0" + bytes(50_000))
+    return num_bytes
+
+
+def run_download_mp3(options: SuiteOptions, work_dir: Path) -> ScenarioResult:
+    """
+    Download the fixture playlist as `albums` albums. A latency sample is the
+    time from the start of a track's download until it is tagged.
+    """
+
+    from yt_music.download import TrackProgress, download_mp3
+
+    install_fake_youtube_dl(
+        latency=options["latency"],
+        jitter=options["jitter"],
+        duration=options["duration"],
+    )
+    (work_dir / "bin").mkdir()
+    install_fake_ffmpeg(work_dir / "bin", cpu_time=options["transcode_time"])
+    (work_dir / "Downloads").mkdir()
+
+    started: Dict[Tuple[int, int], float] = {}
+    latencies: List[float] = []
+
+    start = time.perf_counter()
+    for album in range(options["albums"]):
+
+        def progress_callback(progress: TrackProgress, album: int = album) -> None:
+            key = (album, progress["track_number"])
+            if progress["status"] == "downloading":
+                started.setdefault(key, time.perf_counter())
+            elif progress["status"] == "done" and key in started:
+                latencies.append(time.perf_counter() - started[key])
+
+        download_mp3(
+            youtube_url=PLAYLIST_URL,
+            artist="Artist",
+            album=f"Album {album}",
+            year=2025,
+            jobs=options["jobs"],
+            progress_callback=progress_callback,
+            reuse_known=False,
+        )
+    seconds = time.perf_counter() - start
+
+    num_bytes = sum(
+        mp3_file.stat().st_size for mp3_file in (work_dir / "Downloads").rglob("*.mp3")
+    )
+    return summarize(
+        "download_mp3", latencies, "track", len(latencies), num_bytes, seconds
+    )
+
+
+def run_set_mp3_tags(options: SuiteOptions, work_dir: Path) -> ScenarioResult:
+    """
+    Tag `files` synthetic MP3 files. A latency sample is one `set_mp3_tags` call.
+    """
+
+    from yt_music.utils.tags import set_mp3_tags
+
+    mp3_files = [
+        write_synthetic_mp3(work_dir / f"{index:04d}.mp3", duration=options["duration"])
+        for index in range(options["files"])
+    ]
+
+    latencies: List[float] = []
+    start = time.perf_counter()
+    for index, mp3_file in enumerate(mp3_files):
+        call_start = time.perf_counter()
+        set_mp3_tags(mp3_file=mp3_file, tags=track_info(index))
+        latencies.append(time.perf_counter() - call_start)
+    seconds = time.perf_counter() - start
+
+    num_bytes = sum(mp3_file.stat().st_size for mp3_file in mp3_files)
+    return summarize(
+        "set_mp3_tags", latencies, "file", len(mp3_files), num_bytes, seconds
+    )
+
+
+def run_copy_mp3_files(options: SuiteOptions, work_dir: Path) -> ScenarioResult:
+    """
+    Copy a library of `files` MP3 files into an empty target `runs` times.
+    A latency sample is one whole copy.
+    """
+
+    from tools.copy_mp3_files import copy_mp3_files
+
+    library_dir = work_dir / "library"
+    num_bytes = create_library(
+        library_dir, options["albums"], options["files"], options["duration"]
+    )
+
+    latencies: List[float] = []
+    for run in range(options["runs"]):
+        target_dir = work_dir / f"target-{run}"
+        target_dir.mkdir()
+        run_start = time.perf_counter()
+        copy_mp3_files(str(library_dir), str(target_dir))
+        latencies.append(time.perf_counter() - run_start)
+
+    return summarize(
+        "copy_mp3_files",
+        latencies,
+        "run",
+        options["files"] * options["runs"],
+        num_bytes * options["runs"],
+        sum(latencies),
+    )
+
+
+def run_append_track_numbers(options: SuiteOptions, work_dir: Path) -> ScenarioResult:
+    """
+    Rename a folder of `files` tagged MP3 files `runs` times, each time on a new
+    copy without a tag index. A latency sample is one whole run.
+    """
+
+    from tools.append_track_numbers import append_track_numbers
+    from yt_music.utils.tags import set_mp3_tags
+
+    latencies: List[float] = []
+    num_bytes = 0
+    for run in range(options["runs"]):
+        music_dir = work_dir / f"album-{run}"
+        music_dir.mkdir()
+        for index in range(options["files"]):
+            tags = track_info(index)
+            mp3_file = write_synthetic_mp3(
+                music_dir / f"{tags['title']}.mp3", duration=options["duration"]
+            )
+            set_mp3_tags(mp3_file=mp3_file, tags=tags)
+            num_bytes += mp3_file.stat().st_size
+
+        run_start = time.perf_counter()
+        append_track_numbers(str(music_dir))
+        latencies.append(time.perf_counter() - run_start)
+
+    return summarize(
+        "append_track_numbers",
+        latencies,
+        "run",
+        options["files"] * options["runs"],
+        num_bytes,
+        sum(latencies),
+    )
+
+
+SCENARIO_RUNNERS: Dict[str, Callable[[SuiteOptions, Path], ScenarioResult]] = {
+    "download_mp3": run_download_mp3,
+    "set_mp3_tags": run_set_mp3_tags,
+    "copy_mp3_files": run_copy_mp3_files,
+    "append_track_numbers": run_append_track_numbers,
+}
+
+
+def run_scenario(scenario: str, options: SuiteOptions) -> ScenarioResult:
+    """
+    Run a scenario in this process, in a temporary home directory so the
+    catalog and caches of the user are not touched. Its output is discarded.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        os.environ["HOME"] = temp_dir
+        os.environ.pop("XDG_CACHE_HOME", None)
+        os.environ.pop("XDG_DATA_HOME", None)
+        work_dir = Path(temp_dir)
+
+        with open(os.devnull, "w", encoding="utf-8") as devnull:
+            with contextlib.redirect_stdout(devnull):
+                return SCENARIO_RUNNERS[scenario](options, work_dir)
+
+
+def run_scenario_process(scenario: str, options: SuiteOptions) -> ScenarioResult:
+    """
+    Run a scenario in a new process, so its peak RSS is its own.
+    """
+
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "benchmarks.bench_suite",
+            "--scenario",
+            scenario,
+            "--options",
+            json.dumps(options),
+        ],
+        cwd=ROOT_DIR,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"Error: Scenario '{scenario}' failed. {process.stderr.strip()}"
+        )
+    return json.loads(process.stdout.splitlines()[-1])
+
+
+def get_commit() -> str:
+    """
+    Return the short hash of the checked out commit, with a `-dirty` suffix if
+    tracked files have changed, or `unknown` outside a git repository.
+    """
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        status = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+    return f"{commit}-dirty" if status else commit
+
+
+def load_previous_results(
+    results_dir: Path, commit: str, options: SuiteOptions
+) -> Optional[Dict]:
+    """
+    Return the latest saved results of another commit that ran with the same
+    options, or `None` if there are none.
+    """
+
+    previous = None
+    for results_file in results_dir.glob("*.json"):
+        try:
+            with open(results_file, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if saved.get("commit") == commit or saved.get("options") != options:
+            continue
+        if previous is None or saved["time"] > previous["time"]:
+            previous = saved
+    return previous
+
+
+def save_results(
+    results_dir: Path, commit: str, options: SuiteOptions, results: List[ScenarioResult]
+) -> Path:
+    """
+    Save the results of a commit, replacing earlier results of the same commit.
+    """
+
+    results_dir.mkdir(parents=True, exist_ok=True)
+    results_file = results_dir / f"{commit}.json"
+    with open(results_file, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "commit": commit,
+                "time": time.time(),
+                "options": options,
+                "results": results,
+            },
+            f,
+            indent=4,
+        )
+    return results_file
+
+
+def find_regressions(result: ScenarioResult, previous: ScenarioResult) -> List[str]:
+    """
+    Compare a result with the same scenario of an earlier commit.
+    Returns a description of each regression.
+    """
+
+    regressions: List[str] = []
+    if result["items_per_second"] < previous["items_per_second"] * (
+        1 - REGRESSION_THRESHOLD
+    ):
+        regressions.append(
+            f"throughput {previous['items_per_second']:.1f}"
+            f" -> {result['items_per_second']:.1f}/s"
+        )
+    if result["p90_ms"] > previous["p90_ms"] * (1 + REGRESSION_THRESHOLD):
+        regressions.append(f"p90 {previous['p90_ms']:.1f} -> {result['p90_ms']:.1f} ms")
+    return regressions
+
+
+def bench_suite(
+    scenarios: List[str],
+    options: SuiteOptions,
+    results_dir: Path = RESULTS_DIR,
+    save: bool = True,
+) -> int:
+    """
+    Main entry point. Returns the exit status, 1 if a scenario regressed since
+    the previous commit.
+    """
+
+    commit = get_commit()
+    print(f"Running {len(scenarios)} scenarios at commit {commit}.")
+
+    results: List[ScenarioResult] = []
+    for scenario in scenarios:
+        print(f"Running {scenario}...")
+        results.append(run_scenario_process(scenario, options))
+
+    previous = load_previous_results(results_dir, commit, options)
+    previous_results = {
+        result["scenario"]: result for result in (previous or {}).get("results", [])
+    }
+
+    print(f"Results at {commit}".center(100, "-"))
+    print(
+        "Scenario".ljust(22)
+        + "Items/s".rjust(10)
+        + "MB/s".rjust(10)
+        + "p50 ms".rjust(11)
+        + "p90 ms".rjust(11)
+        + "p99 ms".rjust(11)
+        + "Per".rjust(7)
+        + "RSS MB".rjust(9)
+        + "Change".rjust(9)
+    )
+
+    regressions: List[str] = []
+    for result in results:
+        change = ""
+        previous_result = previous_results.get(result["scenario"])
+        if previous_result is not None and previous_result["items_per_second"]:
+            change = f"{result['items_per_second'] / previous_result['items_per_second'] - 1:+.0%}"
+            regressions += [
+                f"{result['scenario']}: {regression}"
+                for regression in find_regressions(result, previous_result)
+            ]
+        print(
+            result["scenario"].ljust(22)
+            + f"{result['items_per_second']:.1f}".rjust(10)
+            + f"{result['megabytes_per_second']:.1f}".rjust(10)
+            + f"{result['p50_ms']:.1f}".rjust(11)
+            + f"{result['p90_ms']:.1f}".rjust(11)
+            + f"{result['p99_ms']:.1f}".rjust(11)
+            + result["latency_unit"].rjust(7)
+            + f"{result['peak_rss_mb']:.0f}".rjust(9)
+            + change.rjust(9)
+        )
+
+    if previous is not None:
+        print(f"Change in throughput compared to {previous['commit']}.")
+
+    if save:
+        results_file = save_results(results_dir, commit, options, results)
+        print(f"Saved results at '{results_file}'")
+
+    if regressions:
+        print("Regressions:")
+        for regression in regressions:
+            print(f"\t{regression}")
+        return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Run download_mp3, set_mp3_tags, copy_mp3_files and "
+        "append_track_numbers end to end against a fake yt_dlp backend, and "
+        "compare with the results of the previous commit.",
+        usage="python -m benchmarks.bench_suite [--scenarios SCENARIO ...] [OPTIONS]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--scenarios",
+        type=str,
+        nargs="+",
+        choices=SCENARIOS,
+        default=list(SCENARIOS),
+        help="Scenarios to run.",
+    )
+    parser.add_argument(
+        "--albums", type=int, default=2, help="Number of albums to download or copy."
+    )
+    parser.add_argument(
+        "--files",
+        type=int,
+        default=200,
+        help="Number of synthetic MP3 files to tag, copy or rename.",
+    )
+    parser.add_argument(
+        "--latency", type=float, default=0.2, help="Fake download time per track."
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.5,
+        help="Fraction the download time varies by either way.",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=180.0,
+        help="Length of each synthetic track in seconds, about 16 kB per second.",
+    )
+    parser.add_argument(
+        "--transcode-time",
+        type=float,
+        default=0.05,
+        help="Fake CPU time per transcode.",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=4, help="Number of tracks to download at once."
+    )
+    parser.add_argument(
+        "--runs",
+        type=int,
+        default=3,
+        help="Number of runs of the copy and rename scenarios.",
+    )
+    parser.add_argument(
+        "--results-dir",
+        type=Path,
+        default=RESULTS_DIR,
+        help="Directory the results of each commit are saved in.",
+    )
+    parser.add_argument(
+        "--no-save", action="store_true", help="Do not save the results."
+    )
+    # used to run a single scenario in a child process
+    parser.add_argument("--scenario", type=str, help=argparse.SUPPRESS)
+    parser.add_argument("--options", type=str, help=argparse.SUPPRESS)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    if args.scenario is not None:
+        print(json.dumps(run_scenario(args.scenario, json.loads(args.options))))
+        sys.exit(0)
+
+    suite_options: SuiteOptions = {
+        "albums": args.albums,
+        "files": args.files,
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "duration": args.duration,
+        "transcode_time": args.transcode_time,
+        "jobs": args.jobs,
+        "runs": args.runs,
+    }
+    sys.exit(
+        bench_suite(
+            scenarios=args.scenarios,
+            options=suite_options,
+            results_dir=args.results_dir,
+            save=not args.no_save,
+        )
+    )
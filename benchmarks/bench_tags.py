@@ -0,0 +1,108 @@
+"""
+Benchmark the two-call tag path against apply_track_metadata.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+from yt_music.utils.tags import (
+    apply_track_metadata,
+    set_mp3_art,
+    set_mp3_tags,
+)
+from benchmarks.fake_ytdlp import track_info, write_synthetic_mp3
+
+
+def bytes_written() -> int:
+    """
+    Return the number of bytes this process has written so far.
+    Reads `/proc/self/io`, returns 0 where it is not available.
+    """
+
+    try:
+        with open("/proc/self/io", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("wchar:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+def run_path(
+    name: str, mp3_files: List[Path], tag_func: Callable[[int, Path], None]
+) -> Tuple[str, float, int]:
+    """
+    Tag every file with `tag_func`. Returns the name, elapsed time and bytes written.
+    """
+
+    start_bytes = bytes_written()
+    start = time.perf_counter()
+    for index, mp3_file in enumerate(mp3_files):
+        tag_func(index, mp3_file)
+    return name, time.perf_counter() - start, bytes_written() - start_bytes
+
+
+def bench_tags(count: int, duration: float, image_size: int) -> None:
+    """
+    Main entry point.
+    """
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        image_file = Path(temp_dir) / "cover.jpg"
+        image_file.write_bytes(b"\xff\xd8\xff\xe0" + os.urandom(image_size))
+        image_bytes = image_file.read_bytes()
+
+        def two_call(index: int, mp3_file: Path) -> None:
+            set_mp3_tags(mp3_file=mp3_file, tags=track_info(index))
+            set_mp3_art(mp3_file=mp3_file, image_file=image_file)
+
+        def single_pass(index: int, mp3_file: Path) -> None:
+            apply_track_metadata(
+                mp3_file=mp3_file, tags=track_info(index), image_bytes=image_bytes
+            )
+
+        results = []
+        for name, tag_func in (("two-call", two_call), ("single-pass", single_pass)):
+            path_dir = Path(temp_dir) / name
+            path_dir.mkdir()
+            mp3_files = [
+                write_synthetic_mp3(path_dir / f"{index:04d}.mp3", duration=duration)
+                for index in range(count)
+            ]
+            results.append(run_path(name, mp3_files, tag_func))
+
+    print("Results".center(50, "-"))
+    for name, elapsed, written in results:
+        print(
+            name.ljust(14)
+            + f"{elapsed:.2f}s".rjust(10)
+            + f"{written / 1024 / 1024:.1f} MiB written".rjust(26)
+        )
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Compare set_mp3_tags + set_mp3_art with apply_track_metadata.",
+        usage="python -m benchmarks.bench_tags [--count COUNT] [--duration DURATION] "
+        "[--image-size IMAGE_SIZE]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--count", type=int, default=300, help="Number of synthetic MP3 files."
+    )
+    parser.add_argument(
+        "--duration", type=float, default=180.0, help="Length of each file in seconds."
+    )
+    parser.add_argument(
+        "--image-size", type=int, default=100_000, help="Size of the artwork in bytes."
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    bench_tags(count=args.count, duration=args.duration, image_size=args.image_size)
@@ -0,0 +1,129 @@
+"""
+Benchmark the MP3 integrity check over a synthetic library with damaged files,
+and check that exactly the damaged files are found.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+from yt_music.utils.integrity import check_mp3
+from yt_music.verify import CHUNK_SIZE
+from benchmarks.fake_ytdlp import write_synthetic_mp3
+
+# ways a download goes wrong, by the name of the files damaged that way
+DAMAGES: Dict[str, Callable[[bytes], bytes]] = {
+    "truncated": lambda data: data[: len(data) * 2 // 3],
+    "cut-frame": lambda data: data[:-100],
+    "empty": lambda data: b"",
+    "garbage": lambda data: data[:50000] + bytes(range(256)) * 8 + data[50000:],
+    "not-mp3": lambda data: b"<html><body>Error</body></html>",
+}
+
+
+def create_library(library_dir: Path, files: int, duration: float) -> List[Path]:
+    """
+    Write `files` synthetic MP3 files, every tenth one damaged in one of the ways
+    in `DAMAGES`. Returns the damaged files.
+    """
+
+    write_synthetic_mp3(library_dir / "template.mp3", duration=duration)
+    data = (library_dir / "template.mp3").read_bytes()
+    (library_dir / "template.mp3").unlink()
+
+    damaged: List[Path] = []
+    damages = list(DAMAGES.items())
+    for index in range(files):
+        file_path = library_dir / f"{index:04d}.mp3"
+        if index % 10 == 9:
+            name, damage = damages[index // 10 % len(damages)]
+            file_path = file_path.with_name(f"{index:04d} - {name}.mp3")
+            file_path.write_bytes(damage(data))
+            damaged.append(file_path)
+        else:
+            file_path.write_bytes(data)
+    return damaged
+
+
+def bench_verify(files: int, duration: float, jobs_list: List[Optional[int]]) -> int:
+    """
+    Main entry point. Returns the exit status, 1 if a damaged file is missed or
+    an intact one is reported.
+    """
+
+    with tempfile.TemporaryDirectory() as library_dir:
+        damaged = create_library(Path(library_dir), files, duration)
+        mp3_files = sorted(Path(library_dir).glob("*.mp3"))
+        total_bytes = sum(mp3_file.stat().st_size for mp3_file in mp3_files)
+
+        print(
+            "Jobs".ljust(10)
+            + "Seconds".rjust(10)
+            + "Files/s".rjust(10)
+            + "MB/s".rjust(10)
+        )
+        found: List[str] = []
+        for jobs in jobs_list:
+            start = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                results = list(
+                    executor.map(
+                        check_mp3,
+                        mp3_files,
+                        [duration] * len(mp3_files),
+                        chunksize=CHUNK_SIZE,
+                    )
+                )
+            seconds = time.perf_counter() - start
+            found = [result["path"] for result in results if result["problems"]]
+            print(
+                str(jobs or "cpus").ljust(10)
+                + f"{seconds:.2f}".rjust(10)
+                + f"{len(mp3_files) / seconds:.0f}".rjust(10)
+                + f"{total_bytes / seconds / 1e6:.0f}".rjust(10)
+            )
+
+        for result in results:
+            if result["problems"]:
+                print(f"{Path(result['path']).name}: {'; '.join(result['problems'])}")
+
+    expected = sorted(str(file_path) for file_path in damaged)
+    if sorted(found) != expected:
+        print(f"FAILED: found {len(found)} damaged files, expected {len(expected)}.")
+        return 1
+
+    print(f"Found all {len(expected)} damaged files of {len(mp3_files)}.")
+    return 0
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Benchmark the MP3 integrity check on a synthetic library.",
+        usage="python -m benchmarks.bench_verify [--files N] [--duration SECONDS] "
+        "[--jobs JOBS ...]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--files", type=int, default=500, help="Number of files in the library."
+    )
+    parser.add_argument(
+        "--duration", type=float, default=240, help="Length of each file in seconds."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        nargs="+",
+        default=[1, None],
+        help="Numbers of processes to compare. Defaults to 1 and the CPU count.",
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    sys.exit(
+        bench_verify(files=args.files, duration=args.duration, jobs_list=args.jobs)
+    )
@@ -0,0 +1,264 @@
+"""
+Fake yt_dlp backend for offline benchmarks.
+"""
+
+import array
+import json
+import math
+import os
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, BinaryIO, Dict, List, Optional
+
+if TYPE_CHECKING:
+    # the fake ffmpeg imports this module without `yt_music` on its path
+    from yt_music.utils.tags import TrackInfo
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+JSON_DIR = ROOT_DIR / "json"
+
+# MPEG-1 Layer III, 128 kbps, 44.1 kHz, no padding: 417 bytes per frame
+MP3_FRAME_HEADER = b"\xff\xfb\x90\x00"
+MP3_FRAME_SIZE = 417
+MP3_FRAME_DURATION = 1152 / 44100
+
+
+def syncsafe(size: int) -> bytes:
+    """
+    Encode an integer as a 4 byte ID3v2 syncsafe integer.
+    """
+
+    return bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0))
+
+
+def build_id3_header() -> bytes:
+    """
+    Build a minimal ID3v2.4 tag similar to the one written by ffmpeg.
+    """
+
+    encoder = b"\x03Lavf60.16.100"
+    frame = b"TSSE" + syncsafe(len(encoder)) + b"\x00\x00" + encoder
+    return b"ID3\x04\x00\x00" + syncsafe(len(frame)) + frame
+
+
+def write_synthetic_mp3(file_path: Path, duration: float = 180.0) -> Path:
+    """
+    Write a silent MP3 file of roughly the given duration in seconds.
+    """
+
+    frame = MP3_FRAME_HEADER + b"\x00" * (MP3_FRAME_SIZE - len(MP3_FRAME_HEADER))
+    frame_count = max(int(duration / MP3_FRAME_DURATION), 1)
+
+    with open(file_path, "wb") as f:
+        f.write(build_id3_header())
+        f.write(frame * frame_count)
+
+    return file_path
+
+
+def write_synthetic_pcm(
+    out: BinaryIO, duration: float = 180.0, amplitude: float = 0.1
+) -> None:
+    """
+    Write a 1 kHz stereo tone of the given duration in seconds and amplitude as
+    48 kHz 32-bit float samples, as decoded by `ffmpeg -f f32le`.
+    """
+
+    sample_rate = 48000
+    period = array.array(
+        "f",
+        (
+            amplitude * math.sin(2 * math.pi * 1000 * (n // 2) / sample_rate)
+            for n in range(2 * sample_rate)
+        ),
+    )
+    if sys.byteorder != "little":
+        period.byteswap()
+
+    data = period.tobytes()
+    for _second in range(int(duration)):
+        out.write(data)
+
+
+def track_info(index: int) -> "TrackInfo":
+    """
+    Build tags for a synthetic track.
+    """
+
+    return {
+        "title": f"Track {index}",
+        "artist": "Artist",
+        "album": "Album",
+        "year": 2025,
+        "track_number": index + 1,
+    }
+
+
+def load_fixture(name: str) -> Dict[str, Any]:
+    """
+    Load one of the bundled `json/*.json` info dumps.
+    """
+
+    with open(JSON_DIR / name, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class FakeYoutubeDL:
+    """
+    Stand-in for `yt_dlp.YoutubeDL` that serves the bundled JSON fixtures and
+    writes synthetic MP3 files after an artificial delay.
+    """
+
+    latency: float = 0.5
+    # latency varies by up to this fraction either way
+    jitter: float = 0.0
+    duration: float = 180.0
+    # media requests retried before each download succeeds
+    http_retries: int = 0
+
+    def __init__(self, params: Optional[Dict[str, Any]] = None):
+        self.params = dict(params or {})
+        self.post_processors: Dict[str, List[Any]] = {}
+        if isinstance(self.params.get("outtmpl"), str):
+            self.params["outtmpl"] = {"default": self.params["outtmpl"]}
+
+    def __enter__(self) -> "FakeYoutubeDL":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """
+        Nothing to release.
+        """
+
+    def add_post_processor(self, pp: Any, when: str = "post_process") -> None:
+        """
+        Keep a post processor. Only those run before downloads are run.
+        """
+
+        self.post_processors.setdefault(when, []).append(pp)
+
+    def delay(self) -> None:
+        """
+        Sleep for `latency` seconds, varied by `jitter`.
+        """
+
+        time.sleep(self.latency * (1 + random.uniform(-self.jitter, self.jitter)))
+
+    def output_path(self, ext: str) -> Path:
+        """
+        Expand the `outtmpl` option for the given extension.
+        """
+
+        outtmpl = self.params["outtmpl"]["default"]
+        return Path(re.sub(r"%\(ext\)s", ext, outtmpl))
+
+    def extract_info(
+        self, url: str, download: bool = False, process: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Return the playlist fixture for playlist URLs, otherwise the video fixture,
+        listing videos as long as the synthetic files written for them.
+        Without `process`, playlist entries are returned as a lazy iterator.
+        When downloading, run the post processors for before downloads, report
+        `http_retries` retries to the retry sleep function without sleeping, then
+        sleep for `latency` seconds and write a synthetic file.
+        """
+
+        if "list=" in url:
+            info = load_fixture("playlist_info.json")
+            for entry in info["entries"]:
+                entry["duration"] = self.duration
+            if not process:
+                info["entries"] = iter(info["entries"])
+            return info
+
+        info = load_fixture("video_info.json")
+        info["duration"] = self.duration
+        if download:
+            for pp in self.post_processors.get("before_dl", []):
+                _, info = pp.run(info)
+            sleep_func = self.params.get("retry_sleep_functions", {}).get("http")
+            for n in range(self.http_retries):
+                sleep_func(n=n)
+            self.delay()
+            file_path = write_synthetic_mp3(
+                self.output_path("webm"), duration=self.duration
+            )
+            info["requested_downloads"] = [{"filepath": str(file_path)}]
+
+        return info
+
+    def download(self, urls: List[str]) -> int:
+        """
+        Sleep for `latency` seconds per URL and write a synthetic MP3 file.
+        """
+
+        for _url in urls:
+            self.delay()
+            write_synthetic_mp3(self.output_path("mp3"), duration=self.duration)
+
+        return 0
+
+
+def install_fake_youtube_dl(
+    latency: float = 0.5, jitter: float = 0.0, duration: float = 180.0
+) -> None:
+    """
+    Replace `yt_dlp.YoutubeDL` with `FakeYoutubeDL`, serving downloads of
+    `duration` seconds after `latency` seconds varied by `jitter`.
+    """
+
+    import yt_dlp  # pylint: disable=import-outside-toplevel
+
+    FakeYoutubeDL.latency = latency
+    FakeYoutubeDL.jitter = jitter
+    FakeYoutubeDL.duration = duration
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+
+
+def install_fake_ffmpeg(
+    bin_dir: Path, cpu_time: float = 0.2, decode_duration: float = 180.0
+) -> Path:
+    """
+    Write a fake `ffmpeg` executable to `bin_dir` and put it first on `PATH`.
+    It burns `cpu_time` seconds of CPU and copies its input, a synthetic MP3 written
+    by `FakeYoutubeDL`, to its last argument.
+    When decoding to standard output, it writes a tone of `decode_duration`
+    seconds instead, whose level depends on the input file name.
+    """
+
+    script = f"""#!{sys.executable}
+import shutil
+import sys
+import time
+import zlib
+from pathlib import Path
+
+sys.path.insert(0, {str(ROOT_DIR)!r})
+from benchmarks.fake_ytdlp import write_synthetic_pcm
+
+if sys.argv[-1] == "-":
+    input_name = sys.argv[sys.argv.index("-i") + 1]
+    amplitude = 0.05 + zlib.crc32(Path(input_name).name.encode()) % 10 / 40
+    write_synthetic_pcm(sys.stdout.buffer, {decode_duration}, amplitude)
+    sys.exit(0)
+
+end = time.process_time() + {cpu_time}
+while time.process_time() < end:
+    pass
+
+shutil.copyfile(sys.argv[sys.argv.index("-i") + 1], sys.argv[-1])
+"""
+
+    ffmpeg_path = bin_dir / "ffmpeg"
+    ffmpeg_path.write_text(script, encoding="utf-8")
+    ffmpeg_path.chmod(0o755)
+
+    os.environ["PATH"] = f"{bin_dir}{os.pathsep}{os.environ.get('PATH', '')}"
+    return ffmpeg_path
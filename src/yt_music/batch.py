@@ -0,0 +1,241 @@
+"""
+Download many albums from a job file in one process.
+"""
+
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, TypedDict
+from yt_music.download import (
+    FailedTrack,
+    add_download_arguments,
+    apply_rate_limit_args,
+    download_mp3,
+)
+from yt_music.utils.http import get_session
+from yt_music.utils.formats import DEFAULT_TARGET_BITRATE
+from yt_music.utils.metrics import open_json_log, write_metrics
+from yt_music.utils.ytdlp import reuse_youtube_dl
+
+
+class BatchJob(TypedDict):
+    """Type for one album in a job file."""
+
+    url: str
+    artist: str
+    album: str
+    year: int
+    artwork_url: Optional[str]
+
+
+class AlbumReport(TypedDict):
+    """Type for the result of one album."""
+
+    url: str
+    artist: str
+    album: str
+    seconds: float
+    failed_tracks: List[str]
+    error: Optional[str]
+
+
+def read_job_file(job_file: Path) -> List[BatchJob]:
+    """
+    Read albums from a CSV file with a header row, or a JSONL file with one
+    object per line. Both use the keys: url, artist, album, year, artwork_url.
+    """
+
+    with open(job_file, encoding="utf-8", newline="") as f:
+        if job_file.suffix.lower() in (".jsonl", ".json"):
+            rows = [json.loads(line) for line in f if line.strip()]
+        else:
+            rows = list(csv.DictReader(f))
+
+    batch_jobs: List[BatchJob] = []
+    for row in rows:
+        batch_jobs.append(
+            {
+                "url": row["url"],
+                "artist": row["artist"],
+                "album": row["album"],
+                "year": int(row["year"]),
+                "artwork_url": row.get("artwork_url") or None,
+            }
+        )
+
+    return batch_jobs
+
+
+def print_report(reports: List[AlbumReport]) -> None:
+    """
+    Print the per-album timing and failures.
+    """
+
+    print("Summary".center(100, "-"))
+    for report in reports:
+        if report["error"] is not None:
+            status = f"ERROR: {report['error']}"
+        elif report["failed_tracks"]:
+            status = f"{len(report['failed_tracks'])} tracks failed"
+        else:
+            status = "OK"
+
+        print(
+            f"{report['artist']} - {report['album']}".ljust(50)
+            + f"{report['seconds']:.1f}s".rjust(10)
+            + f"  {status}"
+        )
+        for track_title in report["failed_tracks"]:
+            print(f"\t{track_title}")
+
+
+def batch_download(
+    job_file: str,
+    album_jobs: int = 2,
+    jobs: int = 4,
+    transcode_jobs: Optional[int] = None,
+    report_file: Optional[str] = None,
+    skip_known: bool = False,
+    output_format: str = "mp3",
+    target_bitrate: int = DEFAULT_TARGET_BITRATE,
+    profile: bool = False,
+    replaygain: bool = False,
+    verify: bool = True,
+) -> List[AlbumReport]:
+    """
+    Main entry point.
+    Albums run `album_jobs` at a time. Track downloads and transcodes are capped
+    across all albums at `jobs` and `transcode_jobs` (default: CPU count).
+    The shared HTTP session and a pool of long-lived yt_dlp instances are used by
+    all albums. With `skip_known`, videos already in the library catalog are skipped.
+    Tracks are saved in `output_format` from streams picked for `target_bitrate`,
+    as for `download_mp3`. With `profile`, the timing breakdown of each album is
+    printed when it is done. With `replaygain`, tracks are tagged with their
+    ReplayGain, measured under the same cap as transcodes. MP3 tracks are checked
+    for damage unless `verify` is unset.
+    """
+
+    batch_jobs = read_job_file(Path(job_file))
+
+    cpu_limit = threading.BoundedSemaphore(transcode_jobs or os.cpu_count() or 1)
+    stage_limits: Dict[str, threading.Semaphore] = {
+        "fetch": threading.BoundedSemaphore(jobs),
+        "transcode": cpu_limit,
+        "analyze": cpu_limit,
+    }
+
+    session = get_session()
+
+    with reuse_youtube_dl():
+
+        def run_album(batch_job: BatchJob) -> AlbumReport:
+            start = time.perf_counter()
+            failed_tracks: List[FailedTrack] = []
+            error = None
+            try:
+                failed_tracks = download_mp3(
+                    youtube_url=batch_job["url"],
+                    artist=batch_job["artist"],
+                    album=batch_job["album"],
+                    year=batch_job["year"],
+                    artwork_url=batch_job["artwork_url"],
+                    jobs=jobs,
+                    transcode_jobs=transcode_jobs,
+                    session=session,
+                    stage_limits=stage_limits,
+                    skip_known=skip_known,
+                    output_format=output_format,
+                    target_bitrate=target_bitrate,
+                    profile=profile,
+                    replaygain=replaygain,
+                    verify=verify,
+                )
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                error = str(e)
+
+            return {
+                "url": batch_job["url"],
+                "artist": batch_job["artist"],
+                "album": batch_job["album"],
+                "seconds": time.perf_counter() - start,
+                "failed_tracks": [
+                    failed_track["title"] for failed_track in failed_tracks
+                ],
+                "error": error,
+            }
+
+        with ThreadPoolExecutor(max_workers=max(album_jobs, 1)) as executor:
+            reports = list(executor.map(run_album, batch_jobs))
+
+    print_report(reports)
+
+    if report_file is not None:
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=4, ensure_ascii=False)
+        print(f"Saved report at '{report_file}'")
+
+    return reports
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Download many albums listed in a CSV or JSONL job file.",
+        usage="python -m yt_music.batch [JOB_FILE] [OPTIONS]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "job_file",
+        type=str,
+        help="CSV or JSONL file with url, artist, album, year and artwork_url.",
+    )
+    parser.add_argument(
+        "--album-jobs", type=int, default=2, help="Number of albums to run at once."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=4,
+        help="Number of tracks to download at once across all albums.",
+    )
+    parser.add_argument(
+        "--transcode-jobs",
+        type=int,
+        help="Number of tracks to transcode at once across all albums. "
+        "Defaults to the CPU count.",
+    )
+    parser.add_argument("--report", type=str, help="Save the summary as JSON.")
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time spent in each stage when an album is done.",
+    )
+    add_download_arguments(parser)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    apply_rate_limit_args(args)
+
+    with open_json_log(args.log_json):
+        batch_download(
+            job_file=args.job_file,
+            album_jobs=args.album_jobs,
+            jobs=args.jobs,
+            transcode_jobs=args.transcode_jobs,
+            report_file=args.report,
+            skip_known=args.skip_known,
+            output_format=args.format,
+            target_bitrate=args.target_bitrate,
+            replaygain=args.replaygain,
+            verify=not args.no_verify,
+            profile=args.profile,
+        )
+
+    if args.metrics_file is not None:
+        write_metrics(args.metrics_file, openmetrics=args.openmetrics)
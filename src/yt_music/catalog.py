@@ -0,0 +1,421 @@
+"""
+Query and backfill the library catalog.
+"""
+
+import argparse
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, TypedDict
+from yt_music.utils.catalog import (
+    CatalogTrack,
+    add_album,
+    add_track,
+    find_audio_duplicates,
+    find_video_ids,
+    get_video_id,
+    open_catalog,
+    update_track_file,
+)
+from yt_music.utils.dedupe import hash_audio, link_duplicate
+from yt_music.utils.manifest import hash_file, load_manifest
+from yt_music.utils.tags import read_id3_tags
+
+# album directories are named '[ARTIST] - [ALBUM] ([YEAR])' by download_mp3
+ALBUM_DIR_PATTERN = re.compile(r"^(?P<artist>.+) - (?P<album>.+) \((?P<year>\d+)\)$")
+
+
+class AlbumScan(TypedDict):
+    """Type for an album directory read by the importer."""
+
+    path: Path
+    artist: Optional[str]
+    album: Optional[str]
+    year: Optional[int]
+    source_url: Optional[str]
+    tracks: List[CatalogTrack]
+
+
+def find_album_dirs(root_dirs: List[Path]) -> List[Path]:
+    """
+    Return the sorted paths of all directories with an `info.txt` or MP3 files.
+    """
+
+    album_dirs: List[Path] = []
+    for root_dir in root_dirs:
+        for dir_path, _, file_names in os.walk(root_dir):
+            if "info.txt" in file_names or any(
+                file_name.endswith(".mp3") for file_name in file_names
+            ):
+                album_dirs.append(Path(dir_path))
+    return sorted(album_dirs)
+
+
+def read_source_url(music_dir_path: Path) -> Optional[str]:
+    """
+    Return the YouTube URL recorded in the `info.txt` of an album directory.
+    """
+
+    try:
+        with open(music_dir_path / "info.txt", encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    except (OSError, UnicodeDecodeError):
+        return None
+
+    if len(lines) < 2 or not lines[1].strip():
+        return None
+    return lines[1].strip()
+
+
+def scan_album(music_dir_path: Path) -> AlbumScan:
+    """
+    Read the catalog entries of an album directory from its `info.txt`, its
+    manifest and the ID3 tags and hashes of its tracks.
+    """
+
+    source_url = read_source_url(music_dir_path)
+    manifest = load_manifest(music_dir_path)
+    mp3_files = sorted(music_dir_path.glob("*.mp3"))
+
+    # a single downloaded from a video URL has that video's ID
+    single_video_id = None
+    if source_url is not None and len(mp3_files) == 1:
+        single_video_id = get_video_id(source_url)
+
+    tracks: List[CatalogTrack] = []
+    for mp3_file in mp3_files:
+        try:
+            stat = mp3_file.stat()
+            sha256 = hash_file(mp3_file)
+            audio_sha256 = hash_audio(mp3_file)
+            tags = read_id3_tags(mp3_file=mp3_file)
+        except OSError as e:
+            print(f"Unable to read '{mp3_file}'. {e}")
+            continue
+
+        record = manifest.get(mp3_file.name)
+        tracks.append(
+            {
+                "path": str(mp3_file.resolve()),
+                "video_id": (
+                    get_video_id(record["youtube_url"]) if record else single_video_id
+                ),
+                "tags": tags,
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "sha256": sha256,
+                "audio_sha256": audio_sha256,
+            }
+        )
+
+    artist, album, year = None, None, None
+    match = ALBUM_DIR_PATTERN.match(music_dir_path.name)
+    if match is not None:
+        artist, album, year = match["artist"], match["album"], int(match["year"])
+    else:
+        first_tags = next((track["tags"] for track in tracks if track["tags"]), None)
+        if first_tags is not None:
+            artist, album = first_tags["artist"], first_tags["album"]
+            year = first_tags["year"]
+
+    return {
+        "path": music_dir_path,
+        "artist": artist,
+        "album": album,
+        "year": year,
+        "source_url": source_url,
+        "tracks": tracks,
+    }
+
+
+def import_library(
+    root_dirs: List[str],
+    jobs: Optional[int] = None,
+    dedupe: bool = False,
+    dry_run: bool = False,
+) -> None:
+    """
+    Backfill the catalog from existing album directories. Albums are read and
+    their tracks hashed over a process pool.
+
+    Args:
+        root_dirs (List[str]): Directories to search for albums.
+        jobs (Optional[int]): Number of worker processes. Defaults to the CPU count.
+        dedupe (bool): Link tracks with the same audio after the import.
+        dry_run (bool): Only print the duplicates that would be linked.
+    """
+
+    album_dirs = find_album_dirs([Path(root_dir) for root_dir in root_dirs])
+    print(f"Total Album Folders Found: {len(album_dirs)}")
+
+    with (
+        ProcessPoolExecutor(max_workers=jobs) as executor,
+        open_catalog() as connection,
+    ):
+        scans = executor.map(scan_album, album_dirs)
+        for index, scan in enumerate(scans, start=1):
+            album_id = add_album(
+                connection,
+                music_dir_path=scan["path"],
+                artist=scan["artist"],
+                album=scan["album"],
+                year=scan["year"],
+                source_url=scan["source_url"],
+            )
+            for track in scan["tracks"]:
+                add_track(connection, album_id=album_id, track=track)
+            print(
+                f"Imported {index} of {len(album_dirs)}: {scan['path'].name} "
+                f"({len(scan['tracks'])} tracks)"
+            )
+
+    if dedupe:
+        dedupe_library(dry_run=dry_run)
+
+
+def dedupe_library(dry_run: bool = False) -> None:
+    """
+    Store tracks with the same audio once. In every group of duplicates in the
+    catalog, the first path is kept. Every other track is reflinked to an
+    earlier byte-identical track if there is one, or else to the first track
+    with its own tag written in place, sharing only the audio.
+
+    Args:
+        dry_run (bool): Only print the duplicates.
+    """
+
+    counts: Dict[str, int] = {
+        "reflinked": 0,
+        "linked": 0,
+        "skipped": 0,
+    }
+    shared_bytes = 0
+
+    with open_catalog() as connection:
+        duplicates = find_audio_duplicates(connection)
+        print(f"Total Duplicate Groups Found: {len(duplicates)}")
+
+        for audio_sha256, tracks in duplicates.items():
+            (original_path, original_sha256), *duplicate_tracks = tracks
+            print(f"Original: {original_path}")
+
+            originals_by_sha256 = {original_sha256: original_path}
+            for duplicate_path, duplicate_sha256 in duplicate_tracks:
+                link_path = originals_by_sha256.setdefault(
+                    duplicate_sha256, duplicate_path
+                )
+                if link_path == duplicate_path:
+                    link_path = original_path
+
+                if dry_run:
+                    print(f"\tDuplicate: {duplicate_path}")
+                    shared_bytes += duplicate_path.stat().st_size
+                    continue
+
+                try:
+                    action, linked_bytes = link_duplicate(
+                        original_file=link_path,
+                        duplicate_file=duplicate_path,
+                        audio_sha256=audio_sha256,
+                    )
+                except OSError as e:
+                    print(f"\tUnable to link '{duplicate_path}'. {e}")
+                    counts["skipped"] += 1
+                    continue
+
+                counts[action] += 1
+                shared_bytes += linked_bytes
+                print(f"\t{action.capitalize()}: {duplicate_path}")
+                if action == "reflinked":
+                    update_track_file(connection, track_path=duplicate_path)
+
+    if dry_run:
+        print(f"Up to {shared_bytes / 1024 / 1024:.1f} MB can be reclaimed.")
+        return
+
+    print(
+        f"Reflinked: {counts['reflinked']}, Already Linked: {counts['linked']}, "
+        f"Skipped: {counts['skipped']}"
+    )
+    print(f"Reclaimed {shared_bytes / 1024 / 1024:.1f} MB.")
+
+
+def list_albums(artist: Optional[str] = None) -> None:
+    """
+    Print the albums in the catalog with their track count and size.
+    """
+
+    with open_catalog() as connection:
+        rows = connection.execute(
+            """
+            SELECT albums.artist, albums.album, albums.year,
+                COUNT(tracks.id) AS track_count, COALESCE(SUM(tracks.size), 0) AS size
+            FROM albums LEFT JOIN tracks ON tracks.album_id = albums.id
+            WHERE ? IS NULL OR albums.artist LIKE ?
+            GROUP BY albums.id
+            ORDER BY albums.artist, albums.year, albums.album
+            """,
+            (artist, artist),
+        ).fetchall()
+
+    print("Albums".center(100, "-"))
+    for row in rows:
+        print(
+            f"{row['artist']} - {row['album']} ({row['year']})".ljust(70)
+            + f"{row['track_count']} tracks".rjust(12)
+            + f"{row['size'] / 1024 / 1024:.1f} MB".rjust(12)
+        )
+    print(f"Total Albums: {len(rows)}")
+
+
+def search_tracks(query: str) -> None:
+    """
+    Print the tracks whose title, artist or album contain the query.
+    """
+
+    pattern = f"%{query}%"
+    with open_catalog() as connection:
+        rows = connection.execute(
+            """
+            SELECT title, artist, album, video_id, path FROM tracks
+            WHERE title LIKE ? OR artist LIKE ? OR album LIKE ?
+            ORDER BY artist, album, track_number
+            """,
+            (pattern, pattern, pattern),
+        ).fetchall()
+
+    print("Tracks".center(100, "-"))
+    for row in rows:
+        print(
+            f"{row['artist']} - {row['title']}".ljust(60)
+            + f"{row['video_id'] or ''}".ljust(14)
+            + row["path"]
+        )
+    print(f"Total Tracks: {len(rows)}")
+
+
+def find_videos(videos: List[str]) -> None:
+    """
+    Print where videos, given by URL or ID, are in the library.
+    """
+
+    video_ids = [get_video_id(video) or video for video in videos]
+    with open_catalog() as connection:
+        found = find_video_ids(connection, video_ids)
+
+    for video_id in video_ids:
+        track_path = found.get(video_id)
+        print(
+            video_id.ljust(14) + (str(track_path) if track_path else "Not in library")
+        )
+
+
+def prune_catalog() -> None:
+    """
+    Remove tracks and albums whose files no longer exist from the catalog.
+    """
+
+    with open_catalog() as connection:
+        missing_tracks = [
+            row["path"]
+            for row in connection.execute("SELECT path FROM tracks")
+            if not Path(row["path"]).exists()
+        ]
+        connection.executemany(
+            "DELETE FROM tracks WHERE path = ?", [(path,) for path in missing_tracks]
+        )
+
+        missing_albums = [
+            row["path"]
+            for row in connection.execute("SELECT path FROM albums")
+            if not Path(row["path"]).exists()
+        ]
+        connection.executemany(
+            "DELETE FROM albums WHERE path = ?", [(path,) for path in missing_albums]
+        )
+
+    print(f"Removed {len(missing_tracks)} tracks and {len(missing_albums)} albums.")
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Query and backfill the library catalog.",
+        usage="python -m yt_music.catalog [COMMAND] [OPTIONS]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    import_parser = subparsers.add_parser(
+        "import",
+        help="Backfill the catalog from info.txt files and ID3 tags.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    import_parser.add_argument(
+        "root_dirs", type=str, nargs="+", help="Directories to search for albums."
+    )
+    import_parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Number of albums to read at once. Defaults to the CPU count.",
+    )
+    import_parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="Store tracks with the same audio once, with reflinks.",
+    )
+    import_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list the duplicates found by --dedupe.",
+    )
+
+    albums_parser = subparsers.add_parser(
+        "albums",
+        help="List albums.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    albums_parser.add_argument(
+        "--artist", type=str, help="Only list albums by this artist."
+    )
+
+    tracks_parser = subparsers.add_parser(
+        "tracks",
+        help="Search tracks by title, artist or album.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    tracks_parser.add_argument("query", type=str, help="Text to search for.")
+
+    find_parser = subparsers.add_parser(
+        "find",
+        help="Find videos in the library.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    find_parser.add_argument(
+        "videos", type=str, nargs="+", help="YouTube video URLs or IDs."
+    )
+
+    subparsers.add_parser(
+        "prune", help="Remove tracks and albums that no longer exist."
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    match args.command:
+        case "import":
+            import_library(
+                root_dirs=args.root_dirs,
+                jobs=args.jobs,
+                dedupe=args.dedupe,
+                dry_run=args.dry_run,
+            )
+        case "albums":
+            list_albums(artist=args.artist)
+        case "tracks":
+            search_tracks(query=args.query)
+        case "find":
+            find_videos(videos=args.videos)
+        case "prune":
+            prune_catalog()
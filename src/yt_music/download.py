@@ -3,11 +3,82 @@ Download YouTube to MP3.
 """
 
 import argparse
+import hashlib
+import math
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
 from pathlib import Path
-from typing import Optional, List
-import requests
-from yt_music.utils.ytdlp import get_youtube_info, download_to_mp3
-from yt_music.utils.tags import TrackInfo, set_mp3_tags, set_mp3_art
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    Optional,
+    List,
+    Tuple,
+    TypedDict,
+)
+from yt_music.pipeline import PipelineResult, Stage, iter_pipeline, limit_stage
+from yt_music.utils.artwork import load_artwork
+from yt_music.utils.cache import get_cache_path, load_cache_entry, save_cache_entry
+from yt_music.utils.catalog import (
+    add_album,
+    add_track,
+    find_video_ids,
+    get_video_id,
+    open_catalog,
+)
+from yt_music.utils.ffmpeg import remux_audio, transcode_to_mp3
+from yt_music.utils.dedupe import clone_track, hash_audio
+from yt_music.utils.http import DEFAULT_RETRIES, DEFAULT_TIMEOUT, download_to_file
+from yt_music.utils.integrity import check_mp3
+from yt_music.utils.loudness import (
+    TrackLoudness,
+    analyze_track,
+    check_numpy,
+    get_replaygain,
+)
+from yt_music.utils.metrics import (
+    open_json_log,
+    print_profile,
+    record_span,
+    span,
+    write_metrics,
+)
+from yt_music.utils.ratelimit import configure_rate_limits
+from yt_music.utils.manifest import (
+    TrackRecord,
+    load_manifest,
+    record_track,
+    verify_track,
+)
+from yt_music.utils.formats import DEFAULT_TARGET_BITRATE, OUTPUT_CODECS
+from yt_music.utils.ytdlp import YouTubeEntry, download_audio, stream_youtube_info
+from yt_music.utils.tags import (
+    ReplayGainInfo,
+    TrackInfo,
+    apply_audio_metadata,
+    set_mp3_tags,
+    set_mp3_art,
+)
+
+if TYPE_CHECKING:
+    import requests
+
+ARTWORK_CHUNK_SIZE = 64 * 1024
+
+ARTWORK_CACHE_NAMESPACE = "artwork"
+
+# suffix of tracks still damaged after downloading them again, see `check_track`
+DAMAGED_SUFFIX = ".damaged.mp3"
 
 
 def init_music_dir(artist: str, album: str, year: int) -> Path:
@@ -28,25 +99,84 @@ def init_music_dir(artist: str, album: str, year: int) -> Path:
     return music_dir_path
 
 
-def create_info_txt(music_dir_path: Path, youtube_url: str, tracks: List[str]) -> None:
+def create_info_txt(
+    music_dir_path: Path, youtube_url: str, tracks: Iterable[str]
+) -> None:
     """
     Create TXT file with information about downloaded content.
     """
 
+    entries = (
+        YouTubeEntry(index=index + 1, title=title, url="", duration=None)
+        for index, title in enumerate(tracks)
+    )
+    for _entry in write_info_txt(
+        music_dir_path=music_dir_path, youtube_url=youtube_url, entries=entries
+    ):
+        pass
+
+
+def write_info_txt(
+    music_dir_path: Path,
+    youtube_url: str,
+    entries: Iterable[YouTubeEntry],
+    append: bool = False,
+) -> Iterator[YouTubeEntry]:
+    """
+    Create TXT file with information about downloaded content, adding each entry
+    as it passes through, so a playlist can be listed while it is still being
+    extracted. With `append`, entries are added to the end of an existing file.
+    """
+
     info_txt_path = music_dir_path / Path("info.txt")
-    print(f"Creating new text file: '{info_txt_path}'")
+    append = append and info_txt_path.exists()
+    if append:
+        print(f"Adding to text file: '{info_txt_path}'")
+    else:
+        print(f"Creating new text file: '{info_txt_path}'")
 
-    # pylint: disable=unspecified-encoding
-    info_file = open(info_txt_path, "w")
+    # pylint: disable-next=unspecified-encoding
+    with open(info_txt_path, "a" if append else "w") as info_file:
+        if not append:
+            info_file.write(f"{music_dir_path.name}\n")
+            info_file.write(f"{youtube_url}\n")
 
-    info_file.write(f"{music_dir_path.name}\n")
-    info_file.write(f"{youtube_url}\n")
+            info_file.write("\n" + "Tracks".center(20, "-") + "\n")
+            info_file.flush()
+        for entry in entries:
+            info_file.write(f"{entry['index']:02d}".ljust(5) + f"{entry['title']}\n")
+            info_file.flush()
+            yield entry
 
-    info_file.write("\n" + "Tracks".center(20, "-") + "\n")
-    for index, item in enumerate(tracks):
-        info_file.write(f"{index+1:02d}".ljust(5) + f"{item}" + "\n")
 
-    info_file.close()
+def time_extraction(
+    entries: Iterator[YouTubeEntry], album: str, seconds: float, fields: Dict[str, Any]
+) -> Iterator[YouTubeEntry]:
+    """
+    Pass entries through, and record the `extract` span of the whole listing once
+    the last one has been read. Only the time spent waiting on the extractor is
+    counted, starting with the `seconds` the first page took, not the time taken
+    to process each entry.
+    """
+
+    error = None
+    count = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                entry = next(entries)
+            except StopIteration:
+                break
+            except BaseException as e:
+                error = type(e).__name__
+                raise
+            finally:
+                seconds += time.perf_counter() - start
+            count += 1
+            yield entry
+    finally:
+        record_span("extract", album, seconds, {**fields, "entries": count}, error)
 
 
 def set_track_tags(
@@ -76,21 +206,78 @@ def set_track_tags(
             print(f"File '{track_title}.mp3' does not exist! Unable to set track tags.")
 
 
-def download_artwork(artwork_url: str, music_dir_path: Path, album: str) -> Path:
+def get_artwork_path(music_dir_path: Path, album: str) -> Path:
+    """
+    Return the path the artwork of an album is saved at in its directory.
+    """
+
+    return music_dir_path / Path(f"_{album}.jpg")
+
+
+def download_artwork(
+    artwork_url: str,
+    music_dir_path: Path,
+    album: str,
+    session: Optional["requests.Session"] = None,
+    timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+) -> Path:
     """
     Downloads an image from the internet to be used as album art.
+    Images are kept in a local cache and revalidated with conditional requests,
+    so an unchanged image is not downloaded again.
     Returns the path to the image.
     """
-    response = requests.get(artwork_url, timeout=10)
 
-    if response.status_code == 200:
-        save_path = music_dir_path / Path(f"_{album}.jpg")
-        with open(save_path, "wb") as f:
-            f.write(response.content)
-        print(f"Saved file at '{save_path}'")
-        return save_path
+    # pylint: disable-next=import-outside-toplevel
+    from requests.exceptions import HTTPError
+
+    cache_path = get_cache_path(ARTWORK_CACHE_NAMESPACE, artwork_url)
+    image_cache_path = cache_path.with_suffix(".img")
+
+    headers: Dict[str, str] = {}
+    cached = load_cache_entry(ARTWORK_CACHE_NAMESPACE, artwork_url, ttl=math.inf)
+    if cached is not None and image_cache_path.exists():
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("last_modified"):
+            headers["If-Modified-Since"] = cached["last_modified"]
+
+    # stream to a partial file so an interrupted download is never used
+    part_path = image_cache_path.with_name(f"{image_cache_path.name}.part")
+    part_path.parent.mkdir(parents=True, exist_ok=True)
+    with download_to_file(
+        artwork_url,
+        part_path,
+        session=session,
+        headers=headers,
+        timeout=timeout,
+        retries=retries,
+        chunk_size=ARTWORK_CHUNK_SIZE,
+    ) as response:
+        if response.status_code == 304 and headers:
+            print(f"Artwork not modified. Using cached copy of '{artwork_url}'")
+        elif response.status_code == 200:
+            part_path.replace(image_cache_path)
 
-    raise requests.exceptions.HTTPError(f"Failed to download image at '{artwork_url}'")
+            save_cache_entry(
+                ARTWORK_CACHE_NAMESPACE,
+                artwork_url,
+                {
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                },
+            )
+        else:
+            raise HTTPError(
+                f"Failed to download image at '{artwork_url}' "
+                f"(status {response.status_code})"
+            )
+
+    save_path = get_artwork_path(music_dir_path=music_dir_path, album=album)
+    shutil.copyfile(image_cache_path, save_path)
+    print(f"Saved file at '{save_path}'")
+    return save_path
 
 
 def set_artwork(music_dir_path: Path, tracks: List[str], artwork_path: Path) -> None:
@@ -110,65 +297,834 @@ def set_artwork(music_dir_path: Path, tracks: List[str], artwork_path: Path) ->
             print(f"File '{track_title}.mp3' does not exist! Unable to set artwork.")
 
 
+class TrackProgress(TypedDict):
+    """Type for a track progress update."""
+
+    track_number: int
+    title: str
+    # queued, downloading, converting, tagging, done, skipped, failed or cancelled
+    status: str
+    downloaded_bytes: int
+    total_bytes: Optional[int]
+    speed: Optional[float]
+    eta: Optional[float]
+
+
+ProgressCallback = Callable[[TrackProgress], None]
+
+
+class FailedTrack(TypedDict):
+    """Type for a track that failed to download."""
+
+    title: str
+    # of the video, as listed in the playlist
+    youtube_url: str
+
+
+class TrackJob(TypedDict):
+    """Type for a track moving through the download pipeline."""
+
+    youtube_url: str
+    music_dir_path: Path
+    file_name: str
+    tags: TrackInfo
+    image_bytes: Optional[bytes]
+    artwork_sha256: Optional[str]
+    audio_path: Optional[Path]
+    track_path: Optional[Path]
+    progress_callback: Optional[ProgressCallback]
+    cancel_event: Optional[threading.Event]
+    album_id: Optional[int]
+    reuse_path: Optional[Path]
+    # mp3, opus or m4a
+    output_format: str
+    target_bitrate: int
+    # of the video in seconds, if YouTube lists it
+    duration: Optional[float]
+    loudness: Optional[TrackLoudness]
+    replaygain: Optional[ReplayGainInfo]
+
+
+def report_progress(
+    job: TrackJob,
+    status: str,
+    downloaded_bytes: int = 0,
+    total_bytes: Optional[int] = None,
+    speed: Optional[float] = None,
+    eta: Optional[float] = None,
+) -> None:
+    """
+    Send a progress update for a track to its progress callback, if any.
+    """
+
+    if job["progress_callback"] is None:
+        return
+
+    job["progress_callback"](
+        {
+            "track_number": job["tags"]["track_number"],
+            "title": job["tags"]["title"],
+            "status": status,
+            "downloaded_bytes": downloaded_bytes,
+            "total_bytes": total_bytes,
+            "speed": speed,
+            "eta": eta,
+        }
+    )
+
+
+def check_cancelled(job: TrackJob) -> None:
+    """
+    Raise `RuntimeError` if the download of a track has been cancelled.
+    """
+
+    if job["cancel_event"] is not None and job["cancel_event"].is_set():
+        raise RuntimeError("Download cancelled.")
+
+
+def catalog_track(job: TrackJob, record: TrackRecord) -> None:
+    """
+    Add a tagged track to the library catalog. A catalog error is reported but
+    does not fail the track.
+    """
+
+    if job["album_id"] is None:
+        return
+
+    track_path = job["music_dir_path"] / record["file_name"]
+    album_name = job["music_dir_path"].name
+    try:
+        with (
+            span("catalog", album=album_name, track=job["tags"]["title"]),
+            open_catalog() as connection,
+        ):
+            add_track(
+                connection,
+                album_id=job["album_id"],
+                track={
+                    "path": str(track_path.resolve()),
+                    "video_id": get_video_id(job["youtube_url"]),
+                    "tags": record["tags"],
+                    "size": record["size"],
+                    "mtime_ns": track_path.stat().st_mtime_ns,
+                    "sha256": record["sha256"],
+                    # only MP3 tags are kept apart from the audio
+                    "audio_sha256": (
+                        hash_audio(track_path) if track_path.suffix == ".mp3" else None
+                    ),
+                },
+            )
+    except sqlite3.Error as e:
+        print(f"Unable to add '{record['file_name']}' to the catalog. {e}")
+
+
+def fetch_track(job: TrackJob) -> TrackJob:
+    """
+    Pipeline stage: download the raw audio stream of a track.
+    Skipped if the track was already transcoded by a previous run. A video that
+    is already in another album is cloned from there instead, so it is neither
+    downloaded nor transcoded again.
+    """
+
+    if job["track_path"] is not None:
+        return job
+
+    check_cancelled(job)
+
+    if job["reuse_path"] is not None:
+        print(f"Reusing track from library: {job['tags']['title']}")
+        track_path = job["music_dir_path"] / Path(
+            f"{job['file_name']}.{job['output_format']}"
+        )
+        clone_track(source_file=job["reuse_path"], target_file=track_path)
+        record_track(
+            music_dir_path=job["music_dir_path"],
+            youtube_url=job["youtube_url"],
+            track_path=track_path,
+            state="transcoded",
+            duration=job["duration"],
+        )
+        job["track_path"] = track_path
+        return job
+
+    def progress_hook(status: Dict[str, Any]) -> None:
+        if job["cancel_event"] is not None and job["cancel_event"].is_set():
+            # pylint: disable-next=import-outside-toplevel
+            from yt_dlp.utils import DownloadCancelled
+
+            raise DownloadCancelled()
+
+        if status["status"] == "downloading":
+            report_progress(
+                job,
+                "downloading",
+                downloaded_bytes=status.get("downloaded_bytes") or 0,
+                total_bytes=status.get("total_bytes")
+                or status.get("total_bytes_estimate"),
+                speed=status.get("speed"),
+                eta=status.get("eta"),
+            )
+
+    print(f"Downloading track: {job['tags']['title']}")
+    report_progress(job, "downloading")
+    with span(
+        "download", album=job["music_dir_path"].name, track=job["tags"]["title"]
+    ) as fields:
+        audio_path = download_audio(
+            youtube_url=job["youtube_url"],
+            download_dir=job["music_dir_path"],
+            file_name=job["file_name"],
+            progress_hook=progress_hook,
+            output_format=job["output_format"],
+            target_bitrate=job["target_bitrate"],
+        )
+        if audio_path is None or not audio_path.exists():
+            raise RuntimeError(f"Failed to download '{job['youtube_url']}'.")
+        fields["bytes"] = audio_path.stat().st_size
+
+    job["audio_path"] = audio_path
+    return job
+
+
+def transcode_track(job: TrackJob) -> TrackJob:
+    """
+    Pipeline stage: transcode the downloaded audio to MP3, or copy its stream
+    into an Opus or M4A file without re-encoding.
+    Skipped if the track was already transcoded by a previous run.
+    """
+
+    if job["audio_path"] is None:
+        return job
+
+    check_cancelled(job)
+
+    print(f"Converting track: {job['tags']['title']}")
+    report_progress(job, "converting")
+    track_path = job["music_dir_path"] / Path(
+        f"{job['file_name']}.{job['output_format']}"
+    )
+    with span(
+        "transcode", album=job["music_dir_path"].name, track=job["tags"]["title"]
+    ) as fields:
+        if job["output_format"] == "mp3":
+            transcode_to_mp3(source_file=job["audio_path"], target_file=track_path)
+        elif not remux_audio(source_file=job["audio_path"], target_file=track_path):
+            print(f"Stream could not be copied, re-encoded: {job['tags']['title']}")
+        fields["bytes"] = track_path.stat().st_size
+    record_track(
+        music_dir_path=job["music_dir_path"],
+        youtube_url=job["youtube_url"],
+        track_path=track_path,
+        state="transcoded",
+        duration=job["duration"],
+    )
+
+    job["track_path"] = track_path
+    return job
+
+
+def check_track(job: TrackJob, keep_damaged: bool = False) -> TrackJob:
+    """
+    Pipeline stage: check the frames of an MP3 track and its duration against
+    the video's. A damaged track is deleted, so it is downloaded again. With
+    `keep_damaged`, it is renamed to `*.damaged.mp3` instead, and left for the
+    user to inspect.
+    """
+
+    track_path = job["track_path"]
+    if track_path is None or track_path.suffix != ".mp3":
+        return job
+
+    with span(
+        "verify", album=job["music_dir_path"].name, track=job["tags"]["title"]
+    ) as fields:
+        result = check_mp3(mp3_file=track_path, expected_duration=job["duration"])
+        fields["bytes"] = result["size"]
+
+    if result["problems"]:
+        problems = "; ".join(result["problems"])
+        if keep_damaged:
+            damaged_path = track_path.with_suffix(DAMAGED_SUFFIX)
+            track_path.replace(damaged_path)
+            raise RuntimeError(f"Damaged track, kept as '{damaged_path}': {problems}.")
+        track_path.unlink(missing_ok=True)
+        raise RuntimeError(f"Damaged track: {problems}.")
+
+    return job
+
+
+def tag_track(job: TrackJob) -> TrackJob:
+    """
+    Pipeline stage: set the tags and artwork of a track.
+    """
+
+    track_path = job["track_path"]
+    if track_path is None or not track_path.exists():
+        raise RuntimeError(f"File '{track_path}' does not exist! Unable to set tags.")
+
+    check_cancelled(job)
+
+    print(f"Setting metadata for track: {job['tags']['title']}.")
+    report_progress(job, "tagging")
+    with span("tag", album=job["music_dir_path"].name, track=job["tags"]["title"]):
+        # a reused track still carries the tag of the album it was cloned from
+        apply_audio_metadata(
+            audio_file=track_path,
+            tags=job["tags"],
+            image_bytes=job["image_bytes"],
+            keep_existing=job["reuse_path"] is None,
+            replaygain=job["replaygain"],
+        )
+    record = record_track(
+        music_dir_path=job["music_dir_path"],
+        youtube_url=job["youtube_url"],
+        track_path=track_path,
+        state="tagged",
+        tags=job["tags"],
+        artwork_sha256=job["artwork_sha256"],
+        replaygain=job["replaygain"],
+        duration=job["duration"],
+    )
+    catalog_track(job, record)
+
+    report_progress(job, "done")
+    return job
+
+
 def download_mp3(
     youtube_url: str,
     artist: str,
     album: str,
     year: int,
     artwork_url: Optional[str] = None,
-) -> None:
+    jobs: int = 1,
+    transcode_jobs: Optional[int] = None,
+    artwork_max_size: Optional[int] = None,
+    artwork_quality: int = 90,
+    refresh: bool = False,
+    session: Optional["requests.Session"] = None,
+    stage_limits: Optional[Dict[str, threading.Semaphore]] = None,
+    http_timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+    http_retries: int = DEFAULT_RETRIES,
+    progress_callback: Optional[ProgressCallback] = None,
+    cancel_event: Optional[threading.Event] = None,
+    skip_known: bool = False,
+    reuse_known: bool = True,
+    output_format: str = "mp3",
+    target_bitrate: int = DEFAULT_TARGET_BITRATE,
+    profile: bool = False,
+    entries: Optional[Iterable[YouTubeEntry]] = None,
+    replaygain: bool = False,
+    verify: bool = True,
+    artwork_path: Optional[Path] = None,
+) -> List[FailedTrack]:
     """
     Main entry point.
+    Tracks pass through a fetch, transcode and tag stage. Up to `jobs` tracks are
+    downloaded at once and up to `transcode_jobs` (default: CPU count) are
+    transcoded at once. Playlist entries are extracted as the tracks download, so
+    the first tracks start before the listing is complete. The artwork is read
+    once, optionally downscaled to `artwork_max_size` pixels, and shared by every
+    track. Extracted playlist info is cached unless `refresh` is set.
+    Progress is recorded in a manifest in the album directory. On a rerun, verified
+    tracks are skipped and partially downloaded audio is resumed.
+    `session` is used for HTTP requests, defaulting to a shared pooled session, and
+    `stage_limits` maps stage names to semaphores shared with other albums, for
+    running several albums at once. If the artwork cannot be downloaded, the tracks
+    are still downloaded without it. Without `artwork_url`, the tracks get the
+    image at `artwork_path` if it exists, such as the artwork of an earlier run.
+    `progress_callback` receives per-track progress from the worker threads, and
+    setting `cancel_event` stops the remaining downloads.
+    The album and its tagged tracks are added to the library catalog. Videos the
+    catalog already has in another album are cloned from there and retagged,
+    unless `reuse_known` is unset. With `skip_known`, they are skipped instead.
+    With an `output_format` of `opus` or `m4a`, the native audio stream is copied
+    into an Ogg or MP4 container instead of being transcoded to MP3.
+    Of the streams of a video, the smallest audio stream meeting `target_bitrate`
+    is downloaded.
+    Every stage is timed, see `yt_music.utils.metrics`. With `profile`, the
+    timing breakdown of the album is printed at the end.
+    `entries` are downloaded instead of every entry of `youtube_url`, with their
+    own track numbers, and added to the end of `info.txt`. Used by
+    `yt_music.sync` for the entries added to a playlist since the last run.
+    With `replaygain`, the loudness of every track is measured across
+    `transcode_jobs` processes, and tracks are tagged with their track and album
+    ReplayGain once the whole album is measured. If any track was measured, the
+    other tracks in the album directory, finished by an earlier run, are measured
+    too and tagged again, so the album values cover the whole album.
+    With `verify`, the frames of every MP3 track are checked before it is tagged,
+    see `yt_music.utils.integrity`. Damaged tracks are downloaded once more.
+    Returns the title and URL of any tracks that failed to download.
     """
 
-    youtube_info = get_youtube_info(youtube_url=youtube_url)
-    if youtube_info is None:
-        return
+    if output_format not in OUTPUT_CODECS:
+        raise ValueError(f"Error: Unsupported output format '{output_format}'.")
+    if replaygain:
+        check_numpy()
+
+    start = time.perf_counter()
+    # album directories are named after these, see `init_music_dir`
+    album_name = f"{artist} - {album} ({year})"
 
-    tracks = youtube_info["titles"]
-    urls = youtube_info["urls"]
+    # entries given by the caller are added to an album downloaded before
+    append = entries is not None
+    if entries is None:
+        # only the first page of a playlist is extracted here, the others while
+        # its first tracks download
+        extract_start = time.perf_counter()
+        try:
+            youtube_stream = stream_youtube_info(
+                youtube_url=youtube_url, refresh=refresh
+            )
+        except Exception as e:
+            record_span(
+                "extract",
+                album_name,
+                time.perf_counter() - extract_start,
+                {"url": youtube_url},
+                type(e).__name__,
+            )
+            raise
+        if youtube_stream is None:
+            return []
+        entries = time_extraction(
+            entries=youtube_stream["entries"],
+            album=album_name,
+            seconds=time.perf_counter() - extract_start,
+            fields={"url": youtube_url},
+        )
 
     music_dir_path = init_music_dir(artist=artist, album=album, year=year)
 
-    create_info_txt(
-        music_dir_path=music_dir_path, youtube_url=youtube_url, tracks=tracks
+    image_bytes = None
+    if artwork_url is not None:
+        # pylint: disable-next=import-outside-toplevel
+        from requests.exceptions import RequestException
+
+        try:
+            with span("artwork", album=album_name, url=artwork_url) as fields:
+                artwork_path = download_artwork(
+                    artwork_url=artwork_url,
+                    music_dir_path=music_dir_path,
+                    album=album,
+                    session=session,
+                    timeout=http_timeout,
+                    retries=http_retries,
+                )
+                fields["bytes"] = artwork_path.stat().st_size
+        except RequestException as e:
+            print(f"Unable to download artwork, continuing without it. {e}")
+            artwork_path = None
+    if artwork_path is not None and artwork_path.exists():
+        # e.g. an error page served as the image, or Pillow missing for resizing
+        try:
+            image_bytes = load_artwork(
+                image_file=artwork_path,
+                max_size=artwork_max_size,
+                quality=artwork_quality,
+            )
+        except (OSError, RuntimeError) as e:
+            print(f"Unable to read artwork, continuing without it. {e}")
+    # finished tracks are tagged again when the artwork changed
+    artwork_sha256 = (
+        hashlib.sha256(image_bytes).hexdigest() if image_bytes is not None else None
     )
 
-    artwork_path = None
-    if artwork_url is not None:
-        artwork_path = download_artwork(
-            artwork_url=artwork_url, music_dir_path=music_dir_path, album=album
+    album_id = None
+    try:
+        with open_catalog() as connection:
+            album_id = add_album(
+                connection,
+                music_dir_path=music_dir_path,
+                artist=artist,
+                album=album,
+                year=year,
+                source_url=youtube_url,
+            )
+    except sqlite3.Error as e:
+        print(f"Unable to open the catalog, continuing without it. {e}")
+
+    manifest = load_manifest(music_dir_path)
+    queued_tracks = 0
+
+    # runs in the pipeline's feeder thread, building a job for each entry as it
+    # is extracted, so known videos are looked up on a connection of its own
+    def queue_track_jobs() -> Iterator[TrackJob]:
+        nonlocal queued_tracks
+
+        with ExitStack() as stack:
+            connection = None
+            if album_id is not None and (skip_known or reuse_known):
+                try:
+                    connection = stack.enter_context(open_catalog())
+                except sqlite3.Error as e:
+                    print(f"Unable to look up known tracks in the catalog. {e}")
+
+            for entry in write_info_txt(
+                music_dir_path=music_dir_path,
+                youtube_url=youtube_url,
+                entries=entries,
+                append=append,
+            ):
+                # stop extracting the rest of the playlist once cancelled
+                if cancel_event is not None and cancel_event.is_set():
+                    print("Download cancelled, not queueing the remaining tracks.")
+                    break
+
+                url = entry["url"]
+                track_number = entry["index"]
+                track_title = entry["title"]
+
+                file_name = f"{track_number:02d} - {track_title}"
+                tags: TrackInfo = {
+                    "title": track_title,
+                    "track_number": track_number,
+                    "artist": artist,
+                    "album": album,
+                    "year": year,
+                }
+
+                # skip finished tracks and resume transcoded ones from the tag stage
+                record = manifest.get(f"{file_name}.{output_format}")
+                track_path = None
+                skip = False
+                if record is not None and verify_track(
+                    music_dir_path=music_dir_path, record=record, youtube_url=url
+                ):
+                    skip = (
+                        record["state"] == "tagged"
+                        and record["tags"] == tags
+                        # manifests written before artwork was recorded have none
+                        and record.get("artwork_sha256") == artwork_sha256
+                        and (not replaygain or record.get("replaygain") is not None)
+                    )
+                    track_path = music_dir_path / record["file_name"]
+
+                track_job: TrackJob = {
+                    "youtube_url": url,
+                    "music_dir_path": music_dir_path,
+                    "file_name": file_name,
+                    "tags": tags,
+                    "image_bytes": image_bytes,
+                    "artwork_sha256": artwork_sha256,
+                    "audio_path": None,
+                    "track_path": track_path,
+                    "progress_callback": progress_callback,
+                    "cancel_event": cancel_event,
+                    "album_id": album_id,
+                    "reuse_path": None,
+                    "output_format": output_format,
+                    "target_bitrate": target_bitrate,
+                    "duration": entry["duration"],
+                    "loudness": None,
+                    "replaygain": None,
+                }
+                if skip:
+                    print(f"Skipping completed track: {track_title}")
+                    report_progress(track_job, "skipped")
+                    continue
+
+                video_id = get_video_id(url)
+                known_path = None
+                if connection is not None and video_id:
+                    try:
+                        known_path = find_video_ids(connection, [video_id]).get(
+                            video_id
+                        )
+                    except sqlite3.Error as e:
+                        print(f"Unable to look up '{track_title}' in the catalog. {e}")
+                if (
+                    known_path is not None
+                    and known_path.parent != music_dir_path.resolve()
+                ):
+                    if skip_known:
+                        print(
+                            "Skipping track already in library: "
+                            f"{track_title} ({known_path})"
+                        )
+                        report_progress(track_job, "skipped")
+                        continue
+                    if track_path is None and known_path.suffix == f".{output_format}":
+                        track_job["reuse_path"] = known_path
+
+                report_progress(track_job, "queued")
+                queued_tracks += 1
+                yield track_job
+
+    cpu_workers = transcode_jobs or os.cpu_count() or 1
+    tag_stage: Stage = {"name": "tag", "func": tag_track, "workers": 1}
+    stages: List[Stage] = [
+        {"name": "fetch", "func": fetch_track, "workers": jobs},
+        {"name": "transcode", "func": transcode_track, "workers": cpu_workers},
+    ]
+    # tracks damaged again when downloaded a second time are kept aside
+    second_download = threading.Event()
+
+    def verify_job(job: TrackJob) -> TrackJob:
+        return check_track(job, keep_damaged=second_download.is_set())
+
+    if verify:
+        stages.append({"name": "verify", "func": verify_job, "workers": cpu_workers})
+
+    # tracks are measured in processes, spawned since the pipeline runs in threads
+    executor = (
+        ProcessPoolExecutor(
+            max_workers=cpu_workers, mp_context=multiprocessing.get_context("spawn")
         )
+        if replaygain
+        else None
+    )
 
-    for index, url in enumerate(urls):
-        track_number = index + 1
-        track_title = tracks[index]
+    def analyze_job(job: TrackJob) -> TrackJob:
+        assert executor is not None and job["track_path"] is not None
+        check_cancelled(job)
+        with span(
+            "analyze", album=job["music_dir_path"].name, track=job["tags"]["title"]
+        ):
+            job["loudness"] = executor.submit(analyze_track, job["track_path"]).result()
+        return job
+
+    # with ReplayGain, tags wait for the loudness of the whole album
+    analyze_stage: Stage = {
+        "name": "analyze",
+        "func": analyze_job,
+        "workers": cpu_workers,
+    }
+    if replaygain:
+        stages.append(analyze_stage)
+    else:
+        stages.append(tag_stage)
+
+    for stage in [*stages, tag_stage]:
+        if stage_limits is not None and stage["name"] in stage_limits:
+            stage["func"] = limit_stage(stage["func"], stage_limits[stage["name"]])
+
+    def report_failure(job: TrackJob, _error: Exception) -> None:
+        cancelled = cancel_event is not None and cancel_event.is_set()
+        report_progress(job, "cancelled" if cancelled else "failed")
+
+    # runs once the tracks of this run are measured, building a job for every
+    # other track of the album, so they are measured and tagged with it
+    def queue_album_jobs(measured_paths: List[Path]) -> List[TrackJob]:
+        album_jobs: List[TrackJob] = []
+        for file_name, record in load_manifest(music_dir_path).items():
+            track_path = music_dir_path / file_name
+            if (
+                record["state"] != "tagged"
+                or record["tags"] is None
+                or track_path in measured_paths
+                or not verify_track(
+                    music_dir_path=music_dir_path,
+                    record=record,
+                    youtube_url=record["youtube_url"],
+                )
+            ):
+                continue
+            album_jobs.append(
+                {
+                    "youtube_url": record["youtube_url"],
+                    "music_dir_path": music_dir_path,
+                    "file_name": track_path.stem,
+                    "tags": record["tags"],
+                    "image_bytes": image_bytes,
+                    "artwork_sha256": artwork_sha256,
+                    "audio_path": None,
+                    "track_path": track_path,
+                    # not part of this run's progress
+                    "progress_callback": None,
+                    "cancel_event": cancel_event,
+                    "album_id": album_id,
+                    "reuse_path": None,
+                    "output_format": track_path.suffix[1:],
+                    "target_bitrate": target_bitrate,
+                    "duration": record.get("duration"),
+                    "loudness": None,
+                    "replaygain": None,
+                }
+            )
+        return album_jobs
+
+    failed_tracks: List[FailedTrack] = []
+    damaged_jobs: List[TrackJob] = []
 
-        file_name = f"{track_number:02d} - {track_title}"
+    def collect_results(
+        results: Iterable[PipelineResult], retry_damaged: bool = False
+    ) -> List[TrackJob]:
+        finished_jobs: List[TrackJob] = []
+        for result in results:
+            if result["error"] is not None:
+                track_title = result["value"]["tags"]["title"]
+                if retry_damaged and result["stage"] == "verify":
+                    print(f"{result['error']} Downloading again: {track_title}")
+                    damaged_jobs.append(result["value"])
+                    continue
+                print(
+                    f"Failed to {result['stage']} track '{track_title}': "
+                    f"{result['error']}"
+                )
+                failed_tracks.append(
+                    {
+                        "title": track_title,
+                        "youtube_url": result["value"]["youtube_url"],
+                    }
+                )
+            else:
+                finished_jobs.append(result["value"])
+        return finished_jobs
 
-        print(f"Downloading track: {track_title}")
-        download_to_mp3(
-            youtube_url=url, download_dir=music_dir_path, file_name=file_name
+    # results come back in playlist order so output stays deterministic
+    try:
+        finished_jobs = collect_results(
+            iter_pipeline(
+                items=queue_track_jobs(), stages=stages, on_error=report_failure
+            ),
+            retry_damaged=True,
         )
 
-        track_path = music_dir_path / Path(f"{file_name}.mp3")
+        # damaged tracks are downloaded from scratch, and are kept aside and fail
+        # if damaged again
+        for job in damaged_jobs:
+            job["audio_path"] = None
+            job["track_path"] = None
+            job["reuse_path"] = None
+            report_progress(job, "queued")
+        if damaged_jobs:
+            second_download.set()
+            finished_jobs += collect_results(
+                iter_pipeline(
+                    items=damaged_jobs, stages=stages, on_error=report_failure
+                )
+            )
 
-        if track_path.exists():
-            print(f"Setting metadata for track: {track_title}.")
+        # the album values change with every track added, so they are measured
+        # over every track in the album directory
+        if replaygain and finished_jobs:
+            album_jobs = queue_album_jobs(
+                [job["track_path"] for job in finished_jobs if job["track_path"]]
+            )
+            if album_jobs:
+                print(
+                    f"Measuring {len(album_jobs)} more tracks of the album for "
+                    "its ReplayGain."
+                )
+                finished_jobs += collect_results(
+                    iter_pipeline(
+                        items=album_jobs,
+                        stages=[analyze_stage],
+                        on_error=report_failure,
+                    )
+                )
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
 
-            track_info: TrackInfo = {
-                "title": track_title,
-                "track_number": track_number,
-                "artist": artist,
-                "album": album,
-                "year": year,
-            }
-            set_mp3_tags(mp3_file=track_path, tags=track_info)
+    if replaygain:
+        replaygains = get_replaygain([job["loudness"] for job in finished_jobs])
+        for job, track_replaygain in zip(finished_jobs, replaygains):
+            job["replaygain"] = track_replaygain
+        collect_results(
+            iter_pipeline(
+                items=finished_jobs, stages=[tag_stage], on_error=report_failure
+            )
+        )
 
-            if artwork_path is not None:
-                set_mp3_art(mp3_file=track_path, image_file=artwork_path)
-        else:
-            print(f"File '{track_path}' does not exist! Unable to set tags.")
+    if failed_tracks:
+        print(f"{len(failed_tracks)} of {queued_tracks} tracks failed:")
+        for failed_track in failed_tracks:
+            print(f"\t{failed_track['title']}")
+
+    record_span(
+        "album",
+        album_name,
+        time.perf_counter() - start,
+        {"tracks": queued_tracks, "failed": len(failed_tracks)},
+    )
+    if profile:
+        print_profile(album_name)
+
+    return failed_tracks
+
+
+def add_download_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the options shared by the download, batch and sync CLIs: skipping known
+    videos, output format and bitrate, ReplayGain, verification, rate limits and
+    metrics. See `apply_rate_limit_args`.
+    """
+
+    parser.add_argument(
+        "--skip-known",
+        action="store_true",
+        help="Skip videos that the library catalog already has in another album.",
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        choices=list(OUTPUT_CODECS),
+        default="mp3",
+        help="Output format. Opus and M4A copy the downloaded audio stream without "
+        "re-encoding it. Tagging them requires mutagen.",
+    )
+    parser.add_argument(
+        "--target-bitrate",
+        type=int,
+        default=DEFAULT_TARGET_BITRATE,
+        help="Download the smallest audio stream with at least this bitrate in kbps, "
+        "weighted by codec efficiency relative to AAC.",
+    )
+    parser.add_argument(
+        "--replaygain",
+        action="store_true",
+        help="Measure the loudness of the tracks and tag them with their track and "
+        "album ReplayGain. Requires NumPy.",
+    )
+    parser.add_argument(
+        "--no-verify",
+        action="store_true",
+        help="Do not check the frames and duration of downloaded MP3 tracks.",
+    )
+    parser.add_argument(
+        "--requests-per-second",
+        type=float,
+        help="Limit requests to each host, slowing down further when a host "
+        "throttles. Each video counts as one request, however many yt-dlp sends "
+        "for it. Unlimited if not set.",
+    )
+    parser.add_argument(
+        "--max-bandwidth",
+        type=float,
+        help="Limit the combined download speed in MB/s. Unlimited if not set.",
+    )
+    parser.add_argument(
+        "--log-json",
+        type=Path,
+        help="Append a JSON line with the timing of every stage to this file.",
+    )
+    parser.add_argument(
+        "--metrics-file",
+        type=Path,
+        help="Write stage timings and byte counts to this file in the Prometheus "
+        "text format.",
+    )
+    parser.add_argument(
+        "--openmetrics",
+        action="store_true",
+        help="Write the metrics file in the OpenMetrics text format instead.",
+    )
+
+
+def apply_rate_limit_args(args: argparse.Namespace) -> None:
+    """
+    Configure the rate limits of the process from the options added by
+    `add_download_arguments`.
+    """
+
+    configure_rate_limits(
+        requests_per_second=args.requests_per_second,
+        bytes_per_second=(
+            args.max_bandwidth * 1e6 if args.max_bandwidth is not None else None
+        ),
+    )
 
 
 if __name__ == "__main__":
@@ -176,7 +1132,7 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Download a playlist or video from YouTube as a music album or single.",
         usage="python download_mp3.py [YOUTUBE_URL] [ARTIST] [ALBUM] [YEAR]"
-        "[--artwork-url ARTWORK_URL]",
+        "[--artwork-url ARTWORK_URL] [OPTIONS]",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     parser.add_argument(
@@ -188,14 +1144,84 @@ if __name__ == "__main__":
     parser.add_argument("album", type=str, help="The album or single title.")
     parser.add_argument("year", type=int, help="The year of the album or single.")
     parser.add_argument("--artwork-url", type=str, help="URL of the album artwork.")
+    parser.add_argument(
+        "--jobs", type=int, default=1, help="Number of tracks to download at once."
+    )
+    parser.add_argument(
+        "--transcode-jobs",
+        type=int,
+        help="Number of tracks to transcode at once. Defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--artwork-max-size",
+        type=int,
+        help="Downscale the artwork to this many pixels per side. Requires Pillow.",
+    )
+    parser.add_argument(
+        "--artwork-quality",
+        type=int,
+        default=90,
+        help="JPEG quality used when downscaling the artwork.",
+    )
+    parser.add_argument(
+        "--http-timeout",
+        type=float,
+        nargs=2,
+        default=DEFAULT_TIMEOUT,
+        metavar=("CONNECT", "READ"),
+        help="Connect and read timeouts in seconds for artwork requests.",
+    )
+    parser.add_argument(
+        "--http-retries",
+        type=int,
+        default=DEFAULT_RETRIES,
+        help="Number of times to retry a failed artwork request.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignore cached playlist info and extract it again.",
+    )
+    parser.add_argument(
+        "--no-reuse",
+        action="store_true",
+        help="Download videos that the library catalog already has in another album "
+        "instead of cloning them from there.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print the time spent in each stage when the album is done.",
+    )
+    add_download_arguments(parser)
 
     # parse arguments
     args = parser.parse_args()
 
-    download_mp3(
-        youtube_url=args.youtube_url,
-        artist=args.artist,
-        album=args.album,
-        year=args.year,
-        artwork_url=args.artwork_url,
-    )
+    apply_rate_limit_args(args)
+
+    with open_json_log(args.log_json):
+        download_mp3(
+            youtube_url=args.youtube_url,
+            artist=args.artist,
+            album=args.album,
+            year=args.year,
+            artwork_url=args.artwork_url,
+            jobs=args.jobs,
+            transcode_jobs=args.transcode_jobs,
+            artwork_max_size=args.artwork_max_size,
+            artwork_quality=args.artwork_quality,
+            refresh=args.refresh,
+            http_timeout=tuple(args.http_timeout),
+            http_retries=args.http_retries,
+            skip_known=args.skip_known,
+            reuse_known=not args.no_reuse,
+            output_format=args.format,
+            target_bitrate=args.target_bitrate,
+            replaygain=args.replaygain,
+            verify=not args.no_verify,
+            profile=args.profile,
+        )
+
+    if args.metrics_file is not None:
+        write_metrics(args.metrics_file, openmetrics=args.openmetrics)
@@ -0,0 +1,176 @@
+"""
+Staged producer/consumer pipeline.
+
+Each stage runs its own pool of worker threads and reads from a bounded queue,
+so a slow stage applies backpressure to the stages before it.
+"""
+
+import queue
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypedDict
+
+_DONE = object()
+
+
+class Stage(TypedDict):
+    """Type for a pipeline stage."""
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int
+
+
+class PipelineResult(TypedDict):
+    """Type for the result of one pipeline item."""
+
+    value: Any
+    error: Optional[Exception]
+    stage: Optional[str]
+
+
+def run_pipeline(
+    items: Iterable[Any],
+    stages: List[Stage],
+    on_error: Optional[Callable[[Any, Exception], None]] = None,
+) -> List[PipelineResult]:
+    """
+    Pass every item through each stage in turn.
+    An item that raises in a stage is not passed to the following stages.
+
+    Args:
+        items (Iterable[Any]): Inputs to the first stage.
+        stages (List[Stage]): Stages in order.
+        on_error (Optional[Callable]): Called from the worker thread with the value
+            and exception as soon as an item fails. Exceptions it raises are
+            printed and do not stop the pipeline.
+
+    Returns:
+        List[PipelineResult]: One result per item, in input order. `value` is the
+        output of the last stage reached, `error` and `stage` are set on failure.
+    """
+
+    return list(iter_pipeline(items=items, stages=stages, on_error=on_error))
+
+
+def iter_pipeline(
+    items: Iterable[Any],
+    stages: List[Stage],
+    on_error: Optional[Callable[[Any, Exception], None]] = None,
+) -> Iterator[PipelineResult]:
+    """
+    Like `run_pipeline`, but yield each result as soon as it and the ones before
+    it are done. `items` is read from a separate thread, so it can be a generator
+    that blocks, e.g. on a playlist still being extracted, and only the items in
+    flight are held in memory.
+
+    Raises:
+        Exception: Whatever reading `items` raised, after the items read before
+            it have been yielded.
+    """
+
+    queues: List[queue.Queue] = [
+        queue.Queue(maxsize=max(stage["workers"], 1) * 2) for stage in stages
+    ]
+    results: Dict[int, PipelineResult] = {}
+    done = threading.Condition()
+    # number of items read once reading is finished, and the error it stopped on
+    feed: Dict[str, Any] = {"count": None, "error": None}
+
+    def finish(index: int, result: PipelineResult) -> None:
+        with done:
+            results[index] = result
+            done.notify()
+
+    def work(stage_index: int) -> None:
+        stage = stages[stage_index]
+        while True:
+            item = queues[stage_index].get()
+            if item is _DONE:
+                return
+
+            index, value = item
+            try:
+                value = stage["func"](value)
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # finish the item even if the callback fails, so nothing waits on it
+                if on_error is not None:
+                    try:
+                        on_error(value, e)
+                    except Exception as e2:  # pylint: disable=broad-exception-caught
+                        print(
+                            f"Error: Handling the failure in stage '{stage['name']}' "
+                            f"raised. {e2}"
+                        )
+                finish(index, {"value": value, "error": e, "stage": stage["name"]})
+                continue
+
+            if stage_index + 1 < len(stages):
+                queues[stage_index + 1].put((index, value))
+            else:
+                finish(index, {"value": value, "error": None, "stage": None})
+
+    def read_items() -> None:
+        count = 0
+        try:
+            for index, item in enumerate(items):
+                queues[0].put((index, item))
+                count += 1
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            feed["error"] = e
+        finally:
+            # shut stages down in order so every item drains before the next one stops
+            for stage_index, threads in enumerate(workers):
+                for _thread in threads:
+                    queues[stage_index].put(_DONE)
+                for thread in threads:
+                    thread.join()
+            with done:
+                feed["count"] = count
+                done.notify()
+
+    workers: List[List[threading.Thread]] = []
+    for stage_index, stage in enumerate(stages):
+        threads = [
+            threading.Thread(
+                target=work, args=(stage_index,), name=f"{stage['name']}-{n}"
+            )
+            for n in range(max(stage["workers"], 1))
+        ]
+        for thread in threads:
+            thread.start()
+        workers.append(threads)
+
+    feeder = threading.Thread(target=read_items, name="pipeline-feed")
+    feeder.start()
+
+    index = 0
+    while True:
+        with done:
+            while index not in results and (
+                feed["count"] is None or index < feed["count"]
+            ):
+                done.wait()
+            if index not in results:
+                break
+            result = results.pop(index)
+        yield result
+        index += 1
+
+    feeder.join()
+    if feed["error"] is not None:
+        raise feed["error"]
+
+
+def limit_stage(
+    func: Callable[[Any], Any], semaphore: threading.Semaphore
+) -> Callable[[Any], Any]:
+    """
+    Wrap a stage function so it only runs while holding `semaphore`.
+    Sharing one semaphore between pipelines caps their combined concurrency.
+    """
+
+    def limited(value: Any) -> Any:
+        with semaphore:
+            return func(value)
+
+    return limited
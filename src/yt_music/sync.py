@@ -0,0 +1,343 @@
+"""
+Keep albums in sync with playlists that are still growing.
+
+The videos seen in a playlist are recorded in `sync.json` in the album directory.
+Each sync lists the playlist again and only downloads the entries that were not
+seen before, numbered after the tracks already in the album.
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, TypedDict
+from yt_music.batch import BatchJob, read_job_file
+from yt_music.download import (
+    FailedTrack,
+    add_download_arguments,
+    apply_rate_limit_args,
+    download_mp3,
+    init_music_dir,
+)
+from yt_music.utils.catalog import get_video_id
+from yt_music.utils.formats import DEFAULT_TARGET_BITRATE
+from yt_music.utils.http import get_session
+from yt_music.utils.metrics import open_json_log, write_metrics
+from yt_music.utils.ytdlp import YouTubeEntry, reuse_youtube_dl, stream_youtube_info
+
+SYNC_FILE_NAME = "sync.json"
+
+
+class SyncState(TypedDict):
+    """Type for the sync state of an album."""
+
+    url: str
+    # track number of every video seen in the playlist, by video ID
+    track_numbers: Dict[str, int]
+    # videos that failed to download and are retried on the next sync
+    failed: List[str]
+    last_synced: Optional[float]
+
+
+class SyncReport(TypedDict):
+    """Type for the result of syncing one playlist."""
+
+    url: str
+    artist: str
+    album: str
+    new_tracks: List[str]
+    failed_tracks: List[str]
+    error: Optional[str]
+
+
+def load_sync_state(music_dir_path: Path, youtube_url: str) -> SyncState:
+    """
+    Load the sync state of an album directory.
+    Returns an empty state if none exists or it cannot be read.
+    """
+
+    try:
+        with open(music_dir_path / SYNC_FILE_NAME, encoding="utf-8") as f:
+            state = json.load(f)
+        return {
+            "url": state["url"],
+            "track_numbers": state["track_numbers"],
+            "failed": state["failed"],
+            "last_synced": state["last_synced"],
+        }
+    except (OSError, ValueError, KeyError):
+        return {
+            "url": youtube_url,
+            "track_numbers": {},
+            "failed": [],
+            "last_synced": None,
+        }
+
+
+def save_sync_state(music_dir_path: Path, state: SyncState) -> None:
+    """
+    Atomically write the sync state of an album directory.
+    """
+
+    sync_path = music_dir_path / SYNC_FILE_NAME
+    temp_path = sync_path.with_name(f".{SYNC_FILE_NAME}.tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=4, ensure_ascii=False)
+    os.replace(temp_path, sync_path)
+
+
+def get_entry_key(entry: YouTubeEntry) -> str:
+    """
+    Return the key of a playlist entry in the sync state: its video ID, or its
+    URL if it has none.
+    """
+
+    return get_video_id(entry["url"]) or entry["url"]
+
+
+def plan_sync(state: SyncState, entries: List[YouTubeEntry]) -> List[YouTubeEntry]:
+    """
+    Return the entries to download, and record the new ones in `state`.
+    New entries are numbered after the highest track number in the album, in
+    playlist order. Entries that failed before are retried with their number.
+    """
+
+    next_track_number = max(state["track_numbers"].values(), default=0) + 1
+    failed = set(state["failed"])
+
+    planned: List[YouTubeEntry] = []
+    for entry in entries:
+        key = get_entry_key(entry)
+        if key not in state["track_numbers"]:
+            state["track_numbers"][key] = next_track_number
+            next_track_number += 1
+        elif key not in failed:
+            continue
+        planned.append({**entry, "index": state["track_numbers"][key]})
+
+    return planned
+
+
+def sync_playlist(
+    youtube_url: str,
+    artist: str,
+    album: str,
+    year: int,
+    artwork_url: Optional[str] = None,
+    **download_options: Any,
+) -> SyncReport:
+    """
+    Download the entries added to a playlist since its last sync. The first sync
+    of a playlist downloads all of it, resuming any tracks already downloaded.
+
+    Args:
+        youtube_url (str): URL of the YouTube playlist.
+        artist (str): The artist name of the album.
+        album (str): The album title.
+        year (int): The year of the album.
+        artwork_url (Optional[str]): URL of the album artwork.
+        **download_options: Passed to `download_mp3`, e.g. `jobs`.
+
+    Raises:
+        RuntimeError: If yt_dlp fails to extract info.
+        ValueError: If no info is found, or the URL is not a playlist or video.
+        KeyError: If the info cannot be parsed.
+
+    Returns:
+        SyncReport: Titles of the new and failed tracks.
+    """
+
+    music_dir_path = init_music_dir(artist=artist, album=album, year=year)
+    state = load_sync_state(music_dir_path, youtube_url)
+
+    # a flat listing of the playlist, without the info of each video
+    youtube_stream = stream_youtube_info(youtube_url=youtube_url, refresh=True)
+    if youtube_stream is None:
+        # an empty listing would leave every track as it is, and mark the sync done
+        raise ValueError(f"Error: No playlist or video found at '{youtube_url}'.")
+    entries = list(youtube_stream["entries"])
+
+    planned = plan_sync(state, entries)
+    if state["last_synced"] is None:
+        # the first sync lists the whole playlist, so info.txt is written again
+        (music_dir_path / "info.txt").unlink(missing_ok=True)
+
+    failed_tracks: List[FailedTrack] = []
+    if planned:
+        print(f"Downloading {len(planned)} new tracks of '{album}'.")
+        failed_tracks = download_mp3(
+            youtube_url=youtube_url,
+            artist=artist,
+            album=album,
+            year=year,
+            artwork_url=artwork_url,
+            entries=planned,
+            **download_options,
+        )
+    else:
+        print(f"No new tracks in '{album}'.")
+
+    # matched by video, as titles in a playlist need not be unique
+    failed_keys = {
+        get_video_id(failed_track["youtube_url"]) or failed_track["youtube_url"]
+        for failed_track in failed_tracks
+    }
+    state["failed"] = [
+        get_entry_key(entry) for entry in planned if get_entry_key(entry) in failed_keys
+    ]
+    state["last_synced"] = time.time()
+    save_sync_state(music_dir_path, state)
+
+    return {
+        "url": youtube_url,
+        "artist": artist,
+        "album": album,
+        "new_tracks": [
+            entry["title"]
+            for entry in planned
+            if get_entry_key(entry) not in failed_keys
+        ],
+        "failed_tracks": [failed_track["title"] for failed_track in failed_tracks],
+        "error": None,
+    }
+
+
+def print_report(reports: List[SyncReport]) -> None:
+    """
+    Print the new and failed tracks of each playlist.
+    """
+
+    print("Summary".center(100, "-"))
+    for report in reports:
+        if report["error"] is not None:
+            status = f"ERROR: {report['error']}"
+        else:
+            status = f"{len(report['new_tracks'])} new"
+            if report["failed_tracks"]:
+                status += f", {len(report['failed_tracks'])} failed"
+
+        print(f"{report['artist']} - {report['album']}".ljust(50) + f"  {status}")
+        for track_title in report["new_tracks"]:
+            print(f"\t+ {track_title}")
+        for track_title in report["failed_tracks"]:
+            print(f"\t! {track_title}")
+
+
+def sync_playlists(
+    sync_jobs: List[BatchJob],
+    interval: Optional[float] = None,
+    jobs: int = 4,
+    transcode_jobs: Optional[int] = None,
+    skip_known: bool = False,
+    output_format: str = "mp3",
+    target_bitrate: int = DEFAULT_TARGET_BITRATE,
+    replaygain: bool = False,
+    verify: bool = True,
+    metrics_file: Optional[Path] = None,
+    openmetrics: bool = False,
+) -> List[SyncReport]:
+    """
+    Main entry point.
+    Syncs every playlist in turn, then again every `interval` seconds until
+    interrupted if it is set. A playlist that fails to sync does not stop the others.
+    The metrics are written to `metrics_file` after every round.
+    Returns the reports of the last round.
+    """
+
+    session = get_session()
+
+    with reuse_youtube_dl():
+        while True:
+            reports: List[SyncReport] = []
+            for sync_job in sync_jobs:
+                try:
+                    report = sync_playlist(
+                        youtube_url=sync_job["url"],
+                        artist=sync_job["artist"],
+                        album=sync_job["album"],
+                        year=sync_job["year"],
+                        artwork_url=sync_job["artwork_url"],
+                        jobs=jobs,
+                        transcode_jobs=transcode_jobs,
+                        session=session,
+                        skip_known=skip_known,
+                        output_format=output_format,
+                        target_bitrate=target_bitrate,
+                        replaygain=replaygain,
+                        verify=verify,
+                    )
+                except Exception as e:  # pylint: disable=broad-exception-caught
+                    report = {
+                        "url": sync_job["url"],
+                        "artist": sync_job["artist"],
+                        "album": sync_job["album"],
+                        "new_tracks": [],
+                        "failed_tracks": [],
+                        "error": str(e),
+                    }
+                reports.append(report)
+
+            print_report(reports)
+            if metrics_file is not None:
+                write_metrics(metrics_file, openmetrics=openmetrics)
+
+            if interval is None:
+                return reports
+
+            print(f"Next sync in {interval:.0f}s.")
+            time.sleep(interval)
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Download the tracks added to playlists since they were last "
+        "synced.",
+        usage="python -m yt_music.sync [JOB_FILE] [--interval SECONDS] [OPTIONS]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "job_file",
+        type=str,
+        help="CSV or JSONL file with url, artist, album, year and artwork_url, "
+        "as for yt_music.batch.",
+    )
+    parser.add_argument(
+        "--interval",
+        type=float,
+        help="Sync again every this many seconds until interrupted. "
+        "Syncs once if not set.",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=4, help="Number of tracks to download at once."
+    )
+    parser.add_argument(
+        "--transcode-jobs",
+        type=int,
+        help="Number of tracks to transcode at once. Defaults to the CPU count.",
+    )
+    add_download_arguments(parser)
+
+    # parse arguments
+    args = parser.parse_args()
+
+    apply_rate_limit_args(args)
+
+    try:
+        with open_json_log(args.log_json):
+            sync_playlists(
+                sync_jobs=read_job_file(Path(args.job_file)),
+                interval=args.interval,
+                jobs=args.jobs,
+                transcode_jobs=args.transcode_jobs,
+                skip_known=args.skip_known,
+                output_format=args.format,
+                target_bitrate=args.target_bitrate,
+                replaygain=args.replaygain,
+                verify=not args.no_verify,
+                metrics_file=args.metrics_file,
+                openmetrics=args.openmetrics,
+            )
+    except KeyboardInterrupt:
+        print("Stopped syncing.")
@@ -0,0 +1,72 @@
+"""
+Utils for album artwork.
+"""
+
+import io
+from pathlib import Path
+from typing import Optional
+
+
+def resize_artwork(image_bytes: bytes, max_size: int, quality: int = 90) -> bytes:
+    """
+    Downscale an image so neither side exceeds `max_size` pixels and re-encode it
+    as JPEG. Images that are already small enough JPEGs are returned unchanged.
+    Requires Pillow, installed with the `artwork` extra.
+
+    Args:
+        image_bytes (bytes): Encoded image.
+        max_size (int): Maximum width and height in pixels.
+        quality (int): JPEG quality from 1 to 95.
+
+    Raises:
+        RuntimeError: If Pillow is not installed.
+
+    Returns:
+        bytes: JPEG encoded image.
+    """
+
+    try:
+        # pylint: disable=import-outside-toplevel
+        from PIL import Image
+    except ImportError as e:
+        raise RuntimeError(
+            "Error: Pillow is required to resize artwork. "
+            "Install it with 'pip install yt-music[artwork]'."
+        ) from e
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        if max(image.size) <= max_size and image.format == "JPEG":
+            return image_bytes
+
+        image.thumbnail((max_size, max_size))
+
+        output = io.BytesIO()
+        image.convert("RGB").save(output, format="JPEG", quality=quality, optimize=True)
+
+    return output.getvalue()
+
+
+def load_artwork(
+    image_file: Path, max_size: Optional[int] = None, quality: int = 90
+) -> bytes:
+    """
+    Read album art into memory once so the same buffer can be shared by every track.
+
+    Args:
+        image_file (Path): Path to image.
+        max_size (Optional[int]): Downscale to this many pixels per side if set.
+        quality (int): JPEG quality used when downscaling.
+
+    Returns:
+        bytes: Image data.
+    """
+
+    image_bytes = image_file.read_bytes()
+    if max_size is None:
+        return image_bytes
+
+    resized_bytes = resize_artwork(image_bytes, max_size=max_size, quality=quality)
+    if len(resized_bytes) != len(image_bytes):
+        print(f"Resized artwork from {len(image_bytes)} to {len(resized_bytes)} bytes.")
+
+    return resized_bytes
@@ -0,0 +1,133 @@
+"""
+Utils for caching extracted YouTube info on disk.
+"""
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict
+from urllib.parse import parse_qs, urlparse
+
+# cached info expires after a day
+DEFAULT_TTL = 24 * 60 * 60
+
+# least recently used entries are evicted above this many entries
+DEFAULT_MAX_ENTRIES = 256
+
+
+def get_cache_dir() -> Path:
+    """
+    Return the cache directory, honouring `XDG_CACHE_HOME`.
+    """
+
+    cache_home = os.environ.get("XDG_CACHE_HOME")
+    if cache_home:
+        return Path(cache_home) / "yt-music"
+    return Path.home() / ".cache" / "yt-music"
+
+
+def normalize_url(youtube_url: str) -> str:
+    """
+    Normalize a YouTube URL so equivalent links share a cache entry.
+    Tracking parameters such as `si` and `feature` are dropped, while the
+    playlist of a video link is kept, as yt_dlp extracts the whole playlist.
+
+    Args:
+        youtube_url (str): URL of YouTube playlist or video.
+
+    Returns:
+        str: Normalized URL.
+    """
+
+    parsed = urlparse(youtube_url.strip())
+    host = parsed.netloc.lower()
+    query = parse_qs(parsed.query)
+
+    playlist = f"&list={query['list'][0]}" if "list" in query else ""
+
+    if host == "youtu.be":
+        return f"https://www.youtube.com/watch?v={parsed.path.strip('/')}{playlist}"
+
+    if host in ("youtube.com", "m.youtube.com", "music.youtube.com"):
+        host = "www.youtube.com"
+
+    if parsed.path == "/playlist" and "list" in query:
+        return f"https://{host}/playlist?list={query['list'][0]}"
+
+    if parsed.path == "/watch" and "v" in query:
+        return f"https://{host}/watch?v={query['v'][0]}{playlist}"
+
+    return f"https://{host}{parsed.path}"
+
+
+def get_cache_path(namespace: str, key: str) -> Path:
+    """
+    Return the path of the cache file for a key.
+    """
+
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return get_cache_dir() / namespace / f"{digest}.json"
+
+
+def load_cache_entry(namespace: str, key: str, ttl: float = DEFAULT_TTL) -> Any:
+    """
+    Load a cached value. Marks the entry as recently used.
+
+    Args:
+        namespace (str): Cache sub-directory.
+        key (str): Cache key.
+        ttl (float): Maximum age of the entry in seconds.
+
+    Returns:
+        Any: Cached value. Returns `None` if missing, expired or unreadable.
+    """
+
+    cache_path = get_cache_path(namespace, key)
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            entry: Dict[str, Any] = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if entry.get("key") != key or time.time() - entry.get("created", 0) > ttl:
+        return None
+
+    # modification time tracks the last use for LRU eviction
+    os.utime(cache_path)
+    return entry.get("value")
+
+
+def save_cache_entry(
+    namespace: str, key: str, value: Any, max_entries: int = DEFAULT_MAX_ENTRIES
+) -> None:
+    """
+    Save a value to the cache, evicting the least recently used entries
+    above `max_entries` together with any data files sharing their name.
+
+    Args:
+        namespace (str): Cache sub-directory.
+        key (str): Cache key.
+        value (Any): JSON serializable value.
+        max_entries (int): Maximum number of entries in the namespace.
+    """
+
+    cache_path = get_cache_path(namespace, key)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+    entry = {"key": key, "created": time.time(), "value": value}
+
+    # write to a temporary file first so readers never see a partial entry
+    part_path = cache_path.with_name(f"{cache_path.name}.{os.getpid()}.part")
+    with open(part_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f)
+    part_path.replace(cache_path)
+
+    entries = sorted(
+        cache_path.parent.glob("*.json"), key=lambda path: path.stat().st_mtime
+    )
+    for stale_path in entries[: max(len(entries) - max_entries, 0)]:
+        # also remove data files stored alongside the entry
+        for entry_path in stale_path.parent.glob(f"{stale_path.stem}.*"):
+            entry_path.unlink(missing_ok=True)
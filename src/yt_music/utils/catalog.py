@@ -0,0 +1,318 @@
+"""
+Utils for the library catalog.
+
+The catalog is a SQLite database indexing every downloaded album and track by
+path, source video ID, size, hash and tags, so the library can be searched
+without walking the file system.
+"""
+
+import os
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, TypedDict
+from urllib.parse import parse_qs, urlparse
+from yt_music.utils.manifest import hash_file
+from yt_music.utils.tags import TrackInfo
+
+CATALOG_FILE_NAME = "catalog.db"
+
+# seconds a writer waits for another process to release the database
+CATALOG_TIMEOUT = 30.0
+
+# video IDs per lookup query, below SQLite's bound parameter limit
+LOOKUP_BATCH_SIZE = 500
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS albums (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    artist TEXT,
+    album TEXT,
+    year INTEGER,
+    source_url TEXT
+);
+
+CREATE TABLE IF NOT EXISTS tracks (
+    id INTEGER PRIMARY KEY,
+    album_id INTEGER NOT NULL REFERENCES albums (id) ON DELETE CASCADE,
+    path TEXT NOT NULL UNIQUE,
+    video_id TEXT,
+    title TEXT,
+    artist TEXT,
+    album TEXT,
+    year INTEGER,
+    track_number INTEGER,
+    size INTEGER,
+    mtime_ns INTEGER,
+    sha256 TEXT,
+    audio_sha256 TEXT
+);
+
+CREATE INDEX IF NOT EXISTS tracks_album_id ON tracks (album_id);
+CREATE INDEX IF NOT EXISTS tracks_video_id ON tracks (video_id);
+CREATE INDEX IF NOT EXISTS tracks_sha256 ON tracks (sha256);
+"""
+
+# columns added to the tracks table after it was first released
+CATALOG_ADDED_COLUMNS = {"audio_sha256": "TEXT"}
+
+CATALOG_ADDED_INDEXES = """
+CREATE INDEX IF NOT EXISTS tracks_audio_sha256 ON tracks (audio_sha256);
+"""
+
+
+class CatalogTrack(TypedDict):
+    """Type for a track row in the catalog."""
+
+    path: str
+    video_id: Optional[str]
+    tags: Optional[TrackInfo]
+    size: int
+    mtime_ns: int
+    sha256: Optional[str]
+    audio_sha256: Optional[str]
+
+
+def get_catalog_path() -> Path:
+    """
+    Return the path of the catalog database, honouring `XDG_DATA_HOME`.
+    """
+
+    data_home = os.environ.get("XDG_DATA_HOME")
+    if data_home:
+        return Path(data_home) / "yt-music" / CATALOG_FILE_NAME
+    return Path.home() / ".local" / "share" / "yt-music" / CATALOG_FILE_NAME
+
+
+@contextmanager
+def open_catalog(catalog_path: Optional[Path] = None) -> Iterator[sqlite3.Connection]:
+    """
+    Open the catalog, creating it if it does not exist. Changes are committed
+    when the context exits without an error.
+
+    Args:
+        catalog_path (Optional[Path]): Database file. Defaults to `get_catalog_path`.
+    """
+
+    catalog_path = catalog_path or get_catalog_path()
+    catalog_path.parent.mkdir(parents=True, exist_ok=True)
+
+    connection = sqlite3.connect(catalog_path, timeout=CATALOG_TIMEOUT)
+    try:
+        connection.row_factory = sqlite3.Row
+        # readers do not block the writer of another album or tool
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.executescript(CATALOG_SCHEMA)
+        migrate_catalog(connection)
+        with connection:
+            yield connection
+    finally:
+        connection.close()
+
+
+def migrate_catalog(connection: sqlite3.Connection) -> None:
+    """
+    Add the columns and indexes that a catalog created by an older version lacks.
+    """
+
+    columns = {row["name"] for row in connection.execute("PRAGMA table_info (tracks)")}
+    for column, column_type in CATALOG_ADDED_COLUMNS.items():
+        if column in columns:
+            continue
+        try:
+            connection.execute(f"ALTER TABLE tracks ADD COLUMN {column} {column_type}")
+        except sqlite3.OperationalError as e:
+            # another process added it first
+            if "duplicate column" not in str(e):
+                raise
+    connection.executescript(CATALOG_ADDED_INDEXES)
+
+
+def get_video_id(youtube_url: str) -> Optional[str]:
+    """
+    Return the video ID of a YouTube video URL, or `None` for other URLs.
+    """
+
+    parsed = urlparse(youtube_url.strip())
+    if parsed.netloc.lower() == "youtu.be":
+        return parsed.path.strip("/") or None
+
+    video_ids = parse_qs(parsed.query).get("v")
+    if parsed.path == "/watch" and video_ids:
+        return video_ids[0]
+
+    return None
+
+
+def add_album(
+    connection: sqlite3.Connection,
+    music_dir_path: Path,
+    artist: Optional[str],
+    album: Optional[str],
+    year: Optional[int],
+    source_url: Optional[str],
+) -> int:
+    """
+    Add an album directory to the catalog, or update it if it is already there.
+
+    Returns:
+        int: ID of the album row.
+    """
+
+    connection.execute(
+        """
+        INSERT INTO albums (path, artist, album, year, source_url)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (path) DO UPDATE SET
+            artist = excluded.artist,
+            album = excluded.album,
+            year = excluded.year,
+            source_url = COALESCE(excluded.source_url, albums.source_url)
+        """,
+        (str(music_dir_path.resolve()), artist, album, year, source_url),
+    )
+    row = connection.execute(
+        "SELECT id FROM albums WHERE path = ?", (str(music_dir_path.resolve()),)
+    ).fetchone()
+    return row["id"]
+
+
+def add_track(
+    connection: sqlite3.Connection, album_id: int, track: CatalogTrack
+) -> None:
+    """
+    Add a track to the catalog, or update it if its path is already there.
+    A known video ID is kept if the new row does not have one.
+    """
+
+    tags = track["tags"]
+    connection.execute(
+        """
+        INSERT INTO tracks (
+            album_id, path, video_id, title, artist, album, year, track_number,
+            size, mtime_ns, sha256, audio_sha256
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (path) DO UPDATE SET
+            album_id = excluded.album_id,
+            video_id = COALESCE(excluded.video_id, tracks.video_id),
+            title = excluded.title,
+            artist = excluded.artist,
+            album = excluded.album,
+            year = excluded.year,
+            track_number = excluded.track_number,
+            size = excluded.size,
+            mtime_ns = excluded.mtime_ns,
+            sha256 = COALESCE(excluded.sha256, tracks.sha256),
+            audio_sha256 = COALESCE(excluded.audio_sha256, tracks.audio_sha256)
+        """,
+        (
+            album_id,
+            track["path"],
+            track["video_id"],
+            tags["title"] if tags else None,
+            tags["artist"] if tags else None,
+            tags["album"] if tags else None,
+            tags["year"] if tags else None,
+            tags["track_number"] if tags else None,
+            track["size"],
+            track["mtime_ns"],
+            track["sha256"],
+            track["audio_sha256"],
+        ),
+    )
+
+
+def update_track_file(connection: sqlite3.Connection, track_path: Path) -> None:
+    """
+    Update the size, modification time and hash of a track whose file changed.
+    """
+
+    stat = track_path.stat()
+    connection.execute(
+        "UPDATE tracks SET size = ?, mtime_ns = ?, sha256 = ? WHERE path = ?",
+        (
+            stat.st_size,
+            stat.st_mtime_ns,
+            hash_file(track_path),
+            str(track_path.resolve()),
+        ),
+    )
+
+
+def find_audio_duplicates(
+    connection: sqlite3.Connection,
+) -> Dict[str, List[Tuple[Path, Optional[str]]]]:
+    """
+    Find tracks that share their audio. Tracks whose file no longer exists are
+    left out.
+
+    Returns:
+        Dict[str, List[Tuple[Path, Optional[str]]]]: Sorted paths and file hashes
+        of two or more tracks, by audio hash.
+    """
+
+    rows = connection.execute(
+        """
+        SELECT audio_sha256, path, sha256 FROM tracks
+        WHERE audio_sha256 IN (
+            SELECT audio_sha256 FROM tracks
+            WHERE audio_sha256 IS NOT NULL
+            GROUP BY audio_sha256 HAVING COUNT(*) > 1
+        )
+        ORDER BY audio_sha256, path
+        """
+    )
+
+    duplicates: Dict[str, List[Tuple[Path, Optional[str]]]] = {}
+    for row in rows:
+        track_path = Path(row["path"])
+        if track_path.exists():
+            duplicates.setdefault(row["audio_sha256"], []).append(
+                (track_path, row["sha256"])
+            )
+    return {
+        audio_sha256: tracks
+        for audio_sha256, tracks in duplicates.items()
+        if len(tracks) > 1
+    }
+
+
+def move_track(connection: sqlite3.Connection, old_path: Path, new_path: Path) -> None:
+    """
+    Update the path of a renamed track.
+    """
+
+    connection.execute(
+        "UPDATE tracks SET path = ? WHERE path = ?",
+        (str(new_path.resolve()), str(old_path.resolve())),
+    )
+
+
+def find_video_ids(
+    connection: sqlite3.Connection, video_ids: Iterable[str]
+) -> Dict[str, Path]:
+    """
+    Look up video IDs in the catalog. Tracks whose file no longer exists are
+    not returned.
+
+    Returns:
+        Dict[str, Path]: Path of a track in the library, by video ID.
+    """
+
+    unique_ids = list(dict.fromkeys(video_ids))
+    found: Dict[str, Path] = {}
+    for start in range(0, len(unique_ids), LOOKUP_BATCH_SIZE):
+        batch = unique_ids[start : start + LOOKUP_BATCH_SIZE]
+        placeholders = ", ".join("?" * len(batch))
+        rows = connection.execute(
+            f"SELECT video_id, path FROM tracks WHERE video_id IN ({placeholders})",
+            batch,
+        )
+        for row in rows:
+            track_path = Path(row["path"])
+            if row["video_id"] not in found and track_path.exists():
+                found[row["video_id"]] = track_path
+    return found
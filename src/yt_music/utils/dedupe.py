@@ -0,0 +1,147 @@
+"""
+Utils for storing duplicate tracks once.
+
+Tracks are fingerprinted by their audio payload, with the ID3 tags excluded, so
+the same recording in two albums matches even though its tags differ.
+Duplicates share their data through a reflink, on filesystems that support it.
+Byte-identical copies are cloned whole, copies with different tags only share
+their audio, with the tag written separately. Hardlinks are not used, as tracks
+are tagged in place later, e.g. when the artwork or ReplayGain changes, which
+would change the track of every album sharing the file.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import filecmp
+import hashlib
+import os
+import shutil
+from pathlib import Path
+from typing import Literal, Tuple
+from yt_music.utils.manifest import HASH_CHUNK_SIZE
+from yt_music.utils.tags import get_audio_range
+
+# ioctl cloning a whole file on Linux filesystems with reflinks, such as Btrfs and XFS
+FICLONE = 0x40049409
+
+LinkAction = Literal["reflinked", "linked", "skipped"]
+
+
+def hash_audio(mp3_file: Path) -> str:
+    """
+    Return the SHA-256 hex digest of the audio in an MP3 file, without its ID3 tags.
+    """
+
+    start, end = get_audio_range(mp3_file)
+    digest = hashlib.sha256()
+    with open(mp3_file, "rb") as f:
+        f.seek(start)
+        remaining = end - start
+        while remaining > 0 and (chunk := f.read(min(HASH_CHUNK_SIZE, remaining))):
+            digest.update(chunk)
+            remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def reflink_file(source_file: Path, target_file: Path) -> bool:
+    """
+    Create `target_file` as a copy-on-write clone of `source_file`.
+    Returns `False`, without leaving a target file, if the filesystem does not
+    support reflinks.
+    """
+
+    try:
+        import fcntl
+    except ImportError:
+        return False
+
+    with open(source_file, "rb") as source, open(target_file, "wb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+            return True
+        except OSError:
+            pass
+
+    target_file.unlink()
+    return False
+
+
+def clone_track(source_file: Path, target_file: Path) -> bool:
+    """
+    Copy a track, sharing its data through a reflink where supported.
+    Returns `True` if the data is shared.
+    """
+
+    if reflink_file(source_file=source_file, target_file=target_file):
+        return True
+
+    shutil.copyfile(source_file, target_file)
+    return False
+
+
+def link_duplicate(
+    original_file: Path, duplicate_file: Path, audio_sha256: str
+) -> Tuple[LinkAction, int]:
+    """
+    Replace a duplicate track with a reflink to the original. A byte-identical
+    duplicate shares all of its data. Otherwise the tag of the duplicate is
+    written over the tag of the clone in place, so only the audio is shared.
+    The duplicate is left untouched if the filesystem does not support reflinks.
+
+    Args:
+        original_file (Path): Track that is kept.
+        duplicate_file (Path): Track with the same audio that is replaced.
+        audio_sha256 (str): Audio hash of both tracks.
+
+    Returns:
+        Tuple[LinkAction, int]: Action taken and the number of bytes now shared.
+    """
+
+    import eyed3.id3
+
+    original_stat = original_file.stat()
+    duplicate_stat = duplicate_file.stat()
+    if (original_stat.st_dev, original_stat.st_ino) == (
+        duplicate_stat.st_dev,
+        duplicate_stat.st_ino,
+    ):
+        return "linked", 0
+    if original_stat.st_dev != duplicate_stat.st_dev:
+        return "skipped", 0
+
+    temp_file = duplicate_file.with_name(f".{duplicate_file.name}.dedupe")
+
+    if filecmp.cmp(original_file, duplicate_file, shallow=False):
+        if not reflink_file(source_file=original_file, target_file=temp_file):
+            return "skipped", 0
+        shutil.copystat(duplicate_file, temp_file)
+        os.replace(temp_file, duplicate_file)
+        return "reflinked", duplicate_stat.st_size
+
+    # an ID3v1 tag of the original would be kept at the end of the clone
+    original_start, original_end = get_audio_range(original_file)
+    if original_end != original_stat.st_size:
+        return "skipped", 0
+
+    tag = eyed3.id3.Tag()
+    if not tag.parse(str(duplicate_file)):
+        return "skipped", 0
+
+    if not reflink_file(source_file=original_file, target_file=temp_file):
+        return "skipped", 0
+
+    try:
+        tag.save(str(temp_file))
+
+        # only share the audio if the tag was rewritten in place and the audio is intact
+        temp_start, temp_end = get_audio_range(temp_file)
+        if temp_start != original_start or hash_audio(temp_file) != audio_sha256:
+            temp_file.unlink()
+            return "skipped", 0
+
+        shutil.copystat(duplicate_file, temp_file)
+        os.replace(temp_file, duplicate_file)
+        return "reflinked", temp_end - temp_start
+    except BaseException:
+        temp_file.unlink(missing_ok=True)
+        raise
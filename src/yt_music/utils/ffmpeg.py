@@ -0,0 +1,118 @@
+"""
+Utils for ffmpeg.
+"""
+
+import os
+import shutil
+import subprocess
+from pathlib import Path
+
+# encoder used when a downloaded stream cannot be copied into the container, by extension
+REMUX_ENCODERS = {".opus": "libopus", ".m4a": "aac"}
+
+
+def transcode_to_mp3(
+    source_file: Path, target_file: Path, quality: str = "192"
+) -> None:
+    """
+    Transcode an audio file to MP3 with ffmpeg. The source file is removed on success.
+
+    Args:
+        source_file (Path): Path to the downloaded audio file.
+        target_file (Path): Path to the MP3 file to create.
+        quality (str): MP3 bitrate in kbps.
+
+    Raises:
+        RuntimeError: If ffmpeg is not installed or the transcode fails.
+    """
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("Error: ffmpeg not found.")
+
+    command = [
+        ffmpeg,
+        "-y",
+        "-loglevel",
+        "error",
+        "-i",
+        str(source_file),
+        "-vn",
+        "-codec:a",
+        "libmp3lame",
+        "-b:a",
+        f"{quality}k",
+        str(target_file),
+    ]
+
+    process = subprocess.run(command, capture_output=True, text=True, check=False)
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"Error: Failed to transcode '{source_file.name}'. {process.stderr.strip()}"
+        )
+
+    source_file.unlink()
+
+
+def remux_audio(source_file: Path, target_file: Path, quality: str = "192") -> bool:
+    """
+    Copy the audio stream of a downloaded file into the container of `target_file`
+    (Ogg for `.opus`, MP4 for `.m4a`) without re-encoding it. If the stream cannot
+    be copied into that container, it is encoded with the container's codec
+    instead. The source file is removed on success.
+
+    Args:
+        source_file (Path): Path to the downloaded audio file.
+        target_file (Path): Path to the `.opus` or `.m4a` file to create.
+        quality (str): Bitrate in kbps, only used if the stream must be encoded.
+
+    Raises:
+        RuntimeError: If ffmpeg is not installed or both the copy and encode fail.
+        ValueError: If the target file extension is not supported.
+
+    Returns:
+        bool: `True` if the stream was copied, `False` if it was encoded.
+    """
+
+    encoder = REMUX_ENCODERS.get(target_file.suffix)
+    if encoder is None:
+        raise ValueError(f"Error: Unsupported audio container '{target_file.suffix}'.")
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("Error: ffmpeg not found.")
+
+    # the download may already have the target name, e.g. an M4A stream
+    temp_file = target_file.with_name(f".{target_file.stem}.remux{target_file.suffix}")
+
+    copied = True
+    for codec_args in (["copy"], [encoder, "-b:a", f"{quality}k"]):
+        command = [
+            ffmpeg,
+            "-y",
+            "-loglevel",
+            "error",
+            "-i",
+            str(source_file),
+            "-vn",
+            "-map",
+            "0:a:0",
+            "-codec:a",
+            *codec_args,
+            str(temp_file),
+        ]
+        process = subprocess.run(command, capture_output=True, text=True, check=False)
+        if process.returncode == 0:
+            break
+        copied = False
+    else:
+        temp_file.unlink(missing_ok=True)
+        raise RuntimeError(
+            f"Error: Failed to remux '{source_file.name}'. {process.stderr.strip()}"
+        )
+
+    os.replace(temp_file, target_file)
+    if source_file != target_file:
+        source_file.unlink()
+
+    return copied
@@ -0,0 +1,243 @@
+"""
+Utils for choosing which stream of a video to download.
+
+yt_dlp's `bestaudio/best` fetches its best ranked audio stream, or a whole video if
+there is none. The planner here looks at the bitrate, codec and size of every
+format instead, and picks the smallest audio stream that is good enough for the
+output format.
+"""
+
+from typing import Any, Callable, Dict, Iterator, List, Optional, TypedDict
+
+# codecs whose stream can be copied as is, by output format
+OUTPUT_CODECS: Dict[str, Optional[str]] = {"mp3": None, "opus": "opus", "m4a": "mp4a"}
+
+# bitrate in kbps an audio stream must match, after codec efficiency is applied
+DEFAULT_TARGET_BITRATE = 128
+
+# quality per kbps of a codec relative to AAC, by codec prefix
+CODEC_EFFICIENCY = {"opus": 1.3, "vorbis": 1.1, "mp4a": 1.0, "mp3": 0.8}
+
+FormatInfo = Dict[str, Any]
+
+
+class FormatPlan(TypedDict):
+    """Type for the stream chosen for a download."""
+
+    format_id: str
+    ext: str
+    acodec: str
+    abr: float
+    filesize: int
+    # effective bitrate in kbps per megabyte downloaded
+    score: float
+    baseline_format_id: Optional[str]
+    bytes_avoided: int
+
+
+def get_codec(format_info: FormatInfo) -> Optional[str]:
+    """
+    Return the audio codec of a format without its profile, e.g. `mp4a` for
+    `mp4a.40.2`, or `None` if the format has no audio or it is not known.
+    """
+
+    acodec = format_info.get("acodec")
+    if not acodec or acodec == "none":
+        return None
+    return acodec.split(".")[0].lower()
+
+
+def is_audio_only(format_info: FormatInfo) -> bool:
+    """
+    Return `True` if a format is an audio stream without video.
+    """
+
+    return get_codec(format_info) is not None and format_info.get("vcodec") == "none"
+
+
+def get_bitrate(format_info: FormatInfo) -> Optional[float]:
+    """
+    Return the audio bitrate of a format in kbps, falling back to the total bitrate
+    of formats that only have audio.
+    """
+
+    abr = format_info.get("abr")
+    if abr:
+        return float(abr)
+    if is_audio_only(format_info) and format_info.get("tbr"):
+        return float(format_info["tbr"])
+    return None
+
+
+def get_effective_bitrate(format_info: FormatInfo) -> Optional[float]:
+    """
+    Return the bitrate of a format weighted by the efficiency of its codec, so
+    streams of different codecs can be compared.
+    """
+
+    bitrate = get_bitrate(format_info)
+    codec = get_codec(format_info)
+    if bitrate is None or codec is None:
+        return None
+    return bitrate * CODEC_EFFICIENCY.get(codec, 1.0)
+
+
+def get_filesize(
+    format_info: FormatInfo, duration: Optional[float] = None
+) -> Optional[int]:
+    """
+    Return the size of a format in bytes, estimated from its total bitrate and
+    the video duration if yt_dlp does not report one.
+    """
+
+    filesize = format_info.get("filesize") or format_info.get("filesize_approx")
+    if filesize:
+        return int(filesize)
+    if duration and format_info.get("tbr"):
+        return int(format_info["tbr"] * duration * 1000 / 8)
+    return None
+
+
+def estimate_duration(formats: List[FormatInfo]) -> Optional[float]:
+    """
+    Estimate the video duration in seconds from the formats that report both a
+    size and a total bitrate, as yt_dlp does not pass the duration to format
+    selectors. Returns `None` if no format reports both.
+    """
+
+    durations = sorted(
+        (get_filesize(f) or 0) * 8 / (f["tbr"] * 1000)
+        for f in formats
+        if get_filesize(f) and f.get("tbr")
+    )
+    return durations[len(durations) // 2] if durations else None
+
+
+def get_baseline_format(formats: List[FormatInfo]) -> Optional[FormatInfo]:
+    """
+    Return the format `bestaudio/best` would pick from a formats list sorted from
+    worst to best by yt_dlp: the last audio stream, or the last format with audio
+    if there is no audio stream.
+    """
+
+    audio_formats = [f for f in formats if is_audio_only(f)] or [
+        f for f in formats if get_codec(f) is not None
+    ]
+    return audio_formats[-1] if audio_formats else None
+
+
+def plan_audio_format(
+    formats: List[FormatInfo],
+    output_format: str = "mp3",
+    target_bitrate: int = DEFAULT_TARGET_BITRATE,
+    duration: Optional[float] = None,
+) -> Optional[FormatPlan]:
+    """
+    Choose the stream to download for an output format. Audio streams without
+    video are always preferred, and streams with the codec of the output format
+    are preferred so they can be copied without re-encoding. Of these, the
+    smallest stream whose effective bitrate meets `target_bitrate` is chosen, or
+    the one with the highest effective bitrate if none does. Dynamic range
+    compressed variants are only used if nothing else is available.
+
+    Args:
+        formats (List[FormatInfo]): Formats of a video, as extracted by yt_dlp.
+        output_format (str): mp3, opus or m4a.
+        target_bitrate (int): Effective bitrate in kbps to aim for.
+        duration (Optional[float]): Video duration in seconds, to estimate sizes.
+
+    Returns:
+        Optional[FormatPlan]: Chosen stream. Returns `None` if no format has audio.
+    """
+
+    candidates = [f for f in formats if get_codec(f) is not None]
+    for narrow in (
+        is_audio_only,
+        lambda f: get_codec(f) == OUTPUT_CODECS[output_format],
+        lambda f: "drc" not in str(f.get("format_id", "")).lower(),
+        lambda f: get_effective_bitrate(f) is not None
+        and get_filesize(f, duration) is not None,
+    ):
+        candidates = [f for f in candidates if narrow(f)] or candidates
+
+    if not candidates:
+        return None
+
+    def size(format_info: FormatInfo) -> int:
+        filesize = get_filesize(format_info, duration)
+        return filesize if filesize is not None else 2**63
+
+    def bitrate(format_info: FormatInfo) -> float:
+        return get_effective_bitrate(format_info) or 0.0
+
+    meeting_target = [f for f in candidates if bitrate(f) >= target_bitrate]
+    if meeting_target:
+        chosen = min(meeting_target, key=lambda f: (size(f), -bitrate(f)))
+    else:
+        chosen = max(candidates, key=lambda f: (bitrate(f), -size(f)))
+
+    chosen_size = get_filesize(chosen, duration) or 0
+    baseline = get_baseline_format(formats)
+    baseline_size = get_filesize(baseline, duration) if baseline is not None else None
+
+    plan: FormatPlan = {
+        "format_id": str(chosen.get("format_id")),
+        "ext": chosen.get("ext") or "",
+        "acodec": chosen.get("acodec") or "",
+        "abr": get_bitrate(chosen) or 0.0,
+        "filesize": chosen_size,
+        "score": bitrate(chosen) / max(chosen_size / 1e6, 1e-6),
+        "baseline_format_id": (
+            str(baseline.get("format_id")) if baseline is not None else None
+        ),
+        "bytes_avoided": max((baseline_size or chosen_size) - chosen_size, 0),
+    }
+    return plan
+
+
+def build_format_selector(
+    output_format: str = "mp3", target_bitrate: int = DEFAULT_TARGET_BITRATE
+) -> Callable[[Dict[str, Any]], Iterator[FormatInfo]]:
+    """
+    Build a yt_dlp `format` option that picks a stream with `plan_audio_format`
+    and prints the bytes it avoids downloading compared to `bestaudio/best`.
+    Sizes of formats that only list a bitrate are estimated with the duration
+    from `estimate_duration`. If no format lists an audio codec, e.g. for HLS
+    or generic extractor formats, the best format is picked as `best` would.
+    """
+
+    def select_format(ctx: Dict[str, Any]) -> Iterator[FormatInfo]:
+        formats: List[FormatInfo] = ctx["formats"]
+        plan = plan_audio_format(
+            formats=formats,
+            output_format=output_format,
+            target_bitrate=target_bitrate,
+            duration=estimate_duration(formats),
+        )
+        if plan is None:
+            # formats are sorted from worst to best, skip those without any stream
+            playable = [
+                f
+                for f in formats
+                if f.get("acodec") != "none" or f.get("vcodec") != "none"
+            ]
+            if playable:
+                print(
+                    "No audio codec listed, selected format "
+                    f"{playable[-1].get('format_id')}."
+                )
+                yield playable[-1]
+            return
+
+        print(
+            f"Selected format {plan['format_id']} ({plan['acodec']}, "
+            f"{plan['abr']:.0f} kbps, {plan['filesize'] / 1e6:.2f} MB), "
+            f"{plan['bytes_avoided'] / 1e6:.2f} MB less than format "
+            f"{plan['baseline_format_id']}."
+        )
+        for format_info in formats:
+            if str(format_info.get("format_id")) == plan["format_id"]:
+                yield format_info
+                return
+
+    return select_format
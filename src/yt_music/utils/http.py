@@ -0,0 +1,247 @@
+"""
+Utils for HTTP requests.
+
+requests is imported on first use to keep startup fast.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import random
+import threading
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, Optional, Tuple
+from yt_music.utils.ratelimit import (
+    report_success,
+    report_throttled,
+    throttle_bytes,
+    wait_for_request,
+)
+
+if TYPE_CHECKING:
+    import requests
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT: Tuple[float, float] = (5.0, 30.0)
+
+DEFAULT_RETRIES = 3
+
+# base delay in seconds, doubled after every failed attempt
+DEFAULT_BACKOFF = 0.5
+
+MAX_BACKOFF = 30.0
+
+RETRY_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# status codes a host sends when it wants fewer requests
+THROTTLE_STATUS_CODES = {429, 503}
+
+POOL_SIZE = 16
+
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+_session: Optional["requests.Session"] = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_size: int = POOL_SIZE) -> "requests.Session":
+    """
+    Create a session with a keep-alive connection pool of `pool_size` per host.
+    """
+
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session() -> "requests.Session":
+    """
+    Return the session shared by the whole process, creating it on first use.
+    """
+
+    global _session  # pylint: disable=global-statement
+
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def get_backoff(attempt: int, backoff: float = DEFAULT_BACKOFF) -> float:
+    """
+    Return a jittered exponential delay for a retry attempt, starting from 0.
+    """
+
+    return random.uniform(0, min(backoff * 2**attempt, MAX_BACKOFF))
+
+
+def get_retry_after(response: "requests.Response") -> Optional[float]:
+    """
+    Return the delay requested by a `Retry-After` header in seconds, if any.
+    """
+
+    retry_after = response.headers.get("Retry-After")
+    if retry_after is None:
+        return None
+
+    try:
+        return min(max(float(retry_after), 0.0), MAX_BACKOFF)
+    except ValueError:
+        return None
+
+
+def request_with_retries(
+    url: str,
+    session: Optional["requests.Session"] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = DEFAULT_BACKOFF,
+) -> "requests.Response":
+    """
+    Send a streaming GET request, retrying connection errors, timeouts and
+    retryable status codes with jittered exponential backoff.
+    Every attempt waits for the request rate limit of the host, and throttling
+    responses slow down later requests to it, see `yt_music.utils.ratelimit`.
+    Only getting the response is retried. Errors while the caller reads the body
+    are raised to it, see `download_to_file` to retry those too.
+
+    Args:
+        url (str): URL to request.
+        session (Optional[requests.Session]): Defaults to the shared session.
+        headers (Optional[Dict[str, str]]): Extra request headers.
+        timeout (Tuple[float, float]): Connect and read timeouts in seconds.
+        retries (int): Number of retries after the first attempt.
+        backoff (float): Base delay between attempts in seconds.
+
+    Raises:
+        requests.exceptions.RequestException: If the last attempt fails to connect.
+
+    Returns:
+        requests.Response: The last response. The caller must close it.
+    """
+
+    response, _ = _send_with_retries(url, session, headers, timeout, retries, backoff)
+    return response
+
+
+def _send_with_retries(
+    url: str,
+    session: Optional["requests.Session"],
+    headers: Optional[Dict[str, str]],
+    timeout: Tuple[float, float],
+    retries: int,
+    backoff: float,
+    attempt: int = 0,
+) -> Tuple["requests.Response", int]:
+    # see `request_with_retries`, counting attempts from `attempt` and returning
+    # the attempt the response came from
+
+    import requests
+
+    session = session if session is not None else get_session()
+
+    while True:
+        wait_for_request(url)
+        try:
+            response = session.get(url, headers=headers, timeout=timeout, stream=True)
+        except (requests.ConnectionError, requests.Timeout) as e:
+            if attempt >= retries:
+                raise
+            delay = get_backoff(attempt, backoff)
+            print(f"Request to '{url}' failed ({e}). Retrying in {delay:.1f}s.")
+        else:
+            retry_after = get_retry_after(response)
+            if response.status_code in THROTTLE_STATUS_CODES:
+                report_throttled(url, retry_after)
+            elif response.status_code < 400:
+                report_success(url)
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                return response, attempt
+
+            response.close()
+            delay = (
+                retry_after
+                if retry_after is not None
+                else get_backoff(attempt, backoff)
+            )
+            print(
+                f"Request to '{url}' returned {response.status_code}. "
+                f"Retrying in {delay:.1f}s."
+            )
+
+        time.sleep(delay)
+        attempt += 1
+
+
+def download_to_file(
+    url: str,
+    file_path: Path,
+    session: Optional["requests.Session"] = None,
+    headers: Optional[Dict[str, str]] = None,
+    timeout: Tuple[float, float] = DEFAULT_TIMEOUT,
+    retries: int = DEFAULT_RETRIES,
+    backoff: float = DEFAULT_BACKOFF,
+    chunk_size: int = DOWNLOAD_CHUNK_SIZE,
+) -> "requests.Response":
+    """
+    Send a GET request with `request_with_retries` and stream the body of a 200
+    response to `file_path`, counting it against the bandwidth limit.
+    `request_with_retries` only covers getting the response, so if the connection
+    drops or times out while the body is read, the request is sent again and the
+    file is written from the start. Failed responses and failed reads count
+    against the same `retries`, so at most `retries + 1` requests are sent.
+
+    Args:
+        url (str): URL to request.
+        file_path (Path): File to write the body to. Not written for other statuses.
+        session (Optional[requests.Session]): Defaults to the shared session.
+        headers (Optional[Dict[str, str]]): Extra request headers.
+        timeout (Tuple[float, float]): Connect and read timeouts in seconds.
+        retries (int): Number of retries after the first attempt.
+        backoff (float): Base delay between attempts in seconds.
+        chunk_size (int): Bytes read at a time.
+
+    Raises:
+        requests.exceptions.RequestException: If the last attempt fails to connect
+            or to read the body.
+
+    Returns:
+        requests.Response: The last response, closed.
+    """
+
+    import requests
+
+    attempt = 0
+    while True:
+        response, attempt = _send_with_retries(
+            url, session, headers, timeout, retries, backoff, attempt=attempt
+        )
+        with response:
+            if response.status_code != 200:
+                return response
+
+            try:
+                with open(file_path, "wb") as f:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        throttle_bytes(len(chunk))
+                        f.write(chunk)
+                return response
+            except (
+                requests.ConnectionError,
+                requests.Timeout,
+                requests.exceptions.ChunkedEncodingError,
+            ) as e:
+                if attempt >= retries:
+                    raise
+                delay = get_backoff(attempt, backoff)
+                print(f"Reading '{url}' failed ({e}). Retrying in {delay:.1f}s.")
+
+        time.sleep(delay)
+        attempt += 1
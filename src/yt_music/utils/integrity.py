@@ -0,0 +1,246 @@
+"""
+Utils for checking downloaded MP3 files for damage.
+
+The audio between the ID3 tags is read through a memory map and walked frame by
+frame, following the length of each frame from its header. Bytes that are not
+part of a frame, a cut off last frame, a frame count that differs from the one in
+the Xing or VBRI header of the encoder, and a duration that differs from the
+video's all point to a truncated download or transcode or corrupt data.
+"""
+
+import functools
+import mmap
+import struct
+from pathlib import Path
+from typing import List, Optional, Tuple, TypedDict
+from yt_music.utils.tags import get_audio_range
+
+# durations from YouTube are whole seconds, and the encoder adds a few frames
+DURATION_TOLERANCE = 2.0
+
+# bits of a frame header that must stay the same within a stream: sync word,
+# version, layer and sample rate
+STREAM_MASK = 0xFFFE0C00
+
+# bits of a frame header that the frame length depends on
+LENGTH_MASK = 0xFFFEFE00
+
+# bitrates in kbps by (MPEG-1, layer) and bitrate index
+BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# sample rates by version bits: MPEG-2.5, reserved, MPEG-2, MPEG-1
+SAMPLE_RATES = ((11025, 12000, 8000), (), (22050, 24000, 16000), (44100, 48000, 32000))
+
+
+class TrackCheck(TypedDict):
+    """Type for the result of checking an MP3 file."""
+
+    path: str
+    size: int
+    frames: int
+    # seconds of audio in the frames found
+    duration: float
+    expected_duration: Optional[float]
+    # empty if the file is intact
+    problems: List[str]
+
+
+@functools.lru_cache(maxsize=256)
+def parse_frame_header(header: int) -> Optional[Tuple[int, int, int]]:
+    """
+    Parse a 4 byte MPEG audio frame header read as a big-endian integer.
+    Returns the frame length in bytes, the samples in the frame and the sample
+    rate, or `None` if it is not a valid header.
+    """
+
+    if header & 0xFFE00000 != 0xFFE00000:
+        return None
+
+    version = (header >> 19) & 0x3
+    layer = 4 - ((header >> 17) & 0x3)
+    bitrate_index = (header >> 12) & 0xF
+    sample_rate_index = (header >> 10) & 0x3
+    padding = (header >> 9) & 0x1
+
+    # reserved values, and free format streams, whose frame length is not given
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or sample_rate_index == 3:
+        return None
+
+    mpeg1 = version == 3
+    bitrate = BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][sample_rate_index]
+
+    if layer == 1:
+        return (12 * bitrate // sample_rate + padding) * 4, 384, sample_rate
+
+    samples = 1152 if layer == 2 or mpeg1 else 576
+    return samples // 8 * bitrate // sample_rate + padding, samples, sample_rate
+
+
+def read_encoder_header(
+    data: mmap.mmap, position: int, length: int, header: int
+) -> Tuple[bool, Optional[int]]:
+    """
+    Look for a Xing, Info or VBRI header in the frame at `position`, which
+    encoders write in place of the first audio frame.
+    Returns whether the frame is such a header, and the frame count it lists.
+    """
+
+    mpeg1 = (header >> 19) & 0x3 == 3
+    mono = header & 0xC0 == 0xC0
+    # a Xing header follows the side information of the frame
+    if mpeg1:
+        xing_position = position + 4 + (17 if mono else 32)
+    else:
+        xing_position = position + 4 + (9 if mono else 17)
+
+    frame_end = position + length
+    if data[xing_position : xing_position + 4] in (b"Xing", b"Info"):
+        if xing_position + 12 > frame_end:
+            return True, None
+        (flags,) = struct.unpack_from(">I", data, xing_position + 4)
+        if not flags & 0x1:
+            return True, None
+        return True, struct.unpack_from(">I", data, xing_position + 8)[0]
+
+    if data[position + 36 : position + 40] == b"VBRI" and position + 54 <= frame_end:
+        return True, struct.unpack_from(">I", data, position + 50)[0]
+
+    return False, None
+
+
+def check_mp3(mp3_file: Path, expected_duration: Optional[float] = None) -> TrackCheck:
+    """
+    Check that an MP3 file holds an unbroken stream of MPEG audio frames.
+    The file is memory-mapped and only the frame headers are read.
+
+    Args:
+        mp3_file (Path): Path to the MP3 file.
+        expected_duration (Optional[float]): Duration of the video in seconds.
+            The duration is not checked if it is not given.
+
+    Returns:
+        TrackCheck: Frames and duration found, and a description of every problem.
+    """
+
+    result: TrackCheck = {
+        "path": str(mp3_file),
+        "size": 0,
+        "frames": 0,
+        "duration": 0.0,
+        "expected_duration": expected_duration,
+        "problems": [],
+    }
+    problems = result["problems"]
+
+    try:
+        result["size"] = mp3_file.stat().st_size
+        if result["size"] == 0:
+            problems.append("empty file")
+            return result
+
+        start, end = get_audio_range(mp3_file)
+        with (
+            open(mp3_file, "rb") as f,
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data,
+        ):
+            stream_header = None
+            header_frames: Optional[int] = None
+            samples = 0
+            sample_rate = 0
+            skipped = 0
+            first_skipped: Optional[int] = None
+            # a header found after skipped bytes is only trusted if the next
+            # frame starts where it says
+            synced = False
+
+            position = start
+            while position + 4 <= end:
+                (header,) = struct.unpack_from(">I", data, position)
+                frame = (
+                    parse_frame_header(header & LENGTH_MASK)
+                    if stream_header is None
+                    or header & STREAM_MASK == stream_header & STREAM_MASK
+                    else None
+                )
+                if frame is not None and not synced:
+                    next_position = position + frame[0]
+                    if next_position + 4 <= end:
+                        (next_header,) = struct.unpack_from(">I", data, next_position)
+                        if (
+                            next_header & STREAM_MASK != header & STREAM_MASK
+                            or parse_frame_header(next_header & LENGTH_MASK) is None
+                        ):
+                            frame = None
+
+                if frame is None:
+                    # lost sync, skip to the next byte a header can start with
+                    next_position = data.find(b"\xff", position + 1, end)
+                    if next_position < 0:
+                        next_position = end
+                    if first_skipped is None:
+                        first_skipped = position
+                    skipped += next_position - position
+                    position = next_position
+                    synced = False
+                    continue
+
+                length, frame_samples, sample_rate = frame
+                if position + length > end:
+                    problems.append(
+                        f"last frame cut off by {position + length - end} bytes"
+                    )
+                    position = end
+                    break
+
+                if stream_header is None:
+                    stream_header = header
+                    is_encoder_header, header_frames = read_encoder_header(
+                        data, position, length, header
+                    )
+                    if is_encoder_header:
+                        position += length
+                        synced = True
+                        continue
+
+                result["frames"] += 1
+                samples += frame_samples
+                position += length
+                synced = True
+
+            if position < end:
+                if first_skipped is None:
+                    first_skipped = position
+                skipped += end - position
+
+    except (OSError, ValueError) as e:
+        problems.append(f"unreadable: {e}")
+        return result
+
+    if result["frames"] == 0:
+        problems.append("no MPEG audio frames")
+        return result
+
+    result["duration"] = samples / sample_rate
+    if skipped:
+        problems.append(f"{skipped} bytes outside frames, from offset {first_skipped}")
+    if header_frames is not None and header_frames != result["frames"]:
+        problems.append(
+            f"{result['frames']} frames, the encoder header lists {header_frames}"
+        )
+    if (
+        expected_duration is not None
+        and abs(result["duration"] - expected_duration) > DURATION_TOLERANCE
+    ):
+        problems.append(
+            f"{result['duration']:.1f}s long, the video is {expected_duration:.0f}s"
+        )
+
+    return result
@@ -0,0 +1,257 @@
+"""
+Utils for measuring loudness and computing ReplayGain.
+
+Tracks are measured as in ITU-R BS.1770 / EBU R128: the decoded audio is
+K-weighted, its mean square is taken over 400 ms blocks overlapping by 75%, and
+blocks below -70 LUFS, then those more than 10 LU below the mean of the rest,
+are left out. Album loudness is gated over the blocks of all its tracks.
+
+Tracks are decoded with ffmpeg, and measured with NumPy, installed with the
+`loudness` extra.
+"""
+
+# pylint: disable=import-outside-toplevel
+
+import functools
+import shutil
+import subprocess
+from pathlib import Path
+from typing import Any, List, Optional, TypedDict
+from yt_music.utils.tags import ReplayGainInfo
+
+# tracks are resampled to the rate the K-weighting filter is specified at
+SAMPLE_RATE = 48000
+CHANNELS = 2
+
+# blocks are built from 100 ms segments, four to a block
+SEGMENT_SAMPLES = SAMPLE_RATE // 10
+SEGMENTS_PER_BLOCK = 4
+
+# audio is filtered in chunks of this many segments, to bound memory per track
+CHUNK_SEGMENTS = 100
+
+# samples before a chunk that are filtered with it, for the filter to settle
+CONTEXT_SAMPLES = SAMPLE_RATE // 10
+
+# K-weighting biquads at 48 kHz as (b, a): a high shelf, then a high-pass
+K_WEIGHTING = (
+    (
+        (1.53512485958697, -2.69169618940638, 1.19839281085285),
+        (1.0, -1.69065929318241, 0.73248077421585),
+    ),
+    (
+        (1.0, -2.0, 1.0),
+        (1.0, -1.99004745483398, 0.99007225036621),
+    ),
+)
+
+ABSOLUTE_GATE = -70.0
+RELATIVE_GATE = -10.0
+
+# ReplayGain 2.0 plays tracks at this loudness in LUFS
+REFERENCE_LOUDNESS = -18.0
+
+
+class TrackLoudness(TypedDict):
+    """Type for the measurements of a track."""
+
+    # mean square of every 400 ms block, summed over channels
+    blocks: Any
+    # largest absolute sample value
+    peak: float
+
+
+def check_numpy() -> None:
+    """
+    Raise `RuntimeError` with an install hint if NumPy is not installed.
+    """
+
+    try:
+        import numpy  # pylint: disable=unused-import
+    except ImportError as e:
+        raise RuntimeError(
+            "Error: NumPy is required to compute ReplayGain. "
+            "Install it with 'pip install yt-music[loudness]'."
+        ) from e
+
+
+@functools.lru_cache(maxsize=8)
+def get_k_weighting_response(fft_size: int) -> Any:
+    """
+    Return the frequency response of the K-weighting filter at the bins of a
+    real FFT of `fft_size` samples, in single precision like the samples.
+    """
+
+    import numpy as np
+
+    # z^-1 at every bin
+    z = np.exp(-2j * np.pi * np.fft.rfftfreq(fft_size))
+    response = np.ones_like(z)
+    for b, a in K_WEIGHTING:
+        response *= (b[0] + b[1] * z + b[2] * z**2) / (a[0] + a[1] * z + a[2] * z**2)
+    return response.astype(np.complex64)
+
+
+def k_weight(samples: Any) -> Any:
+    """
+    K-weight samples shaped (channels, samples) by filtering them in the frequency
+    domain. They are zero padded, so the filter's decay does not wrap around.
+    """
+
+    import numpy as np
+
+    num_samples = samples.shape[-1]
+    fft_size = 1 << (num_samples + CONTEXT_SAMPLES - 1).bit_length()
+    spectrum = np.fft.rfft(samples, n=fft_size)
+    spectrum *= get_k_weighting_response(fft_size)
+    return np.fft.irfft(spectrum, n=fft_size)[..., :num_samples]
+
+
+def analyze_track(audio_file: Path) -> TrackLoudness:
+    """
+    Decode a track with ffmpeg and measure the loudness of its blocks and its
+    peak. Mono tracks are measured as played on two speakers.
+
+    Args:
+        audio_file (Path): Path to the audio file.
+
+    Raises:
+        RuntimeError: If ffmpeg or NumPy is not installed, or decoding fails.
+
+    Returns:
+        TrackLoudness: Block mean squares and sample peak.
+    """
+
+    check_numpy()
+    import numpy as np
+
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("Error: ffmpeg not found.")
+
+    command = [
+        ffmpeg,
+        "-loglevel",
+        "error",
+        "-i",
+        str(audio_file),
+        "-vn",
+        "-ac",
+        str(CHANNELS),
+        "-ar",
+        str(SAMPLE_RATE),
+        "-f",
+        "f32le",
+        "-",
+    ]
+
+    frame_size = CHANNELS * 4
+    chunk_size = CHUNK_SEGMENTS * SEGMENT_SAMPLES * frame_size
+    context = np.zeros((CHANNELS, 0), dtype=np.float32)
+    segments: List[Any] = []
+    peak = 0.0
+
+    with subprocess.Popen(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    ) as process:
+        assert process.stdout is not None and process.stderr is not None
+        while data := process.stdout.read(chunk_size):
+            data = data[: len(data) - len(data) % frame_size]
+            if not data:
+                continue
+            # one contiguous row per channel, so each is transformed in place
+            samples = np.frombuffer(data, dtype=np.float32).reshape(-1, CHANNELS).T
+            peak = max(peak, float(np.abs(samples).max()))
+
+            # filter with the end of the last chunk so the filter state carries over
+            padded = np.concatenate([context, samples], axis=1)
+            filtered = k_weight(padded)[:, context.shape[1] :]
+            context = padded[:, -CONTEXT_SAMPLES:]
+
+            # a partial segment can only be at the end of the track, and is dropped
+            num_segments = filtered.shape[1] // SEGMENT_SAMPLES
+            squares = np.square(filtered[:, : num_segments * SEGMENT_SAMPLES])
+            segments.append(
+                squares.reshape(CHANNELS, num_segments, SEGMENT_SAMPLES)
+                .mean(axis=2, dtype=np.float64)
+                .sum(axis=0)
+            )
+        stderr = process.stderr.read().decode(errors="replace")
+
+    if process.returncode != 0:
+        raise RuntimeError(
+            f"Error: Failed to decode '{audio_file.name}'. {stderr.strip()}"
+        )
+
+    segment_energies = np.concatenate(segments) if segments else np.zeros(0)
+    if len(segment_energies) < SEGMENTS_PER_BLOCK:
+        blocks = np.zeros(0)
+    else:
+        # each block is the mean of four consecutive segments
+        cumulative = np.concatenate([[0.0], np.cumsum(segment_energies)])
+        blocks = (
+            cumulative[SEGMENTS_PER_BLOCK:] - cumulative[:-SEGMENTS_PER_BLOCK]
+        ) / SEGMENTS_PER_BLOCK
+
+    return {"blocks": blocks, "peak": peak}
+
+
+def _to_loudness(energy: Any) -> Any:
+    import numpy as np
+
+    with np.errstate(divide="ignore"):
+        return -0.691 + 10 * np.log10(energy)
+
+
+def get_integrated_loudness(blocks: Any) -> Optional[float]:
+    """
+    Return the gated loudness in LUFS of block mean squares, or `None` if every
+    block is below the absolute gate, e.g. for silence.
+    """
+
+    import numpy as np
+
+    blocks = np.asarray(blocks)
+    blocks = blocks[_to_loudness(blocks) > ABSOLUTE_GATE]
+    if not len(blocks):
+        return None
+
+    relative_gate = _to_loudness(blocks.mean()) + RELATIVE_GATE
+    blocks = blocks[_to_loudness(blocks) > relative_gate]
+    return float(_to_loudness(blocks.mean()))
+
+
+def get_replaygain(tracks: List[TrackLoudness]) -> List[Optional[ReplayGainInfo]]:
+    """
+    Compute the track and album ReplayGain values of the tracks of an album.
+    Silent tracks get `None`, and are left out of the album values.
+    """
+
+    check_numpy()
+    import numpy as np
+
+    album_blocks = [track["blocks"] for track in tracks if len(track["blocks"])]
+    album_loudness = (
+        get_integrated_loudness(np.concatenate(album_blocks)) if album_blocks else None
+    )
+    album_gain = (
+        REFERENCE_LOUDNESS - album_loudness if album_loudness is not None else None
+    )
+    album_peak = max((track["peak"] for track in tracks), default=0.0)
+
+    replaygains: List[Optional[ReplayGainInfo]] = []
+    for track in tracks:
+        loudness = get_integrated_loudness(track["blocks"])
+        if loudness is None:
+            replaygains.append(None)
+            continue
+        replaygains.append(
+            {
+                "track_gain": REFERENCE_LOUDNESS - loudness,
+                "track_peak": track["peak"],
+                "album_gain": album_gain,
+                "album_peak": album_peak,
+            }
+        )
+
+    return replaygains
@@ -0,0 +1,131 @@
+"""
+Utils for the per-album download manifest.
+
+The manifest is a JSON file in the album directory recording the state of every
+track, so an interrupted download can be resumed without repeating finished work.
+"""
+
+import hashlib
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Literal, Optional, TypedDict
+from yt_music.utils.tags import ReplayGainInfo, TrackInfo
+
+MANIFEST_FILE_NAME = "manifest.json"
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# serializes read-modify-write updates from concurrent pipeline workers
+_manifest_lock = threading.Lock()
+
+
+class TrackRecord(TypedDict):
+    """Type for a track entry in the manifest."""
+
+    youtube_url: str
+    file_name: str
+    size: int
+    sha256: str
+    state: Literal["transcoded", "tagged"]
+    tags: Optional[TrackInfo]
+    # of the artwork embedded with the tags, `None` without artwork
+    artwork_sha256: Optional[str]
+    # ReplayGain written with the tags, `None` if the track was not measured
+    replaygain: Optional[ReplayGainInfo]
+    # of the video in seconds, to check the track against
+    duration: Optional[float]
+
+
+def hash_file(file_path: Path) -> str:
+    """
+    Return the SHA-256 hex digest of a file.
+    """
+
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def load_manifest(music_dir_path: Path) -> Dict[str, TrackRecord]:
+    """
+    Load the manifest of an album directory, keyed by track file name.
+    Returns an empty manifest if none exists or it cannot be read.
+    """
+
+    manifest_path = music_dir_path / MANIFEST_FILE_NAME
+    try:
+        with open(manifest_path, encoding="utf-8") as f:
+            return json.load(f)["tracks"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def record_track(
+    music_dir_path: Path,
+    youtube_url: str,
+    track_path: Path,
+    state: Literal["transcoded", "tagged"],
+    tags: Optional[TrackInfo] = None,
+    artwork_sha256: Optional[str] = None,
+    replaygain: Optional[ReplayGainInfo] = None,
+    duration: Optional[float] = None,
+) -> TrackRecord:
+    """
+    Hash a track and record it in the album manifest.
+
+    Args:
+        music_dir_path (Path): Album directory.
+        youtube_url (str): Source URL of the track.
+        track_path (Path): Path to the track.
+        state (str): `transcoded` or `tagged`.
+        tags (Optional[TrackInfo]): Tags written to the track.
+        artwork_sha256 (Optional[str]): Hash of the artwork written to the track.
+        replaygain (Optional[ReplayGainInfo]): ReplayGain written to the track.
+        duration (Optional[float]): Duration of the video in seconds.
+
+    Returns:
+        TrackRecord: The new manifest entry.
+    """
+
+    record: TrackRecord = {
+        "youtube_url": youtube_url,
+        "file_name": track_path.name,
+        "size": track_path.stat().st_size,
+        "sha256": hash_file(track_path),
+        "state": state,
+        "tags": tags,
+        "artwork_sha256": artwork_sha256,
+        "replaygain": replaygain,
+        "duration": duration,
+    }
+
+    manifest_path = music_dir_path / MANIFEST_FILE_NAME
+    with _manifest_lock:
+        tracks = load_manifest(music_dir_path)
+        tracks[record["file_name"]] = record
+
+        # write to a temporary file first so an interrupted save keeps the old one
+        part_path = manifest_path.with_name(f"{MANIFEST_FILE_NAME}.part")
+        with open(part_path, "w", encoding="utf-8") as f:
+            json.dump({"tracks": tracks}, f, indent=4, ensure_ascii=False)
+        part_path.replace(manifest_path)
+
+    return record
+
+
+def verify_track(music_dir_path: Path, record: TrackRecord, youtube_url: str) -> bool:
+    """
+    Check that a manifest entry matches the file on disk and the expected source.
+    """
+
+    if record["youtube_url"] != youtube_url:
+        return False
+
+    track_path = music_dir_path / record["file_name"]
+    if not track_path.exists() or track_path.stat().st_size != record["size"]:
+        return False
+
+    return hash_file(track_path) == record["sha256"]
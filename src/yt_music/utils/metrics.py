@@ -0,0 +1,253 @@
+"""
+Utils for timing and metrics.
+
+Stages of an album download are timed with `span`. Every finished span is
+written as a JSON line to the log opened with `open_json_log`, and added to
+per-album totals that can be written as a Prometheus or OpenMetrics text file
+with `write_metrics`, or printed as a table with `print_profile`.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, TextIO, Tuple, TypedDict
+
+METRIC_PREFIX = "yt_music"
+
+# stages in the order they run, for the profile table
+PROFILE_STAGES = (
+    "extract",
+    "artwork",
+    "download",
+    "transcode",
+    "verify",
+    "analyze",
+    "tag",
+    "catalog",
+)
+
+
+class StageTotals(TypedDict):
+    """Type for the totals of a stage in an album."""
+
+    count: int
+    seconds: float
+    max_seconds: float
+    bytes: int
+    errors: int
+
+
+# totals by stage and album, and the JSON log, shared by all threads
+_lock = threading.Lock()
+_totals: Dict[Tuple[str, str], StageTotals] = {}
+_json_log: Optional[TextIO] = None
+
+
+@contextmanager
+def open_json_log(log_file: Optional[Path]) -> Iterator[None]:
+    """
+    Append a JSON line for every finished span to `log_file` until the context
+    exits. Nothing is logged if `log_file` is `None`.
+    """
+
+    global _json_log  # pylint: disable=global-statement
+
+    if log_file is None:
+        yield
+        return
+
+    with open(log_file, "a", encoding="utf-8") as f:
+        with _lock:
+            _json_log = f
+        try:
+            yield
+        finally:
+            with _lock:
+                _json_log = None
+
+
+@contextmanager
+def span(stage: str, album: str = "", **fields: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Time a stage. The yielded dictionary is logged with the span, and a `bytes`
+    entry set in it is added to the byte count of the stage.
+
+    Args:
+        stage (str): Stage name, e.g. `download`.
+        album (str): Album the stage is part of.
+        **fields: Extra fields for the JSON log, e.g. the track title.
+    """
+
+    start = time.perf_counter()
+    error = None
+    try:
+        yield fields
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        record_span(stage, album, seconds, fields, error)
+
+
+def record_span(
+    stage: str,
+    album: str,
+    seconds: float,
+    fields: Dict[str, Any],
+    error: Optional[str] = None,
+) -> None:
+    """
+    Add a finished span to the totals and write it to the JSON log.
+    """
+
+    num_bytes = int(fields.get("bytes") or 0)
+    with _lock:
+        totals = _totals.setdefault(
+            (stage, album),
+            {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0, "errors": 0},
+        )
+        totals["count"] += 1
+        totals["seconds"] += seconds
+        totals["max_seconds"] = max(totals["max_seconds"], seconds)
+        totals["bytes"] += num_bytes
+        totals["errors"] += error is not None
+
+        if _json_log is not None:
+            entry = {
+                "time": time.time(),
+                "stage": stage,
+                "album": album,
+                "seconds": round(seconds, 6),
+                "error": error,
+                **fields,
+            }
+            _json_log.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+            _json_log.flush()
+
+
+def get_totals() -> Dict[Tuple[str, str], StageTotals]:
+    """
+    Return a copy of the totals by stage and album.
+    """
+
+    with _lock:
+        return {key: StageTotals(**totals) for key, totals in _totals.items()}
+
+
+def reset_metrics() -> None:
+    """
+    Clear all totals.
+    """
+
+    with _lock:
+        _totals.clear()
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_metrics(openmetrics: bool = False) -> str:
+    """
+    Format the totals in the Prometheus text format, or in the OpenMetrics text
+    format if `openmetrics` is set.
+    """
+
+    totals = get_totals()
+    metrics: List[Tuple[str, str, str, List[Tuple[str, str, float]]]] = [
+        ("stage_seconds", "summary", "Time spent in a stage.", []),
+        ("stage_max_seconds", "gauge", "Longest single run of a stage.", []),
+        ("stage_bytes", "counter", "Bytes downloaded or written by a stage.", []),
+        ("stage_errors", "counter", "Runs of a stage that failed.", []),
+    ]
+    for (stage, album), stage_totals in sorted(totals.items()):
+        labels = f'stage="{_escape_label(stage)}",album="{_escape_label(album)}"'
+        metrics[0][3].append(("_sum", labels, stage_totals["seconds"]))
+        metrics[0][3].append(("_count", labels, stage_totals["count"]))
+        metrics[1][3].append(("", labels, stage_totals["max_seconds"]))
+        metrics[2][3].append(("_total", labels, stage_totals["bytes"]))
+        metrics[3][3].append(("_total", labels, stage_totals["errors"]))
+
+    lines: List[str] = []
+    for name, metric_type, help_text, samples in metrics:
+        # counter names carry the _total suffix in the Prometheus format only
+        family = f"{METRIC_PREFIX}_{name}"
+        if metric_type == "counter" and not openmetrics:
+            family += "_total"
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {metric_type}")
+        for suffix, labels, value in samples:
+            sample_name = f"{METRIC_PREFIX}_{name}{suffix}"
+            lines.append(f"{sample_name}{{{labels}}} {value}")
+
+    if openmetrics:
+        lines.append("# EOF")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(metrics_file: Path, openmetrics: bool = False) -> None:
+    """
+    Atomically write the totals to a text file, e.g. for the node_exporter
+    textfile collector.
+    """
+
+    temp_file = metrics_file.with_name(f".{metrics_file.name}.tmp")
+    temp_file.write_text(format_metrics(openmetrics=openmetrics), encoding="utf-8")
+    os.replace(temp_file, metrics_file)
+    print(f"Saved metrics at '{metrics_file}'")
+
+
+def print_profile(album: str) -> None:
+    """
+    Print the timing breakdown of an album by stage, with the throughput of
+    stages that moved bytes.
+    """
+
+    totals = {
+        stage: stage_totals
+        for (stage, stage_album), stage_totals in get_totals().items()
+        if stage_album == album
+    }
+    stages = [stage for stage in PROFILE_STAGES if stage in totals] + sorted(
+        stage for stage in totals if stage not in PROFILE_STAGES and stage != "album"
+    )
+
+    lines = [
+        f" Profile: {album} ".center(80, "-"),
+        "Stage".ljust(12)
+        + "Count".rjust(7)
+        + "Total".rjust(10)
+        + "Mean".rjust(10)
+        + "Max".rjust(10)
+        + "MB".rjust(10)
+        + "MB/s".rjust(10)
+        + "Errors".rjust(9),
+    ]
+    for stage in stages:
+        stage_totals = totals[stage]
+        megabytes = stage_totals["bytes"] / 1e6
+        rate = (
+            f"{megabytes / stage_totals['seconds']:.2f}"
+            if stage_totals["bytes"] and stage_totals["seconds"]
+            else "-"
+        )
+        lines.append(
+            stage.ljust(12)
+            + str(stage_totals["count"]).rjust(7)
+            + f"{stage_totals['seconds']:.2f}s".rjust(10)
+            + f"{stage_totals['seconds'] / stage_totals['count']:.2f}s".rjust(10)
+            + f"{stage_totals['max_seconds']:.2f}s".rjust(10)
+            + (f"{megabytes:.2f}" if stage_totals["bytes"] else "-").rjust(10)
+            + rate.rjust(10)
+            + str(stage_totals["errors"]).rjust(9)
+        )
+
+    if "album" in totals:
+        # stages overlap across tracks, so their totals can exceed the wall time
+        lines.append(f"Wall time: {totals['album']['seconds']:.2f}s")
+
+    print("\n".join(lines))
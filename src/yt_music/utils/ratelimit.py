@@ -0,0 +1,257 @@
+"""
+Utils for pacing requests and downloads across threads.
+
+Every request to YouTube or an artwork host first takes a token from the bucket of
+its host, so a busy host cannot use up the budget of another, and downloaded bytes
+are taken from one bucket shared by all downloads. Both are unlimited until
+`configure_rate_limits` is called.
+
+When a host throttles us, its requests are paused for the requested delay and its
+request rate is halved. The rate recovers a little after every successful request.
+"""
+
+import threading
+import time
+from typing import Dict, Optional, TypedDict
+from urllib.parse import urlsplit
+
+# lowest fraction of the configured request rate a throttled host is slowed to
+MIN_RATE_FACTOR = 1 / 16
+
+# fraction of the configured request rate regained after a successful request
+RECOVERY_STEP = 0.05
+
+# seconds a throttled host is paused for if it does not say how long
+DEFAULT_PAUSE = 1.0
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, holding up to `burst`.
+    A caller may take more tokens than the bucket holds, and waits for the debt
+    to be refilled, so callers are served in the order they arrive.
+    """
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.burst)
+        self.updated = now
+
+    def set_rate(self, rate: float) -> None:
+        """
+        Change the refill rate, keeping the tokens refilled so far.
+        """
+
+        with self.lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def take(self, amount: float = 1.0) -> float:
+        """
+        Take `amount` tokens, sleeping until they are available.
+        Returns the time waited in seconds.
+        """
+
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+
+class HostState(TypedDict):
+    """Type for the request pacing of a host."""
+
+    bucket: Optional[TokenBucket]
+    # fraction of the configured request rate currently allowed
+    rate_factor: float
+    paused_until: float
+    requests: int
+    throttled: int
+    waited: float
+
+
+class HostStats(TypedDict):
+    """Type for the request counts of a host."""
+
+    requests: int
+    throttled: int
+    waited: float
+    requests_per_second: Optional[float]
+
+
+_lock = threading.Lock()
+_requests_per_second: Optional[float] = None
+_byte_bucket: Optional[TokenBucket] = None
+_hosts: Dict[str, HostState] = {}
+
+
+def configure_rate_limits(
+    requests_per_second: Optional[float] = None,
+    bytes_per_second: Optional[float] = None,
+) -> None:
+    """
+    Set the limits shared by the whole process, and forget how hosts throttled
+    before. A limit of `None` is unlimited.
+
+    Args:
+        requests_per_second (Optional[float]): Requests per second to each host.
+        bytes_per_second (Optional[float]): Bytes per second across all downloads.
+    """
+
+    global _requests_per_second, _byte_bucket  # pylint: disable=global-statement
+
+    if requests_per_second is not None and requests_per_second <= 0:
+        raise ValueError("Error: The request rate must be positive.")
+    if bytes_per_second is not None and bytes_per_second <= 0:
+        raise ValueError("Error: The bandwidth must be positive.")
+
+    with _lock:
+        _requests_per_second = requests_per_second
+        # allow a second's worth of bytes at once
+        _byte_bucket = (
+            TokenBucket(bytes_per_second, bytes_per_second)
+            if bytes_per_second is not None
+            else None
+        )
+        _hosts.clear()
+
+
+def get_host(url: str) -> str:
+    """
+    Return the host name of a URL, or an empty string if it has none.
+    """
+
+    return urlsplit(url).hostname or ""
+
+
+def _get_host_state(host: str) -> HostState:
+    # called with _lock held
+    state = _hosts.get(host)
+    if state is None:
+        state = {
+            # no bursts, so requests are evenly spaced
+            "bucket": (
+                TokenBucket(_requests_per_second, 1.0)
+                if _requests_per_second is not None
+                else None
+            ),
+            "rate_factor": 1.0,
+            "paused_until": 0.0,
+            "requests": 0,
+            "throttled": 0,
+            "waited": 0.0,
+        }
+        _hosts[host] = state
+    return state
+
+
+def wait_for_request(url: str) -> float:
+    """
+    Wait until a request to the host of `url` is allowed.
+    Returns the time waited in seconds.
+    """
+
+    host = get_host(url)
+    with _lock:
+        state = _get_host_state(host)
+        state["requests"] += 1
+        pause = max(state["paused_until"] - time.monotonic(), 0.0)
+        bucket = state["bucket"]
+
+    if pause > 0:
+        time.sleep(pause)
+    waited = pause + (bucket.take() if bucket is not None else 0.0)
+
+    if waited > 0:
+        with _lock:
+            state["waited"] += waited
+    return waited
+
+
+def throttle_bytes(num_bytes: int) -> float:
+    """
+    Account for `num_bytes` downloaded, sleeping if downloads are over the
+    bandwidth limit. Returns the time waited in seconds.
+    """
+
+    with _lock:
+        bucket = _byte_bucket
+
+    if bucket is None or num_bytes <= 0:
+        return 0.0
+    return bucket.take(num_bytes)
+
+
+def report_throttled(url: str, retry_after: Optional[float] = None) -> None:
+    """
+    Slow down requests to the host of `url` after it throttled one, e.g. with
+    HTTP 429. Requests are paused for `retry_after` seconds and the request rate
+    of the host is halved, once for all requests throttled during a pause.
+    """
+
+    host = get_host(url)
+    with _lock:
+        state = _get_host_state(host)
+        state["throttled"] += 1
+        now = time.monotonic()
+        # requests sent before the last slowdown are throttled for the same reason
+        slow_down = now >= state["paused_until"]
+        state["paused_until"] = max(
+            state["paused_until"],
+            now + (retry_after if retry_after is not None else DEFAULT_PAUSE),
+        )
+        if not slow_down:
+            return
+
+        state["rate_factor"] = max(state["rate_factor"] / 2, MIN_RATE_FACTOR)
+        if state["bucket"] is not None and _requests_per_second is not None:
+            rate = _requests_per_second * state["rate_factor"]
+            state["bucket"].set_rate(rate)
+            print(f"Throttled by '{host}', slowing to {rate:.2f} requests/s.")
+
+
+def report_success(url: str) -> None:
+    """
+    Let the request rate of the host of `url` recover after a successful request.
+    """
+
+    host = get_host(url)
+    with _lock:
+        state = _get_host_state(host)
+        if state["rate_factor"] >= 1.0:
+            return
+
+        state["rate_factor"] = min(state["rate_factor"] + RECOVERY_STEP, 1.0)
+        if state["bucket"] is not None and _requests_per_second is not None:
+            state["bucket"].set_rate(_requests_per_second * state["rate_factor"])
+
+
+def get_host_stats() -> Dict[str, HostStats]:
+    """
+    Return the request counts and current request rate of every host seen.
+    """
+
+    with _lock:
+        return {
+            host: {
+                "requests": state["requests"],
+                "throttled": state["throttled"],
+                "waited": state["waited"],
+                "requests_per_second": (
+                    _requests_per_second * state["rate_factor"]
+                    if _requests_per_second is not None
+                    else None
+                ),
+            }
+            for host, state in _hosts.items()
+        }
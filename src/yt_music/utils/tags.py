@@ -1,10 +1,48 @@
 """
 Utils for getting and setting music metadata.
+
+eyed3 is imported on first use to keep startup fast. Opus and M4A files are
+tagged with mutagen, installed with the `tags` extra.
+
+ReplayGain values are written as TXXX frames in MP3 files, R128 comments in Opus
+files and iTunes freeform atoms in M4A files.
 """
 
-from typing import TypedDict
+# pylint: disable=import-outside-toplevel
+
+import base64
+import functools
+import struct
+from typing import Any, Dict, Optional, Tuple, TypedDict
 from pathlib import Path
-import eyed3
+
+# bytes of padding reserved after the ID3 frames so later edits can be made in place
+ID3_PADDING = 4096
+
+# ID3v2 text frames read by `read_id3_tags`, by the `TrackInfo` key they fill
+ID3_TEXT_FRAMES = {
+    b"TIT2": "title",
+    b"TPE1": "artist",
+    b"TALB": "album",
+    b"TDRC": "year",
+    b"TYER": "year",
+    b"TRCK": "track_number",
+}
+
+# size of an ID3v1 tag at the end of a file
+ID3V1_SIZE = 128
+
+# picture type of a front cover in a FLAC picture block
+VORBIS_FRONT_COVER = 3
+
+# Opus R128 gains are relative to -23 LUFS, ReplayGain 2.0 gains to -18 LUFS
+R128_GAIN_OFFSET = -5.0
+
+# namespace of the freeform atoms ReplayGain is stored in by iTunes compatible taggers
+MP4_FREEFORM_PREFIX = "----:com.apple.iTunes:"
+
+# text encodings of ID3v2 text frames, by encoding byte
+ID3_TEXT_ENCODINGS = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
 
 
 class TrackInfo(TypedDict):
@@ -17,6 +55,43 @@ class TrackInfo(TypedDict):
     track_number: int
 
 
+class ReplayGainInfo(TypedDict):
+    """Type for the ReplayGain values of a track."""
+
+    # gains in dB to play at -18 LUFS, peaks as linear sample values
+    track_gain: float
+    track_peak: float
+    album_gain: Optional[float]
+    album_peak: Optional[float]
+
+
+def format_replaygain(replaygain: ReplayGainInfo) -> Dict[str, str]:
+    """
+    Return the ReplayGain tag values by tag name, e.g. `REPLAYGAIN_TRACK_GAIN`.
+    Album values are left out if they are not known.
+    """
+
+    values = {
+        "REPLAYGAIN_TRACK_GAIN": f"{replaygain['track_gain']:+.2f} dB",
+        "REPLAYGAIN_TRACK_PEAK": f"{replaygain['track_peak']:.6f}",
+    }
+    if replaygain["album_gain"] is not None:
+        values["REPLAYGAIN_ALBUM_GAIN"] = f"{replaygain['album_gain']:+.2f} dB"
+    if replaygain["album_peak"] is not None:
+        values["REPLAYGAIN_ALBUM_PEAK"] = f"{replaygain['album_peak']:.6f}"
+    return values
+
+
+def format_r128_gain(gain: float) -> str:
+    """
+    Convert a ReplayGain gain in dB to an Opus R128 gain, a Q7.8 fixed point
+    number relative to -23 LUFS.
+    """
+
+    value = round((gain + R128_GAIN_OFFSET) * 256)
+    return str(min(max(value, -32768), 32767))
+
+
 def set_mp3_tags(mp3_file: Path, tags: TrackInfo) -> None:
     """
     Set tags for an MP3 file.
@@ -25,6 +100,9 @@ def set_mp3_tags(mp3_file: Path, tags: TrackInfo) -> None:
         mp3_file (Path): Path to MP3 file.
         tags (TrackInfo): Dictionary containing track info.
     """
+
+    import eyed3
+
     audio_file = eyed3.load(mp3_file)
     if not audio_file:
         return
@@ -54,6 +132,8 @@ def get_mp3_tags(mp3_file: Path) -> TrackInfo | None:
         TrackInfo | None: MP3 tags. Returns `None` if unsuccessful.
     """
 
+    import eyed3
+
     audio_file = eyed3.load(mp3_file)
     if not audio_file:
         return None
@@ -83,6 +163,8 @@ def set_mp3_art(mp3_file: Path, image_file: Path) -> None:
     Set album art for an MP3 file.
     """
 
+    import eyed3
+
     audio_file = eyed3.load(mp3_file)
     if not audio_file:
         return
@@ -93,3 +175,395 @@ def set_mp3_art(mp3_file: Path, image_file: Path) -> None:
         )
 
     audio_file.tag.save()
+
+
+@functools.lru_cache(maxsize=None)
+def _get_padded_tag_class() -> Any:
+    """
+    Return a subclass of `eyed3.id3.Tag` that leaves `ID3_PADDING` bytes of
+    padding whenever the file has to be rewritten, so later edits can be saved
+    in place. `Tag.save` can only cap the padding, not raise it, and eyed3's
+    module default is left alone for other callers.
+    """
+
+    import eyed3.id3
+
+    class PaddedTag(eyed3.id3.Tag):
+        """ID3 tag rewritten with `ID3_PADDING` bytes of padding."""
+
+        def _render(self, version, curr_tag_size, max_padding_size):
+            rewrite_required, tag_data, padding = super()._render(
+                version, curr_tag_size, max_padding_size
+            )
+            if not rewrite_required or len(padding) >= ID3_PADDING:
+                return rewrite_required, tag_data, padding
+
+            # rendered again as if the old tag had room for the frames and padding
+            _, tag_data, padding = super()._render(
+                version, len(tag_data) + ID3_PADDING, None
+            )
+            return True, tag_data, padding
+
+    return PaddedTag
+
+
+def apply_track_metadata(
+    mp3_file: Path,
+    tags: TrackInfo,
+    image_bytes: Optional[bytes] = None,
+    keep_existing: bool = True,
+    replaygain: Optional[ReplayGainInfo] = None,
+) -> None:
+    """
+    Set tags and album art for an MP3 file in a single load and save.
+    Only the ID3 tag is parsed, the audio stream is not scanned.
+
+    Args:
+        mp3_file (Path): Path to MP3 file.
+        tags (TrackInfo): Dictionary containing track info.
+        image_bytes (Optional[bytes]): JPEG album art. Not set if `None`.
+        keep_existing (bool): Keep the other frames of an existing tag. If not
+            set, the existing tag is replaced, in place if it is large enough.
+        replaygain (Optional[ReplayGainInfo]): Written as TXXX frames. Not set
+            if `None`.
+    """
+
+    import eyed3
+
+    tag_class = _get_padded_tag_class()
+    tag = tag_class()
+    if not keep_existing or not tag.parse(str(mp3_file)):
+        tag = tag_class()
+
+    tag.title = tags["title"]
+    tag.artist = tags["artist"]
+    tag.album = tags["album"]
+    tag.recording_date = eyed3.core.Date(tags["year"])
+    tag.track_num = tags["track_number"]
+
+    if image_bytes is not None:
+        tag.images.set(
+            eyed3.id3.frames.ImageFrame.FRONT_COVER, image_bytes, "image/jpeg"
+        )
+
+    if replaygain is not None:
+        for name, value in format_replaygain(replaygain).items():
+            tag.user_text_frames.set(value, name)
+
+    tag.save(str(mp3_file))
+
+
+def _check_mutagen() -> None:
+    """
+    Raise `RuntimeError` with an install hint if mutagen is not installed.
+    """
+
+    try:
+        import mutagen  # pylint: disable=unused-import
+    except ImportError as e:
+        raise RuntimeError(
+            "Error: mutagen is required to tag Opus and M4A files. "
+            "Install it with 'pip install yt-music[tags]'."
+        ) from e
+
+
+def set_vorbis_tags(
+    opus_file: Path,
+    tags: TrackInfo,
+    image_bytes: Optional[bytes] = None,
+    keep_existing: bool = True,
+    replaygain: Optional[ReplayGainInfo] = None,
+) -> None:
+    """
+    Set the Vorbis comments and album art of an Ogg Opus file in a single save.
+    The art is stored as a base64 encoded FLAC picture block.
+
+    Args:
+        opus_file (Path): Path to Opus file.
+        tags (TrackInfo): Dictionary containing track info.
+        image_bytes (Optional[bytes]): JPEG album art. Not set if `None`.
+        keep_existing (bool): Keep the other comments of the file.
+        replaygain (Optional[ReplayGainInfo]): Written as R128 gain comments,
+            which Opus uses instead of ReplayGain. Not set if `None`.
+
+    Raises:
+        RuntimeError: If mutagen is not installed.
+    """
+
+    _check_mutagen()
+    from mutagen.flac import Picture
+    from mutagen.oggopus import OggOpus
+
+    audio_file = OggOpus(opus_file)
+    if not keep_existing:
+        audio_file.tags.clear()
+
+    audio_file["title"] = tags["title"]
+    audio_file["artist"] = tags["artist"]
+    audio_file["album"] = tags["album"]
+    audio_file["date"] = str(tags["year"])
+    audio_file["tracknumber"] = str(tags["track_number"])
+
+    if image_bytes is not None:
+        picture = Picture()
+        picture.type = VORBIS_FRONT_COVER
+        picture.mime = "image/jpeg"
+        picture.data = image_bytes
+        picture_block = base64.b64encode(picture.write()).decode("ascii")
+        audio_file["metadata_block_picture"] = picture_block
+
+    if replaygain is not None:
+        audio_file["R128_TRACK_GAIN"] = format_r128_gain(replaygain["track_gain"])
+        if replaygain["album_gain"] is not None:
+            audio_file["R128_ALBUM_GAIN"] = format_r128_gain(replaygain["album_gain"])
+
+    audio_file.save()
+
+
+def set_mp4_tags(
+    m4a_file: Path,
+    tags: TrackInfo,
+    image_bytes: Optional[bytes] = None,
+    keep_existing: bool = True,
+    replaygain: Optional[ReplayGainInfo] = None,
+) -> None:
+    """
+    Set the metadata atoms and album art of an M4A file in a single save.
+
+    Args:
+        m4a_file (Path): Path to M4A file.
+        tags (TrackInfo): Dictionary containing track info.
+        image_bytes (Optional[bytes]): JPEG album art. Not set if `None`.
+        keep_existing (bool): Keep the other atoms of the file.
+        replaygain (Optional[ReplayGainInfo]): Written as freeform atoms. Not set
+            if `None`.
+
+    Raises:
+        RuntimeError: If mutagen is not installed.
+    """
+
+    _check_mutagen()
+    from mutagen.mp4 import MP4, MP4Cover, MP4FreeForm
+
+    audio_file = MP4(m4a_file)
+    if audio_file.tags is None:
+        audio_file.add_tags()
+    elif not keep_existing:
+        audio_file.tags.clear()
+
+    audio_file["\xa9nam"] = [tags["title"]]
+    audio_file["\xa9ART"] = [tags["artist"]]
+    audio_file["\xa9alb"] = [tags["album"]]
+    audio_file["\xa9day"] = [str(tags["year"])]
+    audio_file["trkn"] = [(tags["track_number"], 0)]
+
+    if image_bytes is not None:
+        audio_file["covr"] = [MP4Cover(image_bytes, imageformat=MP4Cover.FORMAT_JPEG)]
+
+    if replaygain is not None:
+        for name, value in format_replaygain(replaygain).items():
+            key = MP4_FREEFORM_PREFIX + name.lower()
+            audio_file[key] = [MP4FreeForm(value.encode("utf-8"))]
+
+    audio_file.save()
+
+
+def apply_audio_metadata(
+    audio_file: Path,
+    tags: TrackInfo,
+    image_bytes: Optional[bytes] = None,
+    keep_existing: bool = True,
+    replaygain: Optional[ReplayGainInfo] = None,
+) -> None:
+    """
+    Set tags and album art for an MP3, Opus or M4A file in a single save, with the
+    tag format of its extension.
+
+    Args:
+        audio_file (Path): Path to audio file.
+        tags (TrackInfo): Dictionary containing track info.
+        image_bytes (Optional[bytes]): JPEG album art. Not set if `None`.
+        keep_existing (bool): Keep the other tags of the file.
+        replaygain (Optional[ReplayGainInfo]): ReplayGain values. Not set if `None`.
+
+    Raises:
+        ValueError: If the file extension is not supported.
+    """
+
+    match audio_file.suffix.lower():
+        case ".mp3":
+            apply_track_metadata(
+                mp3_file=audio_file,
+                tags=tags,
+                image_bytes=image_bytes,
+                keep_existing=keep_existing,
+                replaygain=replaygain,
+            )
+        case ".opus" | ".ogg":
+            set_vorbis_tags(
+                opus_file=audio_file,
+                tags=tags,
+                image_bytes=image_bytes,
+                keep_existing=keep_existing,
+                replaygain=replaygain,
+            )
+        case ".m4a" | ".mp4":
+            set_mp4_tags(
+                m4a_file=audio_file,
+                tags=tags,
+                image_bytes=image_bytes,
+                keep_existing=keep_existing,
+                replaygain=replaygain,
+            )
+        case _:
+            raise ValueError(
+                f"Error: Unable to tag '{audio_file.name}', unsupported format."
+            )
+
+
+def _syncsafe_to_int(data: bytes) -> int:
+    """
+    Convert a 4 byte ID3v2 syncsafe integer.
+    """
+
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_id3_text(data: bytes) -> str:
+    """
+    Decode the first value of an ID3v2 text frame.
+    """
+
+    encoding = ID3_TEXT_ENCODINGS.get(data[0]) if data else None
+    if encoding is None:
+        raise ValueError("Unknown ID3 text encoding.")
+
+    text = data[1:].decode(encoding)
+    return text.split("\x00", 1)[0]
+
+
+def _read_id3_text_frames(mp3_file: Path) -> Optional[Dict[str, str]]:
+    """
+    Read the text frames used by `TrackInfo` from an ID3v2.3 or ID3v2.4 tag.
+    Only the tag header and frame headers are read. Other frames, such as the
+    album art, are skipped without being read.
+
+    Returns:
+        Optional[Dict[str, str]]: Frame values by `TrackInfo` key. `None` if the
+        tag uses a feature this reader does not handle.
+    """
+
+    values: Dict[str, str] = {}
+    with open(mp3_file, "rb") as f:
+        header = f.read(10)
+        if len(header) < 10 or header[:3] != b"ID3":
+            return values
+
+        version, flags = header[3], header[5]
+        # unsynchronisation and extended headers are left to eyed3
+        if version not in (3, 4) or flags & 0xC0:
+            return None
+
+        tag_end = 10 + _syncsafe_to_int(header[6:10])
+        while f.tell() + 10 <= tag_end:
+            frame_header = f.read(10)
+            frame_id = frame_header[:4]
+            if not frame_id.strip(b"\x00"):
+                break
+
+            if version == 4:
+                frame_size = _syncsafe_to_int(frame_header[4:8])
+            else:
+                frame_size = struct.unpack(">I", frame_header[4:8])[0]
+
+            key = ID3_TEXT_FRAMES.get(frame_id)
+            if key is None:
+                f.seek(frame_size, 1)
+                continue
+
+            # grouped, compressed, encrypted or unsynchronised frames are left
+            # to eyed3, as extra bytes come before their text
+            format_flags = frame_header[9]
+            if format_flags & (0x4E if version == 4 else 0xE0):
+                return None
+
+            data = f.read(frame_size)
+            if version == 4 and format_flags & 0x01:
+                data = data[4:]
+            values.setdefault(key, _decode_id3_text(data))
+
+    return values
+
+
+def get_audio_range(mp3_file: Path) -> Tuple[int, int]:
+    """
+    Return the start and end offsets of the audio in an MP3 file, excluding an
+    ID3v2 tag at the start and an ID3v1 tag at the end.
+    """
+
+    with open(mp3_file, "rb") as f:
+        header = f.read(10)
+        start = 0
+        if len(header) == 10 and header[:3] == b"ID3":
+            start = 10 + _syncsafe_to_int(header[6:10])
+            # ID3v2.4 footer
+            if header[3] == 4 and header[5] & 0x10:
+                start += 10
+
+        end = f.seek(0, 2)
+        if end - start >= ID3V1_SIZE:
+            f.seek(end - ID3V1_SIZE)
+            if f.read(3) == b"TAG":
+                end -= ID3V1_SIZE
+
+    return min(start, end), end
+
+
+def read_id3_tags(mp3_file: Path) -> TrackInfo | None:
+    """
+    Get tags of an MP3 file like `get_mp3_tags`, but only read the ID3v2 frames
+    that are needed instead of loading the file and scanning its audio stream.
+    Falls back to eyed3 for ID3v2.2 tags and tag features the fast reader does
+    not handle.
+
+    Args:
+        mp3_file (Path): Path to MP3 file.
+
+    Returns:
+        TrackInfo | None: MP3 tags. Returns `None` if a tag is missing.
+    """
+
+    try:
+        values = _read_id3_text_frames(mp3_file)
+    except (UnicodeDecodeError, ValueError, struct.error):
+        values = None
+
+    if values is None:
+        import eyed3.id3
+
+        tag = eyed3.id3.Tag()
+        if not tag.parse(str(mp3_file)):
+            return None
+
+        values = {}
+        if tag.title is not None:
+            values["title"] = tag.title
+        if tag.artist is not None:
+            values["artist"] = tag.artist
+        if tag.album is not None:
+            values["album"] = tag.album
+        if tag.recording_date is not None:
+            values["year"] = str(tag.recording_date)
+        if tag.track_num[0] is not None:
+            values["track_number"] = str(tag.track_num[0])
+
+    try:
+        return {
+            "title": values["title"],
+            "artist": values["artist"],
+            "album": values["album"],
+            "year": int(values["year"][:4]),
+            "track_number": int(values["track_number"].split("/", 1)[0]),
+        }
+    except (KeyError, ValueError):
+        return None
@@ -1,10 +1,51 @@
 """
 Utils for yt_dlp.
+
+yt_dlp is imported on first use, since loading its extractors is slow.
 """
 
-from typing import List, TypedDict
+# pylint: disable=import-outside-toplevel
+
+import functools
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    TypedDict,
+)
 from pathlib import Path
-import yt_dlp
+from yt_music.utils.cache import load_cache_entry, normalize_url, save_cache_entry
+from yt_music.utils.ffmpeg import transcode_to_mp3
+from yt_music.utils.formats import DEFAULT_TARGET_BITRATE, build_format_selector
+from yt_music.utils.http import get_backoff
+from yt_music.utils.ratelimit import (
+    report_success,
+    report_throttled,
+    throttle_bytes,
+    wait_for_request,
+)
+
+if TYPE_CHECKING:
+    import yt_dlp
+
+INFO_CACHE_NAMESPACE = "info"
+
+# listings with more entries are not cached, so reading them stays bounded in memory
+MAX_CACHED_ENTRIES = 5000
+
+# idle yt_dlp.YoutubeDL instances by purpose, only used inside `reuse_youtube_dl`
+_idle_instances: Dict[str, List["yt_dlp.YoutubeDL"]] = {}
+_idle_lock = threading.Lock()
+_reuse_enabled = threading.Event()
+
+# progress hook, video and media URL of the download running on the current thread
+_thread_state = threading.local()
 
 
 class YouTubeInfo(TypedDict):
@@ -12,101 +53,468 @@ class YouTubeInfo(TypedDict):
 
     titles: List[str]
     urls: List[str]
+    # seconds, `None` where YouTube does not list one
+    durations: List[Optional[float]]
+    is_playlist: bool
+
+
+class YouTubeEntry(TypedDict):
+    """Type for a video of a YouTube playlist or video URL."""
+
+    # position in the playlist, from 1
+    index: int
+    title: str
+    url: str
+    # seconds, `None` where YouTube does not list one
+    duration: Optional[float]
+
+
+class YouTubeStream(TypedDict):
+    """Type for YouTube info whose entries are extracted as they are read."""
+
     is_playlist: bool
+    entries: Iterator[YouTubeEntry]
 
 
-def get_youtube_info(youtube_url: str) -> YouTubeInfo | None:
+@contextmanager
+def reuse_youtube_dl() -> Iterator[None]:
+    """
+    Keep `yt_dlp.YoutubeDL` instances alive and reuse them until the context exits,
+    instead of building a new one for every extraction and download.
+    Each instance is used by one thread at a time.
+    """
+
+    _reuse_enabled.set()
+    try:
+        yield
+    finally:
+        _reuse_enabled.clear()
+        with _idle_lock:
+            for instances in _idle_instances.values():
+                for ydl in instances:
+                    ydl.close()
+            _idle_instances.clear()
+
+
+def create_youtube_dl(
+    options: Dict[str, Any],
+    before_download: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> "yt_dlp.YoutubeDL":
+    """
+    Create a `yt_dlp.YoutubeDL`, calling `before_download` with the info of each
+    video once its formats are picked and before they are downloaded.
+    """
+
+    import yt_dlp
+    from yt_dlp.postprocessor import PostProcessor
+
+    ydl = yt_dlp.YoutubeDL(options)
+    if before_download is not None:
+
+        class BeforeDownload(PostProcessor):
+            """Post processor running `before_download`."""
+
+            def run(self, information):
+                before_download(information)
+                return [], information
+
+        ydl.add_post_processor(BeforeDownload(), when="before_dl")
+    return ydl
+
+
+@contextmanager
+def open_youtube_dl(
+    purpose: str,
+    options: Dict[str, Any],
+    before_download: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> Iterator["yt_dlp.YoutubeDL"]:
+    """
+    Open a `yt_dlp.YoutubeDL` for the given purpose. Inside `reuse_youtube_dl` an
+    idle instance with the same purpose is reused, with its output template updated.
+
+    Args:
+        purpose (str): Instances are only shared between calls with the same purpose.
+        options (Dict[str, Any]): yt_dlp options.
+        before_download (Optional[Callable]): Called with the info of each video
+            before it is downloaded, see `create_youtube_dl`. Only set on new
+            instances, so calls with the same purpose must pass the same function.
+    """
+
+    if not _reuse_enabled.is_set():
+        with create_youtube_dl(options, before_download) as ydl:
+            yield ydl
+        return
+
+    with _idle_lock:
+        instances = _idle_instances.setdefault(purpose, [])
+        ydl = instances.pop() if instances else None
+
+    if ydl is None:
+        ydl = create_youtube_dl(options, before_download)
+    elif "outtmpl" in options:
+        ydl.params["outtmpl"]["default"] = options["outtmpl"]
+
+    try:
+        yield ydl
+    finally:
+        with _idle_lock:
+            if _reuse_enabled.is_set():
+                _idle_instances.setdefault(purpose, []).append(ydl)
+            else:
+                ydl.close()
+
+
+def get_youtube_info(youtube_url: str, refresh: bool = False) -> YouTubeInfo | None:
     """Get info from a YouTube playlist or video. This includes:
     - List of titles
     - List of URLs
+    - List of durations
     - Boolean indicating if playlist.
 
+    The whole listing is read, see `stream_youtube_info` to use entries as they
+    are extracted.
+
     Args:
         youtube_url (str): URL of YouTube playlist or video.
+        refresh (bool): Ignore any cached info and extract it again.
 
     Raises:
-        Exception: _description_
-        ValueError: _description_
-        KeyError: _description_
+        RuntimeError: If yt_dlp fails to extract info.
+        ValueError: If no info is found.
+        KeyError: If the info cannot be parsed.
 
     Returns:
         YouTubeInfo | None: YouTube info. Returns `None` if unsuccessful.
     """
+
+    youtube_stream = stream_youtube_info(youtube_url=youtube_url, refresh=refresh)
+    if youtube_stream is None:
+        return None
+
+    titles: List[str] = []
+    urls: List[str] = []
+    durations: List[Optional[float]] = []
+    for entry in youtube_stream["entries"]:
+        titles.append(entry["title"])
+        urls.append(entry["url"])
+        durations.append(entry["duration"])
+
+    youtube_info: YouTubeInfo = {
+        "titles": titles,
+        "urls": urls,
+        "durations": durations,
+        "is_playlist": youtube_stream["is_playlist"],
+    }
+    return youtube_info
+
+
+def stream_youtube_info(
+    youtube_url: str, refresh: bool = False
+) -> YouTubeStream | None:
+    """Start extracting a YouTube playlist or video. Entries are yielded as yt_dlp
+    pages through the playlist, so the first ones can be used before the listing
+    is complete, and they are not kept in memory.
+
+    Results are cached on disk by normalized URL, and cache hits skip the extractor.
+    A listing is cached once all of its entries have been read, unless it has
+    more than `MAX_CACHED_ENTRIES`.
+
+    Args:
+        youtube_url (str): URL of YouTube playlist or video.
+        refresh (bool): Ignore any cached info and extract it again.
+
+    Raises:
+        RuntimeError: If yt_dlp fails to extract info.
+        ValueError: If no info is found.
+        KeyError: If the info cannot be parsed, raised while reading entries.
+
+    Returns:
+        YouTubeStream | None: Playlist flag and entries. Returns `None` if
+        unsuccessful.
+    """
+
+    cache_key = normalize_url(youtube_url)
+    if not refresh:
+        cached_info: YouTubeInfo | None = load_cache_entry(
+            INFO_CACHE_NAMESPACE, cache_key
+        )
+        if cached_info is not None:
+            print(f"Using cached info for '{cache_key}'.")
+            print(
+                ("Playlist" if cached_info["is_playlist"] else "Video").center(100, "-")
+            )
+            return {
+                "is_playlist": cached_info["is_playlist"],
+                "entries": iter_cached_entries(cached_info),
+            }
+
+    youtube_stream = extract_youtube_stream(youtube_url=youtube_url)
+    if youtube_stream is None:
+        return None
+
+    return {
+        "is_playlist": youtube_stream["is_playlist"],
+        "entries": cache_entries(
+            cache_key, youtube_stream["is_playlist"], youtube_stream["entries"]
+        ),
+    }
+
+
+def iter_cached_entries(cached_info: YouTubeInfo) -> Iterator[YouTubeEntry]:
+    """
+    Yield the entries of cached info, printing each one.
+    """
+
+    # info cached before durations were kept has none
+    durations = cached_info.get("durations") or [None] * len(cached_info["titles"])
+    for index, (title, url, duration) in enumerate(
+        zip(cached_info["titles"], cached_info["urls"], durations), start=1
+    ):
+        print(f"{index:02d}".ljust(5) + title)
+        yield {"index": index, "title": title, "url": url, "duration": duration}
+
+
+def cache_entries(
+    cache_key: str, is_playlist: bool, entries: Iterator[YouTubeEntry]
+) -> Iterator[YouTubeEntry]:
+    """
+    Pass entries through, and cache them once the last one has been read.
+    """
+
+    titles: List[str] = []
+    urls: List[str] = []
+    durations: List[Optional[float]] = []
+    for entry in entries:
+        if len(titles) <= MAX_CACHED_ENTRIES:
+            titles.append(entry["title"])
+            urls.append(entry["url"])
+            durations.append(entry["duration"])
+        yield entry
+
+    if len(titles) <= MAX_CACHED_ENTRIES:
+        youtube_info: YouTubeInfo = {
+            "titles": titles,
+            "urls": urls,
+            "durations": durations,
+            "is_playlist": is_playlist,
+        }
+        save_cache_entry(INFO_CACHE_NAMESPACE, cache_key, youtube_info)
+
+
+def extract_youtube_stream(youtube_url: str) -> YouTubeStream | None:
+    """Extract a YouTube playlist or video with yt_dlp. Only the first page of a
+    playlist is extracted here, the others are fetched as its entries are read.
+
+    Args:
+        youtube_url (str): URL of YouTube playlist or video.
+
+    Raises:
+        RuntimeError: If yt_dlp fails to extract info.
+        ValueError: If no info is found.
+        KeyError: If the info cannot be parsed, raised while reading entries.
+
+    Returns:
+        YouTubeStream | None: Playlist flag and entries. Returns `None` if
+        unsuccessful.
+    """
+
     options = {"extract_flat": True, "playlistend": None}
 
-    with yt_dlp.YoutubeDL(options) as ydl:
-        # extract info from url
-        try:
-            info = ydl.extract_info(youtube_url, download=False)
-        except Exception as e:
-            raise RuntimeError(f"Error: Failed to extract info. {e}") from e
-
-        # verify info exists
-        if not info:
-            raise ValueError("Error: No info found.")
-
-        # parse info to extract titles
-        try:
-            match info["webpage_url_basename"]:
-                case "playlist":
-                    print("Playlist".center(100, "-"))
-                    entries = info["entries"]
-                    for index, item in enumerate(entries):
-                        print(
-                            f"{index+1:02d}".ljust(5)
-                            + f"{item['title']}".ljust(50)
-                            + f"{item['channel']}"
-                        )
-
-                    titles = [entry["title"] for entry in entries]
-                    urls = [entry["url"] for entry in entries]
-
-                    playlist_info: YouTubeInfo = {
-                        "titles": titles,
-                        "urls": urls,
-                        "is_playlist": True,
-                    }
-                    return playlist_info
-
-                case "watch":
-                    print("Video".center(100, "-"))
-                    print(f"{info['title']}".ljust(50) + f"{info['channel']}")
-
-                    titles = [info["title"]]
-                    urls = [info["original_url"]]
-
-                    video_info: YouTubeInfo = {
-                        "titles": titles,
-                        "urls": urls,
-                        "is_playlist": False,
-                    }
-                    return video_info
-
-        except Exception as e:
-            raise KeyError(f"Error: Issue encountered while parsing info. {e}") from e
+    # the instance stays open until the last entry has been read
+    stack = ExitStack()
+    ydl = stack.enter_context(open_youtube_dl("extract", options))
+
+    # extract info from url, without resolving the entries of a playlist
+    wait_for_request(youtube_url)
+    try:
+        info = ydl.extract_info(youtube_url, download=False, process=False)
+    except Exception as e:
+        stack.close()
+        raise RuntimeError(f"Error: Failed to extract info. {e}") from e
+
+    # verify info exists
+    if not info:
+        stack.close()
+        raise ValueError("Error: No info found.")
 
+    basename = info.get("webpage_url_basename")
+    if basename not in ("playlist", "watch"):
+        stack.close()
         return None
 
+    def iter_entries() -> Iterator[YouTubeEntry]:
+        with stack:
+            # parse info to extract titles
+            try:
+                match basename:
+                    case "playlist":
+                        print("Playlist".center(100, "-"))
+                        # entries are fetched page by page as they are read
+                        for index, item in enumerate(info["entries"]):
+                            print(
+                                f"{index+1:02d}".ljust(5)
+                                + f"{item['title']}".ljust(50)
+                                + f"{item['channel']}"
+                            )
+                            yield {
+                                "index": index + 1,
+                                "title": item["title"],
+                                "url": item["url"],
+                                "duration": item.get("duration"),
+                            }
 
-def download_to_mp3(youtube_url: str, download_dir: Path, file_name: str) -> None:
+                    case "watch":
+                        print("Video".center(100, "-"))
+                        print(f"{info['title']}".ljust(50) + f"{info['channel']}")
+                        yield {
+                            "index": 1,
+                            "title": info["title"],
+                            "url": info["original_url"],
+                            "duration": info.get("duration"),
+                        }
+
+            except Exception as e:
+                raise KeyError(
+                    f"Error: Issue encountered while parsing info. {e}"
+                ) from e
+
+    return {"is_playlist": basename == "playlist", "entries": iter_entries()}
+
+
+def forward_progress(status: Dict[str, Any]) -> None:
     """
-    Download YouTube video as MP3.
+    yt_dlp progress hook that forwards to the hook of the current thread's download.
+    Registered once per instance, so reused instances can report to different hooks.
+    Downloads are paused here while they are over the bandwidth limit.
+    """
+
+    if status["status"] == "downloading":
+        downloaded_bytes = status.get("downloaded_bytes") or 0
+        # the first update of a resumed download includes the bytes from before
+        last_bytes = getattr(_thread_state, "downloaded_bytes", None)
+        if last_bytes is not None:
+            throttle_bytes(downloaded_bytes - last_bytes)
+        _thread_state.downloaded_bytes = downloaded_bytes
+
+    progress_hook = getattr(_thread_state, "progress_hook", None)
+    if progress_hook is not None:
+        progress_hook(status)
+
+
+def record_media_url(info: Dict[str, Any]) -> None:
+    """
+    Remember the URL of the stream the current thread is about to download, so
+    retries of its requests slow down the media host that served it.
+    """
+
+    requested_formats = info.get("requested_formats") or [info]
+    _thread_state.media_url = requested_formats[0].get("url")
+
+
+def retry_sleep(n: int, media: bool = False) -> float:
+    """
+    yt_dlp retry sleep function. yt_dlp retries requests that were throttled or
+    failed on the server, so the host they went to is slowed down: the media host
+    of the stream for `media` retries of the download, the host of the video page
+    for retries of the extractor.
+    Returns the delay before the retry, with `n` the number of retries so far.
+    """
+
+    delay = get_backoff(n)
+    url = getattr(_thread_state, "media_url" if media else "youtube_url", None)
+    if url is not None:
+        report_throttled(url, delay)
+    return delay
+
+
+def download_audio(
+    youtube_url: str,
+    download_dir: Path,
+    file_name: str,
+    progress_hook: Optional[Callable[[Dict[str, Any]], None]] = None,
+    output_format: str = "mp3",
+    target_bitrate: int = DEFAULT_TARGET_BITRATE,
+) -> Path | None:
+    """
+    Download the best audio stream of a YouTube video without converting it.
+    Partially downloaded files are resumed, finished ones are not downloaded again.
+    The request rate limit is waited for once per video, before its page is
+    requested, see `yt_music.utils.ratelimit`.
+
+    Args:
+        youtube_url (str): URL of YouTube video.
+        download_dir (Path): Directory to download to.
+        file_name (str): File name without extension.
+        progress_hook (Optional[Callable]): Called with yt_dlp progress dictionaries.
+            May raise `yt_dlp.utils.DownloadCancelled` to stop the download.
+        output_format (str): Output format the stream is for. For `opus` and `m4a`
+            a stream with that codec is preferred, so it can be copied without
+            re-encoding.
+        target_bitrate (int): Effective bitrate in kbps of the stream to pick. See
+            `plan_audio_format`.
+
+    Returns:
+        Path | None: Path to the downloaded file. Returns `None` if unsuccessful.
     """
 
     options = {
-        "format": "bestaudio/best",
+        "format": build_format_selector(
+            output_format=output_format, target_bitrate=target_bitrate
+        ),
         "outtmpl": f"{download_dir}/{file_name}.%(ext)s",
-        "postprocessors": [
-            {
-                "key": "FFmpegExtractAudio",
-                "preferredcodec": "mp3",
-                "preferredquality": "192",
-            }
-        ],
         "noplaylist": False,
         "ignoreerrors": True,
+        "continuedl": True,
+        "nopart": False,
+        "progress_hooks": [forward_progress],
+        "retry_sleep_functions": {
+            "http": functools.partial(retry_sleep, media=True),
+            "fragment": functools.partial(retry_sleep, media=True),
+            "extractor": retry_sleep,
+        },
         # "cookies": "cookies.txt",
     }
 
-    with yt_dlp.YoutubeDL(options) as ydl:
-        ydl.download([youtube_url])
+    _thread_state.progress_hook = progress_hook
+    _thread_state.youtube_url = youtube_url
+    _thread_state.media_url = None
+    _thread_state.downloaded_bytes = None
+    wait_for_request(youtube_url)
+    try:
+        # the format selector is fixed when an instance is created
+        with open_youtube_dl(
+            f"download-{output_format}-{target_bitrate}",
+            options,
+            before_download=record_media_url,
+        ) as ydl:
+            info = ydl.extract_info(youtube_url, download=True)
+            if not info:
+                return None
+            report_success(youtube_url)
+
+            requested_downloads = info.get("requested_downloads") or [{}]
+            file_path = requested_downloads[0].get("filepath")
+            if file_path is None:
+                file_path = ydl.prepare_filename(info)
+    finally:
+        _thread_state.progress_hook = None
+        _thread_state.youtube_url = None
+        _thread_state.media_url = None
+
+    return Path(file_path)
+
+
+def download_to_mp3(youtube_url: str, download_dir: Path, file_name: str) -> None:
+    """
+    Download YouTube video as MP3.
+    """
+
+    audio_path = download_audio(
+        youtube_url=youtube_url, download_dir=download_dir, file_name=file_name
+    )
+    if audio_path is None or not audio_path.exists():
+        return
+
+    transcode_to_mp3(
+        source_file=audio_path, target_file=download_dir / Path(f"{file_name}.mp3")
+    )
@@ -0,0 +1,223 @@
+"""
+Check the MP3 files of the library for damage, and download damaged tracks again.
+"""
+
+import argparse
+import json
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from yt_music.catalog import ALBUM_DIR_PATTERN, find_album_dirs, read_source_url
+from yt_music.download import DAMAGED_SUFFIX, download_mp3, get_artwork_path
+from yt_music.sync import (
+    SYNC_FILE_NAME,
+    load_sync_state,
+    save_sync_state,
+    sync_playlist,
+)
+from yt_music.utils.catalog import get_video_id
+from yt_music.utils.integrity import TrackCheck, check_mp3
+from yt_music.utils.manifest import load_manifest
+
+# files sent to a worker process at a time, so small files do not wait on the pool
+CHUNK_SIZE = 16
+
+
+def find_mp3_files(album_dirs: List[Path]) -> List[Tuple[Path, Optional[float]]]:
+    """
+    Return the MP3 files in album directories, with the duration of their video
+    if the album manifest records it. Tracks that a download already kept aside
+    as damaged are left out.
+    """
+
+    mp3_files: List[Tuple[Path, Optional[float]]] = []
+    for music_dir_path in album_dirs:
+        manifest = load_manifest(music_dir_path)
+        for mp3_file in sorted(music_dir_path.glob("*.mp3")):
+            if mp3_file.name.endswith(DAMAGED_SUFFIX):
+                continue
+            record = manifest.get(mp3_file.name)
+            # manifests written before durations were kept have none
+            mp3_files.append((mp3_file, record.get("duration") if record else None))
+    return mp3_files
+
+
+def requeue_album(
+    music_dir_path: Path, damaged_files: List[Path], jobs: int = 4
+) -> List[str]:
+    """
+    Delete the damaged tracks of an album and download them again. The other
+    tracks are skipped, as their manifest entries still match. An album kept in
+    sync by `yt_music.sync` is synced, so its tracks keep their numbers.
+    Albums without a manifest entry for every damaged track are left as they are.
+    Returns the titles of any tracks that failed to download.
+    """
+
+    manifest = load_manifest(music_dir_path)
+    match = ALBUM_DIR_PATTERN.match(music_dir_path.name)
+    source_url = read_source_url(music_dir_path)
+    if (
+        match is None
+        or source_url is None
+        or any(mp3_file.name not in manifest for mp3_file in damaged_files)
+    ):
+        print(
+            f"Unable to download '{music_dir_path.name}' again without its info.txt "
+            "and manifest."
+        )
+        return [mp3_file.stem for mp3_file in damaged_files]
+
+    artist, album, year = match["artist"], match["album"], int(match["year"])
+    for mp3_file in damaged_files:
+        mp3_file.unlink(missing_ok=True)
+
+    artwork_path = get_artwork_path(music_dir_path=music_dir_path, album=album)
+    if (music_dir_path / SYNC_FILE_NAME).exists():
+        state = load_sync_state(music_dir_path, source_url)
+        for mp3_file in damaged_files:
+            youtube_url = manifest[mp3_file.name]["youtube_url"]
+            state["failed"].append(get_video_id(youtube_url) or youtube_url)
+        save_sync_state(music_dir_path, state)
+        report = sync_playlist(
+            youtube_url=state["url"],
+            artist=artist,
+            album=album,
+            year=year,
+            jobs=jobs,
+            artwork_path=artwork_path,
+        )
+        return report["failed_tracks"]
+
+    failed_tracks = download_mp3(
+        youtube_url=source_url,
+        artist=artist,
+        album=album,
+        year=year,
+        jobs=jobs,
+        artwork_path=artwork_path,
+    )
+    return [failed_track["title"] for failed_track in failed_tracks]
+
+
+def verify_library(
+    root_dirs: List[str],
+    jobs: Optional[int] = None,
+    requeue: bool = False,
+    download_jobs: int = 4,
+    report_path: Optional[str] = None,
+) -> List[TrackCheck]:
+    """
+    Main entry point.
+    Checks every MP3 file under `root_dirs` across a process pool, and prints
+    the damaged ones.
+
+    Args:
+        root_dirs (List[str]): Directories to search for albums.
+        jobs (Optional[int]): Number of worker processes. Defaults to the CPU count.
+        requeue (bool): Download damaged tracks again, see `requeue_album`.
+        download_jobs (int): Number of tracks to download at once when requeuing.
+        report_path (Optional[str]): Save the damaged tracks as JSON.
+
+    Returns:
+        List[TrackCheck]: Checks of the damaged tracks.
+    """
+
+    album_dirs = find_album_dirs([Path(root_dir) for root_dir in root_dirs])
+    mp3_files = find_mp3_files(album_dirs)
+    print(f"Total MP3 Files Found: {len(mp3_files)}")
+
+    start = time.perf_counter()
+    damaged: List[TrackCheck] = []
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            check_mp3,
+            [mp3_file for mp3_file, _ in mp3_files],
+            [duration for _, duration in mp3_files],
+            chunksize=CHUNK_SIZE,
+        )
+        for result in results:
+            total_bytes += result["size"]
+            if result["problems"]:
+                damaged.append(result)
+                print(f"Damaged: {result['path']}")
+                for problem in result["problems"]:
+                    print(f"\t{problem}")
+    seconds = time.perf_counter() - start
+
+    print(
+        f"Checked {len(mp3_files)} files ({total_bytes / 1024 / 1024:.1f} MB) in "
+        f"{seconds:.2f}s, {len(damaged)} damaged."
+    )
+
+    if report_path is not None:
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(damaged, f, indent=4, ensure_ascii=False)
+
+    if requeue and damaged:
+        damaged_by_album: Dict[Path, List[Path]] = {}
+        for result in damaged:
+            mp3_file = Path(result["path"])
+            damaged_by_album.setdefault(mp3_file.parent, []).append(mp3_file)
+
+        failed_tracks: List[str] = []
+        for music_dir_path, damaged_files in damaged_by_album.items():
+            print(
+                f"Downloading {len(damaged_files)} tracks of '{music_dir_path.name}'."
+            )
+            failed_tracks += requeue_album(
+                music_dir_path=music_dir_path,
+                damaged_files=damaged_files,
+                jobs=download_jobs,
+            )
+
+        if failed_tracks:
+            print(f"{len(failed_tracks)} tracks could not be downloaded again:")
+            for track_title in failed_tracks:
+                print(f"\t{track_title}")
+
+    return damaged
+
+
+if __name__ == "__main__":
+    # set up argument parser
+    parser = argparse.ArgumentParser(
+        description="Check the frames and duration of the MP3 files in album "
+        "directories, and optionally download damaged tracks again.",
+        usage="python -m yt_music.verify [ROOT_DIRS ...] [--jobs JOBS] [--requeue]",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "root_dirs", type=str, nargs="+", help="Directories to search for albums."
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        help="Number of processes checking files. Defaults to the CPU count.",
+    )
+    parser.add_argument(
+        "--requeue",
+        action="store_true",
+        help="Delete damaged tracks and download them again.",
+    )
+    parser.add_argument(
+        "--download-jobs",
+        type=int,
+        default=4,
+        help="Number of tracks to download at once with --requeue.",
+    )
+    parser.add_argument(
+        "--report", type=str, help="Save the damaged tracks and problems as JSON."
+    )
+
+    # parse arguments
+    args = parser.parse_args()
+
+    verify_library(
+        root_dirs=args.root_dirs,
+        jobs=args.jobs,
+        requeue=args.requeue,
+        download_jobs=args.download_jobs,
+        report_path=args.report,
+    )
@@ -0,0 +1,46 @@
+"""
+Shared fixtures for the offline tests.
+"""
+
+import os
+from pathlib import Path
+from typing import Iterator
+import pytest
+import yt_dlp
+from benchmarks.fake_ytdlp import FakeYoutubeDL, install_fake_ffmpeg
+from yt_music.utils.metrics import reset_metrics
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    """
+    Keep the cache of every test in its own temporary directory.
+    """
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    yield tmp_path / "cache" / "yt-music"
+
+
+@pytest.fixture(name="music_dir_path")
+def fixture_music_dir_path(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Iterator[Path]:
+    """
+    Download to a temporary home directory with the fake backend and ffmpeg of
+    the benchmarks, serving 5 second tracks without delay.
+    Returns the directory of the album `Artist - Album (2020)`.
+    """
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setenv("XDG_DATA_HOME", str(tmp_path / "data"))
+    # restored after the test, as the fake ffmpeg is put first on it
+    monkeypatch.setenv("PATH", os.environ["PATH"])
+    (tmp_path / "Downloads").mkdir()
+    (tmp_path / "bin").mkdir()
+    install_fake_ffmpeg(tmp_path / "bin", cpu_time=0.0, decode_duration=5.0)
+    monkeypatch.setattr(FakeYoutubeDL, "latency", 0.0)
+    monkeypatch.setattr(FakeYoutubeDL, "duration", 5.0)
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    reset_metrics()
+    yield tmp_path / "Downloads" / "Artist - Album (2020)"
+    reset_metrics()
@@ -0,0 +1,35 @@
+"""
+Tests for scanning and renaming tracks by their track numbers.
+"""
+
+from pathlib import Path
+import pytest
+from tools import append_track_numbers
+from tools.append_track_numbers import scan_tags
+from yt_music.utils.tags import TrackInfo
+
+
+def test_bad_file_does_not_stop_scan(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    mp3_file_paths = [tmp_path / f"{name}.mp3" for name in ("a", "bad", "c")]
+    for mp3_file_path in mp3_file_paths:
+        mp3_file_path.write_bytes(b"")
+
+    def read_id3_tags(mp3_file: Path) -> TrackInfo:
+        if mp3_file.stem == "bad":
+            raise IndexError("damaged tag")
+        return {
+            "title": mp3_file.stem,
+            "artist": "Artist",
+            "album": "Album",
+            "year": 2020,
+            "track_number": 1,
+        }
+
+    monkeypatch.setattr(append_track_numbers, "read_id3_tags", read_id3_tags)
+
+    scanned = scan_tags(mp3_file_paths, tmp_path, index={}, jobs=1)
+
+    assert sorted(scanned) == ["a.mp3", "c.mp3"]
+    assert scanned["c.mp3"]["tags"]["title"] == "c"
@@ -0,0 +1,177 @@
+"""
+Tests for the extraction cache, using the `json/` info dumps as yt_dlp output.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+import pytest
+import yt_dlp
+from benchmarks.fake_ytdlp import FakeYoutubeDL, load_fixture
+from yt_music.utils.cache import (
+    get_cache_path,
+    load_cache_entry,
+    normalize_url,
+    save_cache_entry,
+)
+from yt_music.utils.ytdlp import (
+    INFO_CACHE_NAMESPACE,
+    get_youtube_info,
+    stream_youtube_info,
+)
+
+PLAYLIST_INFO = load_fixture("playlist_info.json")
+VIDEO_INFO = load_fixture("video_info.json")
+
+
+class CountingYoutubeDL(FakeYoutubeDL):
+    """
+    `FakeYoutubeDL` without delays, recording the URLs it extracts.
+    """
+
+    latency = 0.0
+    extracted: List[str] = []
+
+    def extract_info(
+        self, url: str, download: bool = False, process: bool = True
+    ) -> Dict[str, Any]:
+        CountingYoutubeDL.extracted.append(url)
+        return super().extract_info(url, download=download, process=process)
+
+
+@pytest.fixture(name="extracted")
+def fixture_extracted(monkeypatch: pytest.MonkeyPatch) -> List[str]:
+    """
+    Serve the fixtures instead of YouTube, and return the URLs extracted.
+    """
+
+    CountingYoutubeDL.extracted = []
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", CountingYoutubeDL)
+    return CountingYoutubeDL.extracted
+
+
+@pytest.mark.parametrize(
+    "youtube_url, expected",
+    [
+        (
+            PLAYLIST_INFO["original_url"],
+            "https://www.youtube.com/playlist?list="
+            "OLAK5uy_musSHQMxq8brVro-3NvHUeVFc60X4QAhQ",
+        ),
+        (
+            PLAYLIST_INFO["webpage_url"],
+            "https://www.youtube.com/playlist?list="
+            "OLAK5uy_musSHQMxq8brVro-3NvHUeVFc60X4QAhQ",
+        ),
+        (
+            VIDEO_INFO["original_url"],
+            "https://www.youtube.com/watch?v=2PU8ZxQj7eE",
+        ),
+        (
+            VIDEO_INFO["webpage_url"],
+            "https://www.youtube.com/watch?v=2PU8ZxQj7eE",
+        ),
+        (
+            "https://m.youtube.com/watch?v=2PU8ZxQj7eE&feature=share",
+            "https://www.youtube.com/watch?v=2PU8ZxQj7eE",
+        ),
+        (
+            "https://www.youtube.com/watch?v=2PU8ZxQj7eE&list=PL123&index=2",
+            "https://www.youtube.com/watch?v=2PU8ZxQj7eE&list=PL123",
+        ),
+        (
+            "https://youtu.be/2PU8ZxQj7eE?list=PL123&si=abc",
+            "https://www.youtube.com/watch?v=2PU8ZxQj7eE&list=PL123",
+        ),
+    ],
+)
+def test_normalize_url(youtube_url: str, expected: str) -> None:
+    assert normalize_url(youtube_url) == expected
+
+
+def test_video_in_playlist_has_own_key() -> None:
+    video_url = "https://www.youtube.com/watch?v=2PU8ZxQj7eE"
+    assert normalize_url(f"{video_url}&list=PL123") != normalize_url(video_url)
+
+
+def test_playlist_cache_hit_skips_extractor(extracted: List[str]) -> None:
+    youtube_url = PLAYLIST_INFO["original_url"]
+
+    first = get_youtube_info(youtube_url)
+    second = get_youtube_info(PLAYLIST_INFO["webpage_url"])
+
+    assert first is not None and second is not None
+    assert extracted == [youtube_url]
+    assert second == first
+    assert first["is_playlist"]
+    assert first["titles"] == [entry["title"] for entry in PLAYLIST_INFO["entries"]]
+    assert first["urls"] == [entry["url"] for entry in PLAYLIST_INFO["entries"]]
+
+
+def test_video_cache_hit_skips_extractor(extracted: List[str]) -> None:
+    youtube_url = VIDEO_INFO["original_url"]
+
+    first = get_youtube_info(youtube_url)
+    second = get_youtube_info(youtube_url)
+
+    assert first is not None and second is not None
+    assert extracted == [youtube_url]
+    assert second == first
+    assert not first["is_playlist"]
+    assert first["titles"] == [VIDEO_INFO["title"]]
+
+
+def test_refresh_extracts_again(extracted: List[str]) -> None:
+    youtube_url = VIDEO_INFO["original_url"]
+
+    get_youtube_info(youtube_url)
+    get_youtube_info(youtube_url, refresh=True)
+
+    assert extracted == [youtube_url, youtube_url]
+
+
+def test_partly_read_listing_is_not_cached(extracted: List[str]) -> None:
+    youtube_url = PLAYLIST_INFO["original_url"]
+    youtube_stream = stream_youtube_info(youtube_url)
+    assert youtube_stream is not None
+    next(youtube_stream["entries"])
+    youtube_stream["entries"].close()
+
+    assert load_cache_entry(INFO_CACHE_NAMESPACE, normalize_url(youtube_url)) is None
+    get_youtube_info(youtube_url)
+    assert extracted == [youtube_url, youtube_url]
+
+
+def test_expired_entry_is_ignored() -> None:
+    save_cache_entry("test", "key", {"value": 1})
+    assert load_cache_entry("test", "key", ttl=60) == {"value": 1}
+
+    cache_path = get_cache_path("test", "key")
+    entry = json.loads(cache_path.read_text(encoding="utf-8"))
+    entry["created"] = time.time() - 120
+    cache_path.write_text(json.dumps(entry), encoding="utf-8")
+    assert load_cache_entry("test", "key", ttl=60) is None
+
+
+def test_least_recently_used_entries_are_evicted(cache_dir: Path) -> None:
+    for index in range(3):
+        save_cache_entry("test", f"key-{index}", index, max_entries=3)
+        cache_path = get_cache_path("test", f"key-{index}")
+        os.utime(cache_path, (index, index))
+    data_path = get_cache_path("test", "key-1").with_suffix(".jpg")
+    data_path.write_bytes(b"artwork")
+
+    # reading an entry marks it as recently used
+    assert load_cache_entry("test", "key-0") == 0
+    save_cache_entry("test", "key-3", 3, max_entries=3)
+
+    assert load_cache_entry("test", "key-1") is None
+    assert not data_path.exists()
+    assert [load_cache_entry("test", f"key-{index}") for index in (0, 2, 3)] == [
+        0,
+        2,
+        3,
+    ]
+    assert len(list((cache_dir / "test").glob("*.json"))) == 3
@@ -0,0 +1,98 @@
+"""
+Tests for copying files to a device.
+"""
+
+import os
+import shutil
+from pathlib import Path
+import pytest
+from tools import copy_mp3_files
+from tools.copy_mp3_files import copy_file_contents, write_device_files
+
+DATA = bytes(range(256)) * 4096
+
+
+def stops_after(limit: int):
+    """
+    Return a copy function that copies up to `limit` bytes, then copies nothing.
+    """
+
+    def copy_range(source_fd: int, target_fd: int, offset: int, count: int) -> int:
+        count = max(min(count, limit - offset), 0)
+        data = os.pread(source_fd, count, offset)
+        return os.pwrite(target_fd, data, offset)
+
+    return copy_range
+
+
+@pytest.fixture(name="source_file")
+def fixture_source_file(tmp_path: Path) -> Path:
+    source_file = tmp_path / "source.mp3"
+    source_file.write_bytes(DATA)
+    return source_file
+
+
+def test_copy_file_contents(source_file: Path, tmp_path: Path) -> None:
+    target_file = tmp_path / "target.mp3"
+
+    assert copy_file_contents(source_file, target_file) == len(DATA)
+    assert target_file.read_bytes() == DATA
+    assert target_file.stat().st_mtime_ns == source_file.stat().st_mtime_ns
+
+
+@pytest.mark.parametrize("limits", [(100_000, 300_000), (0, 0), (len(DATA), 0)])
+def test_copy_falls_through_when_nothing_is_copied(
+    source_file: Path,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    limits: tuple,
+) -> None:
+    monkeypatch.setattr(copy_mp3_files, "_copy_file_range", stops_after(limits[0]))
+    monkeypatch.setattr(copy_mp3_files, "_sendfile", stops_after(limits[1]))
+    target_file = tmp_path / "target.mp3"
+
+    assert copy_file_contents(source_file, target_file) == len(DATA)
+    assert target_file.read_bytes() == DATA
+
+
+def test_short_copy_raises(
+    source_file: Path, tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(copy_mp3_files, "_copy_file_range", stops_after(100_000))
+    monkeypatch.setattr(copy_mp3_files, "_sendfile", stops_after(0))
+    # the buffered copy reaches the end of a file that was cut short meanwhile
+    monkeypatch.setattr(copy_mp3_files.shutil, "copyfileobj", lambda *args: None)
+
+    with pytest.raises(OSError, match="Copied 100000 of"):
+        copy_file_contents(source_file, tmp_path / "target.mp3")
+
+
+def test_rewrite_counts_space_of_replaced_files(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    album_dir = tmp_path / "source" / "Artist" / "Album"
+    album_dir.mkdir(parents=True)
+    for name in ("01.mp3", "02.mp3"):
+        (album_dir / name).write_bytes(DATA)
+    target_album_dir = tmp_path / "target" / "Artist" / "Album"
+    target_album_dir.mkdir(parents=True)
+    # older copies, so the directory is rewritten
+    for name in ("01.mp3", "02.mp3"):
+        (target_album_dir / name).write_bytes(DATA)
+        os.utime(target_album_dir / name, (0, 0))
+
+    usage = shutil.disk_usage(tmp_path)
+    monkeypatch.setattr(
+        copy_mp3_files.shutil,
+        "disk_usage",
+        lambda path: usage._replace(free=len(DATA) // 2),
+    )
+
+    write_device_files(tmp_path / "source", tmp_path / "target")
+    assert sorted(os.listdir(target_album_dir)) == ["01.mp3", "02.mp3"]
+    assert (target_album_dir / "01.mp3").stat().st_mtime > 0
+
+    (album_dir / "03.mp3").write_bytes(DATA)
+    (target_album_dir / "01.mp3").unlink()
+    with pytest.raises(RuntimeError, match="Not enough free space"):
+        write_device_files(tmp_path / "source", tmp_path / "target")
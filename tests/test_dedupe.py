@@ -0,0 +1,30 @@
+"""
+Tests for storing duplicate tracks once.
+"""
+
+from pathlib import Path
+from benchmarks.fake_ytdlp import write_synthetic_mp3
+from yt_music.utils.dedupe import hash_audio, link_duplicate, reflink_file
+
+
+def test_identical_duplicate_is_never_hardlinked(tmp_path: Path) -> None:
+    original_file = write_synthetic_mp3(tmp_path / "a.mp3", duration=1)
+    duplicate_file = tmp_path / "b.mp3"
+    duplicate_file.write_bytes(original_file.read_bytes())
+
+    action, shared_bytes = link_duplicate(
+        original_file=original_file,
+        duplicate_file=duplicate_file,
+        audio_sha256=hash_audio(original_file),
+    )
+
+    # tracks are retagged in place, which must not change the other album's copy
+    assert duplicate_file.stat().st_nlink == 1
+    assert original_file.stat().st_ino != duplicate_file.stat().st_ino
+    assert duplicate_file.read_bytes() == original_file.read_bytes()
+    assert not list(tmp_path.glob(".*.dedupe"))
+
+    if reflink_file(original_file, tmp_path / "probe.mp3"):
+        assert (action, shared_bytes) == ("reflinked", original_file.stat().st_size)
+    else:
+        assert (action, shared_bytes) == ("skipped", 0)
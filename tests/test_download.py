@@ -0,0 +1,226 @@
+"""
+Tests for downloading albums, against the fake yt_dlp backend and ffmpeg used
+by the benchmarks.
+"""
+
+import argparse
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+import pytest
+import yt_dlp
+from benchmarks.fake_ytdlp import FakeYoutubeDL, load_fixture
+from yt_music.download import (
+    TrackProgress,
+    add_download_arguments,
+    apply_rate_limit_args,
+    download_mp3,
+)
+from yt_music.utils.ytdlp import YouTubeEntry
+from yt_music.utils.manifest import load_manifest
+from yt_music.utils.metrics import get_totals, open_json_log
+
+PLAYLIST_INFO = load_fixture("playlist_info.json")
+PLAYLIST_URL = PLAYLIST_INFO["original_url"]
+VIDEO_INFO = load_fixture("video_info.json")
+ALBUM_NAME = "Artist - Album (2020)"
+
+
+def test_extract_span_covers_whole_listing(
+    music_dir_path: Path, tmp_path: Path
+) -> None:
+    with open_json_log(tmp_path / "metrics.jsonl"):
+        failed_tracks = download_mp3(
+            youtube_url=PLAYLIST_URL, artist="Artist", album="Album", year=2020
+        )
+
+    assert failed_tracks == []
+    assert len(list(music_dir_path.glob("*.mp3"))) == len(PLAYLIST_INFO["entries"])
+    assert get_totals()[("extract", ALBUM_NAME)]["count"] == 1
+    with open(tmp_path / "metrics.jsonl", encoding="utf-8") as f:
+        (extract,) = [
+            entry for entry in map(json.loads, f) if entry["stage"] == "extract"
+        ]
+    assert extract["entries"] == len(PLAYLIST_INFO["entries"])
+    assert extract["error"] is None
+
+
+def test_cancel_stops_reading_playlist(music_dir_path: Path, tmp_path: Path) -> None:
+    cancel_event = threading.Event()
+    statuses: List[str] = []
+
+    def progress_callback(progress: TrackProgress) -> None:
+        statuses.append(progress["status"])
+        if progress["status"] == "queued":
+            cancel_event.set()
+
+    with open_json_log(tmp_path / "metrics.jsonl"):
+        download_mp3(
+            youtube_url=PLAYLIST_URL,
+            artist="Artist",
+            album="Album",
+            year=2020,
+            progress_callback=progress_callback,
+            cancel_event=cancel_event,
+        )
+
+    with open(tmp_path / "metrics.jsonl", encoding="utf-8") as f:
+        (extract,) = [
+            entry for entry in map(json.loads, f) if entry["stage"] == "extract"
+        ]
+    # the entry read while the first track was queued, and no more
+    assert extract["entries"] == 2
+    assert statuses.count("queued") == 1
+    assert not list(music_dir_path.glob("*.mp3"))
+
+
+class ShortYoutubeDL(FakeYoutubeDL):
+    """
+    `FakeYoutubeDL` listing videos longer than the files it downloads.
+    """
+
+    def extract_info(
+        self, url: str, download: bool = False, process: bool = True
+    ) -> Dict[str, Any]:
+        info = super().extract_info(url, download=download, process=process)
+        if not download:
+            info["duration"] = self.duration * 10
+        return info
+
+
+def test_track_damaged_twice_is_kept(
+    music_dir_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", ShortYoutubeDL)
+    statuses: List[str] = []
+
+    failed_tracks = download_mp3(
+        youtube_url=VIDEO_INFO["original_url"],
+        artist="Artist",
+        album="Album",
+        year=2020,
+        progress_callback=lambda progress: statuses.append(progress["status"]),
+    )
+
+    assert len(failed_tracks) == 1
+    assert statuses.count("queued") == 2
+    assert [mp3_file.name for mp3_file in music_dir_path.glob("*.mp3")] == [
+        f"01 - {VIDEO_INFO['title']}.damaged.mp3"
+    ]
+
+
+def test_rerun_tags_again_when_artwork_changes(
+    music_dir_path: Path, tmp_path: Path
+) -> None:
+    def run(artwork_path: Optional[Path] = None) -> List[str]:
+        statuses: List[str] = []
+        download_mp3(
+            youtube_url=PLAYLIST_URL,
+            artist="Artist",
+            album="Album",
+            year=2020,
+            artwork_path=artwork_path,
+            progress_callback=lambda progress: statuses.append(progress["status"]),
+        )
+        return statuses
+
+    tracks = len(PLAYLIST_INFO["entries"])
+    assert run().count("done") == tracks
+    assert run().count("skipped") == tracks
+
+    artwork_path = tmp_path / "cover.jpg"
+    artwork_path.write_bytes(b"\xff\xd8\xff\xe0 first cover")
+    statuses = run(artwork_path)
+    assert statuses.count("done") == tracks
+    # only tagged again, as the audio is unchanged
+    assert "downloading" not in statuses
+    assert run(artwork_path).count("skipped") == tracks
+
+    artwork_path.write_bytes(b"\xff\xd8\xff\xe0 second cover")
+    assert run(artwork_path).count("done") == tracks
+
+
+def test_unreadable_artwork_is_skipped(music_dir_path: Path, tmp_path: Path) -> None:
+    # an error page saved as the cover, which cannot be resized
+    artwork_path = tmp_path / "cover.jpg"
+    artwork_path.write_bytes(b"<html><body>Not Found</body></html>")
+
+    failed_tracks = download_mp3(
+        youtube_url=PLAYLIST_URL,
+        artist="Artist",
+        album="Album",
+        year=2020,
+        artwork_path=artwork_path,
+        artwork_max_size=500,
+    )
+
+    assert not failed_tracks
+    assert len(list(music_dir_path.glob("*.mp3"))) == len(PLAYLIST_INFO["entries"])
+
+
+def get_entries(start: int, stop: int) -> List[YouTubeEntry]:
+    """
+    Return playlist entries as `stream_youtube_info` yields them.
+    """
+
+    return [
+        {
+            "index": index,
+            "title": entry["title"],
+            "url": entry["url"],
+            "duration": FakeYoutubeDL.duration,
+        }
+        for index, entry in enumerate(PLAYLIST_INFO["entries"], start=1)
+    ][start:stop]
+
+
+def test_album_gain_covers_tracks_of_earlier_runs(music_dir_path: Path) -> None:
+    pytest.importorskip("numpy")
+
+    def run(entries: List[YouTubeEntry], replaygain: bool = True) -> List[str]:
+        statuses: List[str] = []
+        download_mp3(
+            youtube_url=PLAYLIST_URL,
+            artist="Artist",
+            album="Album",
+            year=2020,
+            entries=entries,
+            replaygain=replaygain,
+            progress_callback=lambda progress: statuses.append(progress["status"]),
+        )
+        return statuses
+
+    run(get_entries(0, 2), replaygain=False)
+    # tracks without ReplayGain are not skipped when it is asked for
+    assert run(get_entries(0, 2)).count("done") == 2
+    # like a sync adding tracks to the end of the playlist
+    assert run(get_entries(2, 4)).count("done") == 2
+
+    manifest = load_manifest(music_dir_path)
+    album_gains = {record["replaygain"]["album_gain"] for record in manifest.values()}
+    assert len(manifest) == 4
+    assert len(album_gains) == 1
+
+    assert run(get_entries(0, 4)).count("skipped") == 4
+
+
+def test_shared_arguments_configure_rate_limits(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    limits: Dict[str, Any] = {}
+    monkeypatch.setattr(
+        "yt_music.download.configure_rate_limits",
+        lambda **kwargs: limits.update(kwargs),
+    )
+    parser = argparse.ArgumentParser()
+    add_download_arguments(parser)
+
+    args = parser.parse_args(
+        ["--format", "opus", "--requests-per-second", "2", "--max-bandwidth", "1.5"]
+    )
+    apply_rate_limit_args(args)
+
+    assert args.format == "opus"
+    assert not args.replaygain
+    assert limits == {"requests_per_second": 2.0, "bytes_per_second": 1.5e6}
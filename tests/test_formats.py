@@ -0,0 +1,157 @@
+"""
+Tests for the format planner, over the formats of the video info fixtures.
+"""
+
+from typing import List, Optional
+import pytest
+from benchmarks.fake_ytdlp import load_fixture
+from yt_music.utils.formats import (
+    OUTPUT_CODECS,
+    FormatInfo,
+    FormatPlan,
+    build_format_selector,
+    estimate_duration,
+    get_codec,
+    get_effective_bitrate,
+    get_filesize,
+    is_audio_only,
+    plan_audio_format,
+)
+
+# fixtures with a full formats list
+FORMAT_FIXTURES = ("video_info.json", "video_song_info.json")
+
+TARGET_BITRATES = (64, 96, 128, 160)
+
+
+def load_formats(fixture: str, audio_only: bool = True) -> List[FormatInfo]:
+    """
+    Load the formats of a fixture. Without `audio_only`, the audio streams are
+    left out, as for a video whose audio is only served with the picture.
+    """
+
+    formats = load_fixture(fixture)["formats"]
+    return formats if audio_only else [f for f in formats if not is_audio_only(f)]
+
+
+def check_plan(
+    plan: Optional[FormatPlan],
+    formats: List[FormatInfo],
+    output_format: str,
+    target_bitrate: int,
+) -> List[str]:
+    """
+    Check a plan against the planner's guarantees.
+    Returns a description of each guarantee that does not hold.
+    """
+
+    if plan is None:
+        return ["no format chosen"]
+
+    chosen = next(f for f in formats if str(f.get("format_id")) == plan["format_id"])
+    audio_formats = [f for f in formats if is_audio_only(f)]
+    problems: List[str] = []
+
+    if audio_formats and not is_audio_only(chosen):
+        problems.append("video downloaded although an audio stream exists")
+
+    codec = OUTPUT_CODECS[output_format]
+    if any(get_codec(f) == codec for f in audio_formats) and get_codec(chosen) != codec:
+        problems.append(f"{codec} stream exists but {get_codec(chosen)} chosen")
+
+    # the same streams the planner considers, to check that none is smaller
+    candidates = [
+        f
+        for f in audio_formats or formats
+        if get_codec(f) is not None
+        and (codec is None or get_codec(f) == codec)
+        and "drc" not in str(f.get("format_id"))
+        and get_filesize(f) is not None
+        and (get_effective_bitrate(f) or 0) >= target_bitrate
+    ]
+    smaller = [f for f in candidates if (get_filesize(f) or 0) < plan["filesize"]]
+    if smaller:
+        problems.append(f"smaller stream {smaller[0].get('format_id')} meets target")
+
+    if candidates and (get_effective_bitrate(chosen) or 0) < target_bitrate:
+        problems.append("chosen stream is below the target bitrate")
+
+    return problems
+
+
+@pytest.mark.parametrize("target_bitrate", TARGET_BITRATES)
+@pytest.mark.parametrize("output_format", list(OUTPUT_CODECS))
+@pytest.mark.parametrize("audio_only", [True, False])
+@pytest.mark.parametrize("fixture", FORMAT_FIXTURES)
+def test_plan_guarantees(
+    fixture: str, audio_only: bool, output_format: str, target_bitrate: int
+) -> None:
+    formats = load_formats(fixture, audio_only=audio_only)
+
+    plan = plan_audio_format(
+        formats=formats, output_format=output_format, target_bitrate=target_bitrate
+    )
+
+    assert check_plan(plan, formats, output_format, target_bitrate) == []
+
+
+@pytest.mark.parametrize("fixture", FORMAT_FIXTURES)
+def test_audio_stream_avoids_video(fixture: str) -> None:
+    plan = plan_audio_format(formats=load_formats(fixture))
+
+    assert plan is not None
+    assert plan["baseline_format_id"] is not None
+    assert plan["bytes_avoided"] >= 0
+
+
+@pytest.mark.parametrize("fixture", FORMAT_FIXTURES)
+def test_duration_is_estimated_from_formats(fixture: str) -> None:
+    info = load_fixture(fixture)
+
+    duration = estimate_duration(info["formats"])
+
+    assert duration == pytest.approx(info["duration"], abs=1.0)
+
+
+def select(formats: List[FormatInfo], **kwargs) -> List[FormatInfo]:
+    """
+    Run the yt_dlp format selector the way yt_dlp does.
+    """
+
+    return list(build_format_selector(**kwargs)({"formats": formats}))
+
+
+@pytest.mark.parametrize("fixture", FORMAT_FIXTURES)
+def test_selector_sizes_streams_without_filesize(fixture: str) -> None:
+    formats = load_formats(fixture)
+    expected = plan_audio_format(
+        formats=formats, output_format="opus", target_bitrate=64
+    )
+    # audio streams listing only their bitrate, e.g. from a DASH manifest
+    sizeless = [
+        ({**f, "filesize": None, "filesize_approx": None} if is_audio_only(f) else f)
+        for f in formats
+    ]
+
+    selected = select(sizeless, output_format="opus", target_bitrate=64)
+
+    assert expected is not None
+    assert [f["format_id"] for f in selected] == [expected["format_id"]]
+
+
+def test_selector_falls_back_without_audio_codecs() -> None:
+    # HLS and generic extractor formats often leave the codecs unset
+    formats = [
+        {**f, "acodec": None}
+        for f in load_formats("video_info.json")
+        if f.get("vcodec") != "none" or f.get("acodec") != "none"
+    ]
+    formats.insert(0, {"format_id": "sb0", "acodec": "none", "vcodec": "none"})
+
+    selected = select(formats)
+
+    assert [f["format_id"] for f in selected] == [formats[-1]["format_id"]]
+
+
+def test_selector_yields_nothing_without_formats() -> None:
+    assert not select([])
@@ -0,0 +1,243 @@
+"""
+Tests for the HTTP retries, against a local server that answers each request the
+way a test tells it to.
+"""
+
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator, List, Tuple
+import pytest
+import requests
+from yt_music.utils.http import create_session, download_to_file, request_with_retries
+from yt_music.utils.ratelimit import configure_rate_limits, get_host_stats
+
+BODY = b"\xff\xd8" + bytes(range(256)) * 64
+
+# what the server does for a request: ("status", code, retry_after), ("drop",),
+# which closes the connection without a response, or ("truncate",), which sends
+# half of `BODY` with the length of all of it
+Answer = Tuple
+
+
+class StandInServer:
+    """
+    Server answering requests with the next of `answers`, and `BODY` once they
+    run out.
+    """
+
+    def __init__(self) -> None:
+        self.answers: List[Answer] = []
+        self.requests = 0
+        lock = threading.Lock()
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            """Stand-in for a flaky image host."""
+
+            def do_GET(self) -> None:  # pylint: disable=invalid-name
+                with lock:
+                    stand_in.requests += 1
+                    answer = stand_in.answers.pop(0) if stand_in.answers else None
+
+                if answer is None:
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(BODY)))
+                    self.end_headers()
+                    self.wfile.write(BODY)
+                elif answer[0] == "status":
+                    _, status_code, retry_after = answer
+                    self.send_response(status_code)
+                    if retry_after is not None:
+                        self.send_header("Retry-After", retry_after)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                elif answer[0] == "truncate":
+                    self.send_response(200)
+                    self.send_header("Content-Length", str(len(BODY)))
+                    self.end_headers()
+                    self.wfile.write(BODY[: len(BODY) // 2])
+                    self.close_connection = True
+                else:
+                    self.close_connection = True
+
+            def log_message(self, *args) -> None:  # pylint: disable=arguments-differ
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/cover.jpg"
+
+
+@pytest.fixture(name="server")
+def fixture_server() -> Iterator[StandInServer]:
+    """
+    Serve in a background thread, with the rate limits reset around the test.
+    """
+
+    configure_rate_limits()
+    stand_in = StandInServer()
+    thread = threading.Thread(target=stand_in.server.serve_forever, daemon=True)
+    thread.start()
+    yield stand_in
+    stand_in.server.shutdown()
+    stand_in.server.server_close()
+    configure_rate_limits()
+
+
+@pytest.fixture(name="delays")
+def fixture_delays(monkeypatch: pytest.MonkeyPatch) -> List[float]:
+    """
+    Record the delays between retries instead of sleeping. The pauses of the rate
+    limiter for throttled hosts are skipped without being recorded.
+    """
+
+    delays: List[float] = []
+
+    def sleep(seconds: float) -> None:
+        caller = sys._getframe(1)  # pylint: disable=protected-access
+        if caller.f_globals["__name__"] == "yt_music.utils.http":
+            delays.append(seconds)
+
+    monkeypatch.setattr("time.sleep", sleep)
+    return delays
+
+
+def test_retry_after_is_honored(server: StandInServer, delays: List[float]) -> None:
+    server.answers = [("status", 429, "2")]
+
+    with request_with_retries(server.url, session=create_session()) as response:
+        assert response.status_code == 200
+        assert response.content == BODY
+
+    assert server.requests == 2
+    assert delays == [2.0]
+    assert get_host_stats()["127.0.0.1"]["throttled"] == 1
+
+
+def test_unavailable_is_retried_with_backoff(
+    server: StandInServer, delays: List[float]
+) -> None:
+    server.answers = [("status", 503, None), ("status", 503, None)]
+
+    with request_with_retries(
+        server.url, session=create_session(), backoff=0.01
+    ) as response:
+        assert response.status_code == 200
+
+    assert server.requests == 3
+    assert len(delays) == 2
+    assert all(0 <= delay <= 0.02 for delay in delays)
+
+
+def test_last_status_is_returned(server: StandInServer, delays: List[float]) -> None:
+    server.answers = [("status", 429, "0")] * 3
+
+    with request_with_retries(
+        server.url, session=create_session(), retries=2
+    ) as response:
+        assert response.status_code == 429
+
+    assert server.requests == 3
+    assert len(delays) == 2
+
+
+def test_missing_is_not_retried(server: StandInServer, delays: List[float]) -> None:
+    server.answers = [("status", 404, None)]
+
+    with request_with_retries(server.url, session=create_session()) as response:
+        assert response.status_code == 404
+
+    assert server.requests == 1
+    assert not delays
+
+
+def test_dropped_connection_is_retried(
+    server: StandInServer, delays: List[float]
+) -> None:
+    server.answers = [("drop",)]
+
+    with request_with_retries(
+        server.url, session=create_session(), backoff=0.01
+    ) as response:
+        assert response.content == BODY
+
+    assert server.requests == 2
+    assert len(delays) == 1
+
+
+def test_dropped_connection_raises_after_retries(
+    server: StandInServer, delays: List[float]
+) -> None:
+    server.answers = [("drop",)] * 3
+
+    with pytest.raises(requests.ConnectionError):
+        request_with_retries(
+            server.url, session=create_session(), retries=2, backoff=0.01
+        )
+
+    assert server.requests == 3
+
+
+def test_download_retries_truncated_body(
+    server: StandInServer, delays: List[float], tmp_path: Path
+) -> None:
+    server.answers = [("truncate",), ("drop",)]
+
+    response = download_to_file(
+        server.url, tmp_path / "cover.jpg", session=create_session(), backoff=0.01
+    )
+
+    assert response.status_code == 200
+    assert (tmp_path / "cover.jpg").read_bytes() == BODY
+    assert server.requests == 3
+    assert len(delays) == 2
+
+
+def test_download_raises_when_body_keeps_failing(
+    server: StandInServer, delays: List[float], tmp_path: Path
+) -> None:
+    server.answers = [("truncate",)] * 2
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        download_to_file(
+            server.url,
+            tmp_path / "cover.jpg",
+            session=create_session(),
+            retries=1,
+            backoff=0.01,
+        )
+
+    assert server.requests == 2
+
+
+def test_download_leaves_file_for_other_status(
+    server: StandInServer, delays: List[float], tmp_path: Path
+) -> None:
+    server.answers = [("status", 404, None)]
+
+    response = download_to_file(
+        server.url, tmp_path / "cover.jpg", session=create_session()
+    )
+
+    assert response.status_code == 404
+    assert not (tmp_path / "cover.jpg").exists()
+    assert not delays
+
+
+def test_download_shares_retries_between_requests_and_reads(
+    server: StandInServer, delays: List[float], tmp_path: Path
+) -> None:
+    server.answers = [("truncate",), ("status", 503, None), ("truncate",)] * 2
+
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        download_to_file(
+            server.url,
+            tmp_path / "cover.jpg",
+            session=create_session(),
+            retries=2,
+            backoff=0.01,
+        )
+
+    assert server.requests == 3
+    assert len(delays) == 2
@@ -0,0 +1,65 @@
+"""
+Tests for the staged pipeline.
+"""
+
+import threading
+from typing import Any, List
+from yt_music.pipeline import PipelineResult, run_pipeline
+
+
+def fail(value: Any) -> Any:
+    raise ValueError(f"failed on {value}")
+
+
+def test_failing_error_callback_does_not_hang() -> None:
+    results: List[PipelineResult] = []
+
+    def raise_from_callback(value: Any, error: Exception) -> None:
+        raise RuntimeError(f"callback failed on {value}")
+
+    def run() -> None:
+        results.extend(
+            run_pipeline(
+                items=[1, 2, 3],
+                stages=[{"name": "a", "func": fail, "workers": 1}],
+                on_error=raise_from_callback,
+            )
+        )
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    thread.join(timeout=10)
+
+    assert not thread.is_alive()
+    assert [result["value"] for result in results] == [1, 2, 3]
+    assert all(isinstance(result["error"], ValueError) for result in results)
+    assert all(result["stage"] == "a" for result in results)
+
+
+def test_failed_items_skip_later_stages() -> None:
+    failed: List[Any] = []
+
+    results = run_pipeline(
+        items=range(6),
+        stages=[
+            {"name": "double", "func": lambda value: value * 2, "workers": 2},
+            {
+                "name": "check",
+                "func": lambda value: fail(value) if value % 4 else value,
+                "workers": 2,
+            },
+            {"name": "add", "func": lambda value: value + 1, "workers": 1},
+        ],
+        on_error=lambda value, error: failed.append(value),
+    )
+
+    assert [result["value"] for result in results] == [1, 2, 5, 6, 9, 10]
+    assert [result["stage"] for result in results] == [
+        None,
+        "check",
+        None,
+        "check",
+        None,
+        "check",
+    ]
+    assert sorted(failed) == [2, 6, 10]
@@ -0,0 +1,108 @@
+"""
+Tests for the request and bandwidth limits, against the local stand-in server of
+`benchmarks.bench_rate_limit` that throttles hosts sending too many requests.
+"""
+
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+import pytest
+import yt_dlp
+from benchmarks.bench_rate_limit import HOSTS, run_once, start_server
+from benchmarks.fake_ytdlp import FakeYoutubeDL, load_fixture
+from yt_music.utils.ratelimit import configure_rate_limits, get_host, get_host_stats
+from yt_music.utils.ytdlp import download_audio
+
+VIDEO_INFO = load_fixture("video_info.json")
+
+# requests per second per host the stand-in server allows before sending 429
+SERVER_RPS = 10
+
+# requests sent to each host
+REQUESTS = 15
+
+
+@pytest.fixture(autouse=True)
+def reset_rate_limits() -> Iterator[None]:
+    """
+    Start and end every test without limits or throttled hosts.
+    """
+
+    configure_rate_limits()
+    yield
+    configure_rate_limits()
+
+
+def run_against_server(
+    requests_per_second: Optional[float],
+    max_bandwidth: Optional[float] = None,
+    requests: int = REQUESTS,
+    body_size: int = 1024,
+) -> Tuple[float, int, Dict[str, int]]:
+    """
+    Fetch `requests` URLs from each host of a server allowing `SERVER_RPS`
+    requests per second per host, with `configure_rate_limits` set to the given
+    limits. Returns the elapsed time, bytes read and 429s sent by host.
+    """
+
+    server, throttled = start_server(
+        server_rps=SERVER_RPS, body_size=body_size, retry_after=0.1
+    )
+    try:
+        seconds, num_bytes = run_once(
+            port=server.server_address[1],
+            requests=requests,
+            workers=8,
+            requests_per_second=requests_per_second,
+            max_bandwidth=max_bandwidth,
+        )
+    finally:
+        server.shutdown()
+        server.server_close()
+    return seconds, num_bytes, throttled
+
+
+def test_request_limit_avoids_throttling() -> None:
+    _, _, throttled = run_against_server(requests_per_second=None)
+    assert sum(throttled.values()) > 0
+
+    configure_rate_limits()
+    seconds, num_bytes, throttled = run_against_server(requests_per_second=8)
+    assert num_bytes == REQUESTS * len(HOSTS) * 1024
+    assert sum(throttled.values()) == 0
+    # hosts are paced separately, so both finish in about 14 / 8 seconds
+    assert 1.5 <= seconds < 3.0
+    for host in HOSTS:
+        assert get_host_stats()[host]["requests"] == REQUESTS
+
+
+def test_bandwidth_limit() -> None:
+    # 10 responses of 100 kB at 0.5 MB/s, with the first second's worth at once
+    seconds, num_bytes, throttled = run_against_server(
+        requests_per_second=None, max_bandwidth=0.5, requests=5, body_size=100_000
+    )
+    assert num_bytes == 1_000_000
+    assert not throttled
+    assert seconds >= 0.9
+
+
+def test_ytdlp_retries_slow_down_media_host(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(FakeYoutubeDL, "latency", 0.0)
+    monkeypatch.setattr(FakeYoutubeDL, "duration", 5.0)
+    monkeypatch.setattr(FakeYoutubeDL, "http_retries", 2)
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", FakeYoutubeDL)
+    configure_rate_limits(requests_per_second=100)
+
+    audio_path = download_audio(
+        youtube_url=VIDEO_INFO["webpage_url"], download_dir=tmp_path, file_name="01"
+    )
+
+    assert audio_path is not None and audio_path.exists()
+    stats = get_host_stats()
+    video_host = get_host(VIDEO_INFO["webpage_url"])
+    media_host = get_host(VIDEO_INFO["url"])
+    assert media_host != video_host
+    assert stats[media_host]["throttled"] == 2
+    assert stats[video_host]["throttled"] == 0
+    assert stats[video_host]["requests"] == 1
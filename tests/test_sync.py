@@ -0,0 +1,77 @@
+"""
+Tests for syncing albums with playlists.
+"""
+
+import copy
+from pathlib import Path
+from typing import Any, Dict
+import pytest
+import yt_dlp
+from benchmarks.fake_ytdlp import FakeYoutubeDL, load_fixture
+from yt_music.sync import load_sync_state, sync_playlist
+from yt_music.utils.catalog import get_video_id
+
+PLAYLIST_INFO = load_fixture("playlist_info.json")
+PLAYLIST_URL = PLAYLIST_INFO["original_url"]
+ENTRIES = PLAYLIST_INFO["entries"]
+
+
+class RepeatedTitleYoutubeDL(FakeYoutubeDL):
+    """
+    `FakeYoutubeDL` listing the second video under the title of the first, and
+    failing to download it.
+    """
+
+    def extract_info(
+        self, url: str, download: bool = False, process: bool = True
+    ) -> Dict[str, Any]:
+        if download and url == ENTRIES[1]["url"]:
+            raise yt_dlp.utils.DownloadError("Video unavailable")
+        info = super().extract_info(url, download=download, process=process)
+        if "entries" in info:
+            entries = [copy.deepcopy(entry) for entry in info["entries"]]
+            entries[1]["title"] = entries[0]["title"]
+            info["entries"] = iter(entries) if not process else entries
+        return info
+
+
+class NotPlaylistYoutubeDL(FakeYoutubeDL):
+    """
+    `FakeYoutubeDL` listing a channel page instead of a playlist.
+    """
+
+    def extract_info(
+        self, url: str, download: bool = False, process: bool = True
+    ) -> Dict[str, Any]:
+        info = super().extract_info(url, download=download, process=process)
+        info["webpage_url_basename"] = "videos"
+        return info
+
+
+def test_failed_tracks_are_matched_by_video(
+    music_dir_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", RepeatedTitleYoutubeDL)
+
+    report = sync_playlist(
+        youtube_url=PLAYLIST_URL, artist="Artist", album="Album", year=2020
+    )
+
+    state = load_sync_state(music_dir_path, PLAYLIST_URL)
+    assert state["failed"] == [get_video_id(ENTRIES[1]["url"])]
+    assert report["failed_tracks"] == [ENTRIES[0]["title"]]
+    assert len(report["new_tracks"]) == len(ENTRIES) - 1
+    assert report["new_tracks"][0] == ENTRIES[0]["title"]
+
+
+def test_sync_of_url_without_playlist_fails(
+    music_dir_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(yt_dlp, "YoutubeDL", NotPlaylistYoutubeDL)
+
+    with pytest.raises(ValueError, match="No playlist or video found"):
+        sync_playlist(
+            youtube_url=PLAYLIST_URL, artist="Artist", album="Album", year=2020
+        )
+
+    assert load_sync_state(music_dir_path, PLAYLIST_URL)["last_synced"] is None
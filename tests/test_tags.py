@@ -0,0 +1,99 @@
+"""
+Tests for the fast ID3 tag reader and for writing tags.
+"""
+
+import struct
+from pathlib import Path
+from typing import Dict
+import pytest
+from benchmarks.fake_ytdlp import syncsafe, write_synthetic_mp3
+from yt_music.utils.tags import (
+    ID3_PADDING,
+    TrackInfo,
+    apply_track_metadata,
+    read_id3_tags,
+)
+
+TAGS = {
+    b"TIT2": "Song",
+    b"TPE1": "Artist",
+    b"TALB": "Album",
+    b"TYER": "2020",
+    b"TDRC": "2020",
+    b"TRCK": "3/10",
+}
+
+
+def build_tag(version: int, format_flags: int, group: bytes) -> bytes:
+    """
+    Build an ID3v2 tag of Latin-1 text frames with the given format flags, each
+    frame starting with `group` as its group identifier.
+    """
+
+    frames = b""
+    for frame_id, text in TAGS.items():
+        if frame_id == (b"TYER" if version == 4 else b"TDRC"):
+            continue
+        data = group + b"\x00" + text.encode("latin-1")
+        size = syncsafe(len(data)) if version == 4 else struct.pack(">I", len(data))
+        frames += frame_id + size + bytes((0, format_flags)) + data
+    return b"ID3" + bytes((version, 0, 0)) + syncsafe(len(frames)) + frames
+
+
+def write_tagged_mp3(mp3_file: Path, tag: bytes) -> Path:
+    write_synthetic_mp3(mp3_file, duration=1)
+    mp3_file.write_bytes(tag + mp3_file.read_bytes())
+    return mp3_file
+
+
+@pytest.mark.parametrize(
+    "version, format_flags, group",
+    [(3, 0x00, b""), (4, 0x00, b""), (3, 0x20, b"\x03"), (4, 0x40, b"\x03")],
+)
+def test_read_id3_tags(
+    tmp_path: Path, version: int, format_flags: int, group: bytes
+) -> None:
+    mp3_file = write_tagged_mp3(
+        tmp_path / "track.mp3", build_tag(version, format_flags, group)
+    )
+
+    expected: Dict[str, object] = {
+        "title": "Song",
+        "artist": "Artist",
+        "album": "Album",
+        "year": 2020,
+        "track_number": 3,
+    }
+    assert read_id3_tags(mp3_file) == expected
+
+
+def read_tag_size(mp3_file: Path) -> int:
+    header = mp3_file.read_bytes()[:10]
+    assert header[:3] == b"ID3"
+    return 10 + sum(byte << (7 * (3 - n)) for n, byte in enumerate(header[6:10]))
+
+
+def test_apply_track_metadata_leaves_padding(tmp_path: Path) -> None:
+    eyed3_tag = pytest.importorskip("eyed3.id3.tag")
+    default_padding = eyed3_tag.DEFAULT_PADDING
+    mp3_file = write_synthetic_mp3(tmp_path / "01.mp3", duration=1)
+    tags: TrackInfo = {
+        "title": "Song",
+        "artist": "Artist",
+        "album": "Album",
+        "year": 2020,
+        "track_number": 3,
+    }
+
+    apply_track_metadata(mp3_file, tags)
+    tag_size = read_tag_size(mp3_file)
+    file_size = mp3_file.stat().st_size
+
+    assert tag_size >= ID3_PADDING
+    assert eyed3_tag.DEFAULT_PADDING == default_padding
+    assert read_id3_tags(mp3_file)["title"] == "Song"
+
+    # a small cover fits in the padding, so the file is not rewritten
+    apply_track_metadata(mp3_file, tags, image_bytes=b"\xff\xd8" + b"\0" * 1000)
+    assert read_tag_size(mp3_file) == tag_size
+    assert mp3_file.stat().st_size == file_size
@@ -3,14 +3,146 @@ Append Track Numbers.
 """
 
 import argparse
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import List
-from yt_music.utils.tags import TrackInfo, get_mp3_tags
+from typing import Dict, List, Optional, Tuple, TypedDict
+from yt_music.utils.catalog import move_track, open_catalog
+from yt_music.utils.tags import TrackInfo, read_id3_tags
 
+# sidecar index of scanned tags in the source directory, keyed by path relative to it
+INDEX_FILE_NAME = ".track_tags_index.json"
 
-def rename_mp3_file(file_path: Path, tags: TrackInfo) -> None:
+# files handed to a worker process at once
+SCAN_CHUNK_SIZE = 64
+
+
+class IndexEntry(TypedDict):
+    """Type for a file entry in the tag index."""
+
+    size: int
+    mtime_ns: int
+    tags: Optional[TrackInfo]
+
+
+def load_index(music_dir_path: Path) -> Dict[str, IndexEntry]:
+    """
+    Load the tag index of a directory.
+    Returns an empty index if none exists or it cannot be read.
+    """
+
+    try:
+        with open(music_dir_path / INDEX_FILE_NAME, encoding="utf-8") as f:
+            return json.load(f)["files"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def save_index(music_dir_path: Path, index: Dict[str, IndexEntry]) -> None:
+    """
+    Atomically write the tag index of a directory.
+    """
+
+    index_path = music_dir_path / INDEX_FILE_NAME
+    temp_path = index_path.with_suffix(".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"files": index}, f)
+    os.replace(temp_path, index_path)
+
+
+def find_mp3_files(music_dir_path: Path, recursive: bool) -> List[Path]:
+    """
+    Return the sorted paths of all MP3 files in a directory, and in all of its
+    subdirectories if `recursive` is set.
+    """
+
+    mp3_file_paths: List[Path] = []
+    if recursive:
+        for dir_path, _, file_names in os.walk(music_dir_path):
+            for file_name in file_names:
+                if file_name.endswith(".mp3"):
+                    mp3_file_paths.append(Path(dir_path) / file_name)
+    else:
+        for item in music_dir_path.iterdir():
+            if item.is_file() and item.suffix == ".mp3":
+                mp3_file_paths.append(item)
+
+    return sorted(mp3_file_paths)
+
+
+def read_index_entry(mp3_file_path: Path) -> Optional[IndexEntry]:
+    """
+    Read the tags of an MP3 file with the size and modification time they were
+    read at. Returns `None` if the file cannot be read.
+    """
+
+    try:
+        stat = mp3_file_path.stat()
+        tags = read_id3_tags(mp3_file=mp3_file_path)
+    # eyed3 raises its own errors, and others, on a damaged tag, and one bad
+    # file must not stop the scan of the others
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        print(f"Something went wrong when reading '{mp3_file_path.name}': {e}")
+        return None
+
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "tags": tags}
+
+
+def scan_tags(
+    mp3_file_paths: List[Path],
+    music_dir_path: Path,
+    index: Dict[str, IndexEntry],
+    jobs: Optional[int] = None,
+) -> Dict[str, IndexEntry]:
+    """
+    Get the tags of MP3 files. Files whose size and modification time match the
+    index are not read again, the others are read over a process pool.
+
+    Args:
+        mp3_file_paths (List[Path]): MP3 files to scan.
+        music_dir_path (Path): Directory the index keys are relative to.
+        index (Dict[str, IndexEntry]): Tag index from the last scan.
+        jobs (Optional[int]): Number of worker processes. Defaults to the CPU count.
+
+    Returns:
+        Dict[str, IndexEntry]: Index entries of the scanned files.
+    """
+
+    scanned: Dict[str, IndexEntry] = {}
+    pending: List[Path] = []
+    for mp3_file_path in mp3_file_paths:
+        key = mp3_file_path.relative_to(music_dir_path).as_posix()
+        entry = index.get(key)
+        if entry is not None:
+            stat = mp3_file_path.stat()
+            if entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                scanned[key] = entry
+                continue
+        pending.append(mp3_file_path)
+
+    print(f"Reading tags of {len(pending)} of {len(mp3_file_paths)} files.")
+
+    if jobs == 1 or len(pending) <= 1:
+        entries = [read_index_entry(mp3_file_path) for mp3_file_path in pending]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            entries = list(
+                executor.map(read_index_entry, pending, chunksize=SCAN_CHUNK_SIZE)
+            )
+
+    for mp3_file_path, entry in zip(pending, entries):
+        if entry is not None:
+            scanned[mp3_file_path.relative_to(music_dir_path).as_posix()] = entry
+
+    return scanned
+
+
+def rename_mp3_file(file_path: Path, tags: TrackInfo) -> Optional[Path]:
     """
     Rename an mp3 file with the track number appended to the beginning of the file name.
+    Returns the new path, or `None` if the file was not renamed.
     """
 
     track_title = tags["title"]
@@ -21,24 +153,28 @@ def rename_mp3_file(file_path: Path, tags: TrackInfo) -> None:
         print(
             f"Track name tag '{track_title}' does not match file name '{old_file_stem}'. Skipping."
         )
-        return
+        return None
 
     new_file_name = f"{track_number:02d} - {track_title}{file_path.suffix}"
     new_file_path = file_path.parent / Path(new_file_name)
 
     if new_file_path.exists():
         print(f"File '{new_file_name}' already exists. Skipping.")
-        return
+        return None
 
     old_file_name = file_path.name
     try:
         file_path.rename(new_file_path)
         print(f"Successfully renamed '{old_file_name}' to '{new_file_name}'.")
+        return new_file_path
     except Exception as e:
         print(f"Something went wrong when renaming '{old_file_name}': {e}")
+        return None
 
 
-def append_track_numbers(source_dir: str) -> None:
+def append_track_numbers(
+    source_dir: str, recursive: bool = False, jobs: Optional[int] = None
+) -> None:
     """
     Main entry point.
     """
@@ -46,20 +182,43 @@ def append_track_numbers(source_dir: str) -> None:
     music_dir_path = Path(source_dir)
     if (not music_dir_path.exists()) or (not music_dir_path.is_dir()):
         print(f"'{music_dir_path.name}' does not exist or is not a valid directory.")
+        return
 
-    mp3_file_paths: List[Path] = []
-    for item in music_dir_path.iterdir():
-        if item.is_file() and item.suffix == ".mp3":
-            mp3_file_paths.append(item)
+    mp3_file_paths = find_mp3_files(music_dir_path=music_dir_path, recursive=recursive)
+    index = scan_tags(
+        mp3_file_paths=mp3_file_paths,
+        music_dir_path=music_dir_path,
+        index=load_index(music_dir_path=music_dir_path),
+        jobs=jobs,
+    )
 
+    renamed: List[Tuple[Path, Path]] = []
     for mp3_file_path in mp3_file_paths:
+        key = mp3_file_path.relative_to(music_dir_path).as_posix()
+        entry = index.get(key)
+        if entry is None:
+            continue
 
-        mp3_tags = get_mp3_tags(mp3_file=mp3_file_path)
+        mp3_tags = entry["tags"]
         if mp3_tags is None:
             print(f"One or more music tags missing from file '{mp3_file_path.name}'.")
             continue
 
-        rename_mp3_file(file_path=mp3_file_path, tags=mp3_tags)
+        new_file_path = rename_mp3_file(file_path=mp3_file_path, tags=mp3_tags)
+        if new_file_path is not None:
+            # a rename keeps the size and modification time, so the entry stays valid
+            index[new_file_path.relative_to(music_dir_path).as_posix()] = index.pop(key)
+            renamed.append((mp3_file_path, new_file_path))
+
+    save_index(music_dir_path=music_dir_path, index=index)
+
+    if renamed:
+        try:
+            with open_catalog() as connection:
+                for old_path, new_path in renamed:
+                    move_track(connection, old_path=old_path, new_path=new_path)
+        except sqlite3.Error as e:
+            print(f"Unable to update the catalog. {e}")
 
 
 if __name__ == "__main__":
@@ -67,12 +226,25 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(
         description="Appends track numbers to the beginning of music track file names "
         "in a given directory. Music tracks must have metadata already set.",
-        usage="python -m tools.append_track_numbers [SOURCE_DIR]",
+        usage="python -m tools.append_track_numbers [SOURCE_DIR] [OPTIONS]",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     parser.add_argument("source_dir", type=str, help="Directory with music tracks.")
+    parser.add_argument(
+        "--recursive",
+        action="store_true",
+        help="Rename music tracks in all subdirectories as well.",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of processes reading tags. Defaults to the CPU count.",
+    )
 
     # parse arguments
     args = parser.parse_args()
 
-    append_track_numbers(source_dir=args.source_dir)
+    append_track_numbers(
+        source_dir=args.source_dir, recursive=args.recursive, jobs=args.jobs
+    )
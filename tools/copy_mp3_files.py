@@ -3,50 +3,162 @@ Copy MP3 files in a sorted order.
 """
 
 import argparse
+import errno
+import json
 import os
 import shutil
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from typing import List
+from typing import (
+    Callable,
+    Dict,
+    Generator,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypedDict,
+)
+from yt_music.utils.manifest import hash_file
 
+# sync index stored in the target directory, keyed by path relative to it
+INDEX_FILE_NAME = ".copy_mp3_index.json"
 
-def is_mp3_dir(user_dir: Path) -> bool:
+# number of files copied at once in sync mode
+DEFAULT_WORKERS = 4
+
+# bytes handed to the kernel per copy call
+COPY_CHUNK_SIZE = 8 * 1024 * 1024
+
+# save the index after this many files so an interrupted sync keeps its progress
+INDEX_SAVE_INTERVAL = 500
+
+# buffer size of sequential writes in device mode
+DEVICE_WRITE_SIZE = 4 * 1024 * 1024
+
+# FAT stores modification times with a two second resolution
+FAT_MTIME_RESOLUTION_NS = 2_000_000_000
+
+# errors meaning a zero-copy call is not supported for this pair of files
+ZERO_COPY_ERRORS = {
+    errno.ENOSYS,
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.EOPNOTSUPP,
+    errno.ENOTSUP,
+}
+
+
+class IndexEntry(TypedDict):
+    """Type for a file entry in the sync index."""
+
+    size: int
+    mtime_ns: int
+    sha256: str
+
+
+class Mp3Dir(TypedDict):
+    """Type for a directory with MP3 files and the files copied with it."""
+
+    path: Path
+    mp3_files: List[Path]
+    other_files: List[Path]
+
+
+class PlannedDir(TypedDict):
+    """Type for a target directory in a device write plan."""
+
+    target_dir: Path
+    files: List[Tuple[Path, Path]]
+    size: int
+    # size of the target files already on the device, freed before the rewrite
+    replaced_size: int
+    in_order: bool
+
+
+def _scan_tree(dir_path: str, is_root: bool) -> Generator[Mp3Dir, None, List[str]]:
     """
-    Determine if a directory contains MP3 files.
+    Scan a directory tree with one `os.scandir` call per directory. Yields the
+    MP3 directories in the tree in sorted order and returns the paths of all
+    files in it. File types come from the cached `DirEntry` info, so no extra
+    stat calls are made on filesystems that report them.
     """
 
-    if not user_dir.exists() or not user_dir.is_dir():
-        return False
-
-    for item in user_dir.iterdir():
-        if not item.is_file():
-            continue
+    file_paths: List[str] = []
+    subdir_paths: List[str] = []
+    has_mp3 = False
+
+    try:
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdir_paths.append(entry.path)
+                elif entry.is_file():
+                    file_paths.append(entry.path)
+                    if os.path.splitext(entry.name)[1] == ".mp3":
+                        has_mp3 = True
+    except OSError as e:
+        print(f"Cannot read folder. Skipping: {dir_path}: {e}")
+        return file_paths
+
+    subdir_paths.sort()
+    if is_root or not has_mp3:
+        for subdir_path in subdir_paths:
+            file_paths += yield from _scan_tree(subdir_path, is_root=False)
+        return file_paths
+
+    # an MP3 directory is copied with the files of all its subdirectories, so
+    # the directories nested in it wait until its whole tree is scanned
+    nested_mp3_dirs: List[Mp3Dir] = []
+    for subdir_path in subdir_paths:
+        subtree = _scan_tree(subdir_path, is_root=False)
+        while True:
+            try:
+                nested_mp3_dirs.append(next(subtree))
+            except StopIteration as stop:
+                file_paths += stop.value
+                break
 
-        if item.suffix == ".mp3":
-            return True
+    mp3_files: List[Path] = []
+    other_files: List[Path] = []
+    for file_path in file_paths:
+        if os.path.splitext(file_path)[1].lower() == ".mp3":
+            mp3_files.append(Path(file_path))
+        else:
+            other_files.append(Path(file_path))
 
-    return False
+    yield Mp3Dir(
+        path=Path(dir_path),
+        mp3_files=sorted(mp3_files),
+        other_files=sorted(other_files),
+    )
+    yield from nested_mp3_dirs
+    return file_paths
 
 
-def get_mp3_dirs(source_dir: Path) -> List[Path]:
+def scan_mp3_dirs(source_dir: Path) -> Iterator[Mp3Dir]:
     """
-    Return a list of paths to all MP3 directories.
+    Walk the source directory once and yield every MP3 directory below it, in
+    sorted order, as soon as it has been scanned.
     """
 
-    mp3_dirs: List[Path] = []
+    yield from _scan_tree(str(source_dir), is_root=True)
+
 
-    source_dir_files = source_dir.rglob("*")
-    for file in source_dir_files:
-        if file.is_dir() and is_mp3_dir(file):
-            mp3_dirs.append(file)
+def get_mp3_dirs(source_dir: Path) -> List[Mp3Dir]:
+    """
+    Return a list of all MP3 directories.
+    """
 
-    sorted_mp3_dirs = sorted(mp3_dirs)
+    mp3_dirs = list(scan_mp3_dirs(source_dir=source_dir))
 
-    print(f"Total MP3 Folders Found: {len(sorted_mp3_dirs)}")
-    for mp3_dir in sorted(sorted_mp3_dirs):
-        print(f"\tFolder: {mp3_dir.name}")
+    print(f"Total MP3 Folders Found: {len(mp3_dirs)}")
+    for mp3_dir in mp3_dirs:
+        print(f"\tFolder: {mp3_dir['path'].name}")
 
-    return sorted_mp3_dirs
+    return mp3_dirs
 
 
 def copy_file(source_file: Path, target_file: Path) -> None:
@@ -63,14 +175,14 @@ def copy_file(source_file: Path, target_file: Path) -> None:
         print(f"\t\tCopied: {target_file.name}")
 
 
-def copy_dir_files(source_mp3_dir: Path, target_mp3_dir: Path) -> None:
+def copy_dir_files(mp3_dir: Mp3Dir, target_mp3_dir: Path) -> None:
     """
     Copy all files from the source directory to the target directory.
     Creates the target directory if it does not exist. Otherwise, touch it.
     All files are sorted. MP3 files are copied first.
     """
 
-    print(f"\tSource: {source_mp3_dir}")
+    print(f"\tSource: {mp3_dir['path']}")
     print(f"\tTarget: {target_mp3_dir}")
 
     if target_mp3_dir.exists():
@@ -81,32 +193,514 @@ def copy_dir_files(source_mp3_dir: Path, target_mp3_dir: Path) -> None:
         target_mp3_dir.mkdir(parents=True)
         print(f"\t\tCreated Folder: {target_mp3_dir.name}")
 
-    mp3_files: List[Path] = []
-    other_files: List[Path] = []
+    for source_file in mp3_dir["mp3_files"] + mp3_dir["other_files"]:
+        target_file = target_mp3_dir / source_file.name
+        copy_file(source_file=source_file, target_file=target_file)
 
-    source_dir_files = source_mp3_dir.rglob("*")
-    for source_file in source_dir_files:
-        if not source_file.is_file():
-            print(f"Not a file. Skipping: {source_file}")
-            continue
 
-        if source_file.suffix.lower() == ".mp3":
-            mp3_files.append(source_file)
+def load_index(target_dir: Path) -> Dict[str, IndexEntry]:
+    """
+    Load the sync index of a target directory.
+    Returns an empty index if none exists or it cannot be read.
+    """
+
+    try:
+        with open(target_dir / INDEX_FILE_NAME, encoding="utf-8") as f:
+            return json.load(f)["files"]
+    except (OSError, ValueError, KeyError):
+        return {}
+
+
+def save_index(target_dir: Path, index: Dict[str, IndexEntry]) -> None:
+    """
+    Atomically write the sync index of a target directory.
+    """
+
+    index_path = target_dir / INDEX_FILE_NAME
+    temp_path = index_path.with_suffix(".tmp")
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump({"files": index}, f)
+    os.replace(temp_path, index_path)
+
+
+def _copy_file_range(source_fd: int, target_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(source_fd, target_fd, count, offset, offset)
+
+
+def _sendfile(source_fd: int, target_fd: int, offset: int, count: int) -> int:
+    os.lseek(target_fd, offset, os.SEEK_SET)
+    return os.sendfile(target_fd, source_fd, offset, count)
+
+
+def copy_file_contents(source_file: Path, target_file: Path) -> int:
+    """
+    Copy the contents and metadata of a file without passing the data through
+    user space where possible. Tries `copy_file_range`, which can share extents
+    on filesystems that support it, then `sendfile`, then a buffered copy. Each
+    method continues from where the one before it stopped copying.
+
+    Raises:
+        OSError: If fewer bytes than the size of the source file were copied.
+
+    Returns:
+        int: Number of bytes copied.
+    """
+
+    with open(source_file, "rb") as source, open(target_file, "wb") as target:
+        source_fd = source.fileno()
+        target_fd = target.fileno()
+        size = os.fstat(source_fd).st_size
+        offset = 0
+
+        copy_functions: List[Callable[[int, int, int, int], int]] = []
+        if hasattr(os, "copy_file_range"):
+            copy_functions.append(_copy_file_range)
+        if hasattr(os, "sendfile"):
+            copy_functions.append(_sendfile)
+
+        for copy_range in copy_functions:
+            try:
+                while offset < size:
+                    copied = copy_range(
+                        source_fd,
+                        target_fd,
+                        offset,
+                        min(COPY_CHUNK_SIZE, size - offset),
+                    )
+                    # some filesystems copy nothing instead of failing
+                    if copied == 0:
+                        break
+                    offset += copied
+            except OSError as e:
+                if e.errno not in ZERO_COPY_ERRORS:
+                    raise
+            if offset == size:
+                break
         else:
-            other_files.append(source_file)
+            source.seek(offset)
+            target.seek(offset)
+            shutil.copyfileobj(source, target, COPY_CHUNK_SIZE)
+            offset = target.tell()
 
-    sorted_mp3_files = sorted(mp3_files)
-    for source_file in sorted_mp3_files:
-        target_file = target_mp3_dir / source_file.name
-        copy_file(source_file=source_file, target_file=target_file)
+    if offset != size:
+        raise OSError(
+            errno.EIO,
+            f"Error: Copied {offset} of {size} bytes, the file changed while copying",
+            str(source_file),
+        )
 
-    sorted_other_files = sorted(other_files)
-    for source_file in sorted_other_files:
-        target_file = target_mp3_dir / source_file.name
-        copy_file(source_file=source_file, target_file=target_file)
+    shutil.copystat(source_file, target_file)
+    return offset
+
+
+def is_unchanged(
+    source_stat: os.stat_result, target_file: Path, entry: Optional[IndexEntry]
+) -> bool:
+    """
+    Determine from file sizes and modification times alone if a file is in sync.
+    """
+
+    if entry is None:
+        return False
+
+    if (
+        entry["size"] != source_stat.st_size
+        or entry["mtime_ns"] != source_stat.st_mtime_ns
+    ):
+        return False
+
+    try:
+        return target_file.stat().st_size == entry["size"]
+    except OSError:
+        return False
+
+
+def sync_file(
+    source_file: Path, target_file: Path, entry: Optional[IndexEntry]
+) -> Tuple[str, IndexEntry, int]:
+    """
+    Bring a target file in sync with its source. A source whose size or
+    modification time changed is hashed, and only copied if its contents differ
+    from the indexed copy. A target without an index entry is trusted if its
+    size and modification time match the source.
+
+    Args:
+        source_file (Path): File in the source directory.
+        target_file (Path): File in the target directory.
+        entry (Optional[IndexEntry]): Index entry of the last synced copy.
+
+    Returns:
+        Tuple[str, IndexEntry, int]: Action taken (`copied`, `updated`,
+        `unchanged` or `indexed`), the new index entry and the bytes copied.
+    """
 
+    source_stat = source_file.stat()
+    try:
+        target_stat: Optional[os.stat_result] = target_file.stat()
+    except FileNotFoundError:
+        target_stat = None
 
-def copy_mp3_files(source_dir_str: str, target_dir_str: str) -> None:
+    target_matches = (
+        target_stat is not None and target_stat.st_size == source_stat.st_size
+    )
+
+    action = "copied"
+    if entry is not None:
+        action = "updated"
+        if target_matches and entry["size"] == source_stat.st_size:
+            sha256 = hash_file(source_file)
+            if sha256 == entry["sha256"]:
+                return (
+                    "unchanged",
+                    IndexEntry(
+                        size=source_stat.st_size,
+                        mtime_ns=source_stat.st_mtime_ns,
+                        sha256=sha256,
+                    ),
+                    0,
+                )
+    elif (
+        target_matches
+        and target_stat is not None
+        and target_stat.st_mtime_ns == source_stat.st_mtime_ns
+    ):
+        return (
+            "indexed",
+            IndexEntry(
+                size=source_stat.st_size,
+                mtime_ns=source_stat.st_mtime_ns,
+                sha256=hash_file(source_file),
+            ),
+            0,
+        )
+
+    copied = copy_file_contents(source_file=source_file, target_file=target_file)
+    source_stat = source_file.stat()
+    return (
+        action,
+        IndexEntry(
+            size=source_stat.st_size,
+            mtime_ns=source_stat.st_mtime_ns,
+            sha256=hash_file(source_file),
+        ),
+        copied,
+    )
+
+
+def sync_mp3_files(
+    source_dir: Path,
+    target_dir: Path,
+    workers: int = DEFAULT_WORKERS,
+    stream: bool = False,
+) -> None:
+    """
+    Incrementally sync MP3 directories to a target directory. Files are only
+    copied if they are new or changed since the last sync, according to the
+    index kept in the target directory. Target files are created in sorted
+    order before their contents are copied in parallel, so the directory order
+    matches a sequential copy.
+
+    Args:
+        source_dir (Path): Source directory.
+        target_dir (Path): Target directory.
+        workers (int): Number of files to copy at once.
+        stream (bool): Start copying while the source directory is still scanned.
+    """
+
+    mp3_dirs: Iterable[Mp3Dir]
+    if stream:
+        mp3_dirs = scan_mp3_dirs(source_dir=source_dir)
+    else:
+        mp3_dirs = get_mp3_dirs(source_dir=source_dir)
+    index = load_index(target_dir=target_dir)
+    synced_index: Dict[str, IndexEntry] = {}
+
+    counts: Dict[str, int] = {
+        "copied": 0,
+        "updated": 0,
+        "unchanged": 0,
+        "indexed": 0,
+        "failed": 0,
+    }
+    total_bytes = 0
+    start_time = time.perf_counter()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for mp3_dir in mp3_dirs:
+                target_mp3_dir = target_dir / mp3_dir["path"].relative_to(source_dir)
+                if not target_mp3_dir.exists():
+                    target_mp3_dir.mkdir(parents=True)
+                    print(f"Created Folder: {target_mp3_dir}")
+
+                for source_file in mp3_dir["mp3_files"] + mp3_dir["other_files"]:
+                    target_file = target_mp3_dir / source_file.name
+                    key = target_file.relative_to(target_dir).as_posix()
+                    entry = index.get(key)
+
+                    source_stat = source_file.stat()
+                    if is_unchanged(source_stat, target_file, entry):
+                        synced_index[key] = entry  # type: ignore[assignment]
+                        counts["unchanged"] += 1
+                        continue
+
+                    # claim the directory entry now to keep the sorted order
+                    if not target_file.exists():
+                        target_file.touch()
+
+                    future = executor.submit(sync_file, source_file, target_file, entry)
+                    futures[future] = key
+
+            for completed, future in enumerate(as_completed(futures), start=1):
+                key = futures[future]
+                try:
+                    action, new_entry, copied = future.result()
+                except OSError as e:
+                    counts["failed"] += 1
+                    print(f"\tFailed: {key}: {e}")
+                    continue
+
+                synced_index[key] = new_entry
+                counts[action] += 1
+                total_bytes += copied
+                if action in ("copied", "updated"):
+                    print(f"\t{action.capitalize()}: {key}")
+
+                if completed % INDEX_SAVE_INTERVAL == 0:
+                    save_index(target_dir=target_dir, index={**index, **synced_index})
+    except BaseException:
+        save_index(target_dir=target_dir, index={**index, **synced_index})
+        raise
+
+    save_index(target_dir=target_dir, index=synced_index)
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Copied: {counts['copied']}, Updated: {counts['updated']}, "
+        f"Unchanged: {counts['unchanged'] + counts['indexed']}, Failed: {counts['failed']}"
+    )
+    print(
+        f"Transferred {total_bytes / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+        f"({total_bytes / 1024 / 1024 / max(elapsed, 1e-9):.1f} MB/s)"
+    )
+
+
+def is_dir_in_order(target_mp3_dir: Path, files: List[Tuple[Path, Path]]) -> bool:
+    """
+    Determine if a target directory already holds the planned files, unchanged
+    and in the planned order. On FAT, `os.scandir` lists entries in the order of
+    the directory table, which is the order players use.
+    """
+
+    try:
+        with os.scandir(target_mp3_dir) as entries:
+            target_entries = {entry.name: entry for entry in entries}
+            target_order = list(target_entries)
+    except OSError:
+        return False
+
+    names = [target_file.name for _, target_file in files]
+    if [name for name in target_order if name in set(names)] != names:
+        return False
+
+    for source_file, target_file in files:
+        source_stat = source_file.stat()
+        target_stat = target_entries[target_file.name].stat()
+        if target_stat.st_size != source_stat.st_size:
+            return False
+        if (
+            abs(target_stat.st_mtime_ns - source_stat.st_mtime_ns)
+            > FAT_MTIME_RESOLUTION_NS
+        ):
+            return False
+
+    return True
+
+
+def get_file_size(file_path: Path) -> int:
+    """
+    Return the size of a file, or 0 if it does not exist.
+    """
+
+    try:
+        return file_path.stat().st_size
+    except OSError:
+        return 0
+
+
+def plan_device_layout(
+    mp3_dirs: List[Mp3Dir], source_dir: Path, target_dir: Path
+) -> List[PlannedDir]:
+    """
+    Plan every target directory and file of a device write, in the order they
+    will be written.
+    """
+
+    plan: List[PlannedDir] = []
+    for mp3_dir in mp3_dirs:
+        target_mp3_dir = target_dir / mp3_dir["path"].relative_to(source_dir)
+        files = [
+            (source_file, target_mp3_dir / source_file.name)
+            for source_file in mp3_dir["mp3_files"] + mp3_dir["other_files"]
+        ]
+        plan.append(
+            PlannedDir(
+                target_dir=target_mp3_dir,
+                files=files,
+                size=sum(source_file.stat().st_size for source_file, _ in files),
+                replaced_size=sum(
+                    get_file_size(target_file) for _, target_file in files
+                ),
+                in_order=is_dir_in_order(target_mp3_dir, files),
+            )
+        )
+    return plan
+
+
+def write_file_sequential(
+    source_file: Path, target_file: Path, buffer: bytearray, fsync: bool
+) -> int:
+    """
+    Write a file in large sequential chunks, so the device allocates its clusters
+    in one run.
+
+    Returns:
+        int: Number of bytes written.
+    """
+
+    view = memoryview(buffer)
+    written = 0
+    with (
+        open(source_file, "rb", buffering=0) as source,
+        open(target_file, "wb", buffering=0) as target,
+    ):
+        while read := source.readinto(buffer):
+            target.write(view[:read])
+            written += read
+        if fsync:
+            os.fsync(target.fileno())
+
+    shutil.copystat(source_file, target_file)
+    return written
+
+
+def fsync_dir(dir_path: Path) -> None:
+    """
+    Flush a directory table to the device. Ignored where directories cannot be
+    opened or synced.
+    """
+
+    try:
+        dir_fd = os.open(dir_path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
+
+
+def write_device_files(source_dir: Path, target_dir: Path, fsync: bool = False) -> None:
+    """
+    Write MP3 directories to a device in one strictly sequential pass, so the
+    directory tables list folders and tracks in sorted order. The whole layout
+    is planned first. A target directory that already holds its files in order
+    is skipped. Otherwise its planned files are removed and written again in
+    order.
+
+    Args:
+        source_dir (Path): Source directory.
+        target_dir (Path): Directory on the device.
+        fsync (bool): Flush every directory to the device before the next one.
+
+    Raises:
+        RuntimeError: If the device does not have enough free space.
+    """
+
+    plan = plan_device_layout(
+        mp3_dirs=get_mp3_dirs(source_dir=source_dir),
+        source_dir=source_dir,
+        target_dir=target_dir,
+    )
+
+    pending = [planned_dir for planned_dir in plan if not planned_dir["in_order"]]
+    total_size = sum(planned_dir["size"] for planned_dir in pending)
+    # the planned files already on the device are removed before they are written
+    needed_size = total_size - sum(
+        planned_dir["replaced_size"] for planned_dir in pending
+    )
+    free_space = shutil.disk_usage(target_dir).free
+    if needed_size > free_space:
+        raise RuntimeError(
+            f"Not enough free space on the device: {needed_size / 1024 / 1024:.1f} MB "
+            f"needed, {free_space / 1024 / 1024:.1f} MB free."
+        )
+
+    print(
+        f"Writing {len(pending)} of {len(plan)} folders "
+        f"({total_size / 1024 / 1024:.1f} MB)"
+    )
+
+    buffer = bytearray(DEVICE_WRITE_SIZE)
+    total_written = 0
+    start_time = time.perf_counter()
+
+    for index, planned_dir in enumerate(plan, start=1):
+        target_mp3_dir = planned_dir["target_dir"]
+        if planned_dir["in_order"]:
+            print(f"In order {index} of {len(plan)}: {target_mp3_dir.name}")
+            continue
+
+        print(f"Writing {index} of {len(plan)}: {target_mp3_dir.name}")
+        if target_mp3_dir.exists():
+            # free the old entries first, so the rewritten files take their
+            # slots in order
+            for _, target_file in planned_dir["files"]:
+                target_file.unlink(missing_ok=True)
+        else:
+            target_mp3_dir.mkdir(parents=True)
+
+        dir_start_time = time.perf_counter()
+        dir_written = 0
+        for source_file, target_file in planned_dir["files"]:
+            dir_written += write_file_sequential(
+                source_file=source_file,
+                target_file=target_file,
+                buffer=buffer,
+                fsync=fsync,
+            )
+
+        if fsync:
+            fsync_dir(target_mp3_dir)
+            fsync_dir(target_mp3_dir.parent)
+
+        dir_elapsed = time.perf_counter() - dir_start_time
+        total_written += dir_written
+        print(
+            f"\tWrote {len(planned_dir['files'])} files, "
+            f"{dir_written / 1024 / 1024:.1f} MB "
+            f"({dir_written / 1024 / 1024 / max(dir_elapsed, 1e-9):.1f} MB/s)"
+        )
+
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"Wrote {total_written / 1024 / 1024:.1f} MB in {elapsed:.1f}s "
+        f"({total_written / 1024 / 1024 / max(elapsed, 1e-9):.1f} MB/s)"
+    )
+
+
+def copy_mp3_files(
+    source_dir_str: str,
+    target_dir_str: str,
+    sync: bool = False,
+    workers: int = DEFAULT_WORKERS,
+    stream: bool = False,
+    device: bool = False,
+    fsync: bool = False,
+) -> None:
     """
     Main entry point.
     """
@@ -119,29 +713,86 @@ def copy_mp3_files(source_dir_str: str, target_dir_str: str) -> None:
             print(f"Not a valid directory: {user_path}")
             return
 
+    if device:
+        write_device_files(source_dir=source_dir, target_dir=target_dir, fsync=fsync)
+        return
+
+    if sync:
+        sync_mp3_files(
+            source_dir=source_dir, target_dir=target_dir, workers=workers, stream=stream
+        )
+        return
+
+    if stream:
+        for index, mp3_dir in enumerate(scan_mp3_dirs(source_dir=source_dir), start=1):
+            print(f"Copying {index}: {mp3_dir['path'].name}")
+
+            relative_path = mp3_dir["path"].relative_to(source_dir)
+            copy_dir_files(mp3_dir=mp3_dir, target_mp3_dir=target_dir / relative_path)
+        return
+
     mp3_dirs = get_mp3_dirs(source_dir=source_dir)
 
     total_mp3_dirs = len(mp3_dirs)
     for index, mp3_dir in enumerate(mp3_dirs, start=1):
-        print(f"Copying {index} of {total_mp3_dirs}: {mp3_dir.name}")
+        print(f"Copying {index} of {total_mp3_dirs}: {mp3_dir['path'].name}")
 
-        relative_path = mp3_dir.relative_to(source_dir)
+        relative_path = mp3_dir["path"].relative_to(source_dir)
         target_mp3_dir = target_dir / relative_path
 
-        copy_dir_files(source_mp3_dir=mp3_dir, target_mp3_dir=target_mp3_dir)
+        copy_dir_files(mp3_dir=mp3_dir, target_mp3_dir=target_mp3_dir)
 
 
 if __name__ == "__main__":
     # set up argument parser
     parser = argparse.ArgumentParser(
         description="Copy MP3 files in a sorted order.",
-        usage="python -m tools.copy_mp3_files [SOURCE_DIR] [TARGET_DIR]",
+        usage="python -m tools.copy_mp3_files [SOURCE_DIR] [TARGET_DIR] [OPTIONS]",
         formatter_class=argparse.ArgumentDefaultsHelpFormatter,
     )
     parser.add_argument("source_dir", type=str, help="Source directory.")
     parser.add_argument("target_dir", type=str, help="Target directory.")
+    mode_group = parser.add_mutually_exclusive_group()
+    mode_group.add_argument(
+        "--device",
+        action="store_true",
+        help="Plan the whole target layout and write it in one sequential pass, "
+        "rewriting folders that are not in sorted order. For FAT devices that "
+        "play in directory order.",
+    )
+    mode_group.add_argument(
+        "--sync",
+        action="store_true",
+        help="Only copy new and changed files, tracked by an index in the target "
+        "directory, instead of touching existing files.",
+    )
+    parser.add_argument(
+        "--fsync",
+        action="store_true",
+        help="Flush every folder to the device before writing the next one in "
+        "device mode.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Number of files to copy at once in sync mode.",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Start copying folders as they are found instead of listing them first.",
+    )
 
     # parse arguments
     args = parser.parse_args()
 
-    copy_mp3_files(source_dir_str=args.source_dir, target_dir_str=args.target_dir)
+    copy_mp3_files(
+        source_dir_str=args.source_dir,
+        target_dir_str=args.target_dir,
+        sync=args.sync,
+        workers=args.workers,
+        stream=args.stream,
+        device=args.device,
+        fsync=args.fsync,
+    )
@@ -2,10 +2,122 @@
 Main application.
 """
 
+import queue
 import sys
-from PyQt5 import QtWidgets
+import threading
+import time
+from typing import Dict, List, Optional
+from PyQt5 import QtCore, QtWidgets
 from download_mp3_ui import Ui_MainWindow
-from yt_music.download import download_mp3
+from yt_music.download import FailedTrack, TrackProgress, download_mp3
+
+# number of tracks downloaded at once
+DOWNLOAD_JOBS = 4
+
+# minimum seconds between progress updates of a track, status changes are always sent
+PROGRESS_INTERVAL = 1 / 30
+
+FINISHED_STATUSES = ("done", "skipped", "failed", "cancelled")
+
+
+class DownloadWorker(QtCore.QThread):
+    """
+    Downloads queued albums one after another off the GUI thread and reports
+    progress through signals.
+    """
+
+    albumStarted = QtCore.pyqtSignal(str, int)
+    albumFinished = QtCore.pyqtSignal(str, list, str)
+    trackProgress = QtCore.pyqtSignal(dict)
+
+    def __init__(self, parent: Optional[QtCore.QObject] = None):
+        super().__init__(parent)
+        self.albums: "queue.Queue[Dict]" = queue.Queue()
+        self.cancel_event = threading.Event()
+
+        self._progress_lock = threading.Lock()
+        self._last_progress: Dict[int, tuple] = {}
+
+        # an album queued while the thread was exiting would otherwise wait forever
+        self.finished.connect(self.start_if_pending)
+
+    def enqueue(self, album: Dict) -> int:
+        """
+        Queue an album for download. Returns the number of albums waiting.
+        """
+
+        self.albums.put(album)
+        self.start_if_pending()
+        return self.albums.qsize()
+
+    def start_if_pending(self) -> None:
+        """
+        Start the thread if albums are waiting and it is not running.
+        """
+
+        if not self.isRunning() and not self.albums.empty():
+            self.start()
+
+    def cancel(self) -> None:
+        """
+        Cancel the album being downloaded.
+        """
+
+        self.cancel_event.set()
+
+    def report_progress(self, progress: TrackProgress) -> None:
+        """
+        Forward a track progress update to the GUI, at most every `PROGRESS_INTERVAL`
+        seconds per track unless its status changed.
+        """
+
+        now = time.monotonic()
+        with self._progress_lock:
+            last_status, last_time = self._last_progress.get(
+                progress["track_number"], (None, 0.0)
+            )
+            if (
+                progress["status"] == last_status
+                and now - last_time < PROGRESS_INTERVAL
+            ):
+                return
+            self._last_progress[progress["track_number"]] = (progress["status"], now)
+
+        self.trackProgress.emit(dict(progress))
+
+    def run(self) -> None:
+        """
+        Download albums until the queue is empty.
+        """
+
+        while True:
+            try:
+                album = self.albums.get_nowait()
+            except queue.Empty:
+                return
+
+            self.cancel_event.clear()
+            with self._progress_lock:
+                self._last_progress.clear()
+
+            name = f"{album['artist']} - {album['album']}"
+            self.albumStarted.emit(name, self.albums.qsize())
+
+            failed_tracks: List[FailedTrack] = []
+            error = ""
+            try:
+                failed_tracks = download_mp3(
+                    **album,
+                    jobs=DOWNLOAD_JOBS,
+                    progress_callback=self.report_progress,
+                    cancel_event=self.cancel_event,
+                )
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                error = str(e)
+
+            self.albumFinished.emit(
+                name, [failed_track["title"] for failed_track in failed_tracks], error
+            )
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -14,50 +126,144 @@ class MainWindow(QtWidgets.QMainWindow):
         self.ui = Ui_MainWindow()
         self.ui.setupUi(self)
 
+        self.worker = DownloadWorker(self)
+        self.worker.albumStarted.connect(self.album_started)
+        self.worker.albumFinished.connect(self.album_finished)
+        self.worker.trackProgress.connect(self.track_progress)
+
         self.ui.pushButtonDownload.clicked.connect(self.download)
+        self.ui.pushButtonCancel.clicked.connect(self.cancel)
 
     def download(self):
         """
-        Download video or playlist to MP3.
+        Queue a video or playlist for download to MP3.
         """
 
         youtube_url = self.ui.lineEditUrl.text()
         if not youtube_url:
-            print("Please enter a valid YouTube url.")
+            self.ui.statusbar.showMessage("Please enter a valid YouTube url.")
             return
 
         artist = self.ui.lineEditArtist.text()
         if not artist:
-            print("Please enter a valid artist name.")
+            self.ui.statusbar.showMessage("Please enter a valid artist name.")
             return
 
         album = self.ui.lineEditAlbum.text()
         if not album:
-            print("Please enter a valid album name.")
+            self.ui.statusbar.showMessage("Please enter a valid album name.")
             return
 
         try:
             year = int(self.ui.lineEditYear.text())
         except ValueError:
-            print("Please enter a valid year.")
+            self.ui.statusbar.showMessage("Please enter a valid year.")
             return
 
         artwork_url = self.ui.lineEditArtwork.text()
         if not artwork_url:
             artwork_url = None
 
-        try:
-            download_mp3(
-                youtube_url=youtube_url,
-                artist=artist,
-                album=album,
-                year=year,
-                artwork_url=artwork_url,
+        waiting = self.worker.enqueue(
+            {
+                "youtube_url": youtube_url,
+                "artist": artist,
+                "album": album,
+                "year": year,
+                "artwork_url": artwork_url,
+            }
+        )
+        self.ui.statusbar.showMessage(
+            f"Queued '{artist} - {album}' ({waiting} waiting)."
+        )
+
+    def cancel(self):
+        """
+        Cancel the album being downloaded.
+        """
+
+        self.worker.cancel()
+        self.ui.pushButtonCancel.setEnabled(False)
+        self.ui.labelStatus.setText("Cancelling...")
+
+    def album_started(self, name: str, waiting: int):
+        """
+        Reset the track list for a new album.
+        """
+
+        self.ui.tableWidgetTracks.setRowCount(0)
+        self.ui.progressBarAlbum.setValue(0)
+        self.ui.pushButtonCancel.setEnabled(True)
+        self.ui.labelStatus.setText(f"Downloading '{name}' ({waiting} queued)")
+
+    def album_finished(self, name: str, failed_tracks: List[str], error: str):
+        """
+        Show the result of an album.
+        """
+
+        self.ui.pushButtonCancel.setEnabled(False)
+        if error:
+            self.ui.labelStatus.setText(f"Failed '{name}': {error}")
+        elif failed_tracks:
+            self.ui.labelStatus.setText(
+                f"Finished '{name}' with {len(failed_tracks)} failed tracks."
             )
-            print("Download completed successfully. You may now close the window.")
-        except RuntimeError:
-            print("Something went wrong when trying to download from YouTube.")
-            return
+        else:
+            self.ui.labelStatus.setText(f"Finished '{name}'.")
+
+    def track_progress(self, progress: TrackProgress):
+        """
+        Update the row and album progress for a track.
+        """
+
+        table = self.ui.tableWidgetTracks
+        row = progress["track_number"] - 1
+        if row >= table.rowCount():
+            table.setRowCount(row + 1)
+
+        if table.item(row, 0) is None:
+            table.setItem(
+                row,
+                0,
+                QtWidgets.QTableWidgetItem(
+                    f"{progress['track_number']:02d} - {progress['title']}"
+                ),
+            )
+            table.setCellWidget(row, 1, QtWidgets.QProgressBar())
+
+        progress_bar = table.cellWidget(row, 1)
+        status = progress["status"].capitalize()
+        if progress["status"] == "downloading" and progress["total_bytes"]:
+            progress_bar.setValue(
+                int(100 * progress["downloaded_bytes"] / progress["total_bytes"])
+            )
+            speed = (progress["speed"] or 0) / 1024 / 1024
+            eta = progress["eta"] or 0
+            progress_bar.setFormat(f"{status} %p% {speed:.1f} MiB/s {eta:.0f}s")
+        else:
+            if progress["status"] in ("done", "skipped"):
+                progress_bar.setValue(100)
+            progress_bar.setFormat(status)
+
+        progress_bar.setProperty("status", progress["status"])
+        finished = sum(
+            1
+            for index in range(table.rowCount())
+            if table.cellWidget(index, 1) is not None
+            and table.cellWidget(index, 1).property("status") in FINISHED_STATUSES
+        )
+        self.ui.progressBarAlbum.setValue(int(100 * finished / table.rowCount()))
+
+    def closeEvent(self, event):  # pylint: disable=invalid-name
+        """
+        Cancel downloads before closing the window.
+        """
+
+        while not self.worker.albums.empty():
+            self.worker.albums.get_nowait()
+        self.worker.cancel()
+        self.worker.wait()
+        super().closeEvent(event)
 
 
 if __name__ == "__main__":
@@ -14,7 +14,7 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 class Ui_MainWindow(object):
     def setupUi(self, MainWindow):
         MainWindow.setObjectName("MainWindow")
-        MainWindow.resize(400, 400)
+        MainWindow.resize(400, 700)
         self.centralwidget = QtWidgets.QWidget(MainWindow)
         self.centralwidget.setObjectName("centralwidget")
         self.lineEditArtist = QtWidgets.QLineEdit(self.centralwidget)
@@ -34,13 +34,41 @@ class Ui_MainWindow(object):
         self.lineEditArtwork.setGeometry(QtCore.QRect(50, 250, 300, 30))
         self.lineEditArtwork.setObjectName("lineEditArtwork")
         self.pushButtonDownload = QtWidgets.QPushButton(self.centralwidget)
-        self.pushButtonDownload.setGeometry(QtCore.QRect(150, 300, 100, 30))
+        self.pushButtonDownload.setGeometry(QtCore.QRect(90, 300, 100, 30))
         self.pushButtonDownload.setObjectName("pushButtonDownload")
+        self.pushButtonCancel = QtWidgets.QPushButton(self.centralwidget)
+        self.pushButtonCancel.setEnabled(False)
+        self.pushButtonCancel.setGeometry(QtCore.QRect(210, 300, 100, 30))
+        self.pushButtonCancel.setObjectName("pushButtonCancel")
+        self.labelStatus = QtWidgets.QLabel(self.centralwidget)
+        self.labelStatus.setGeometry(QtCore.QRect(50, 345, 300, 20))
+        self.labelStatus.setObjectName("labelStatus")
+        self.progressBarAlbum = QtWidgets.QProgressBar(self.centralwidget)
+        self.progressBarAlbum.setGeometry(QtCore.QRect(50, 370, 300, 20))
+        self.progressBarAlbum.setProperty("value", 0)
+        self.progressBarAlbum.setObjectName("progressBarAlbum")
+        self.tableWidgetTracks = QtWidgets.QTableWidget(self.centralwidget)
+        self.tableWidgetTracks.setGeometry(QtCore.QRect(50, 400, 300, 250))
+        self.tableWidgetTracks.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.tableWidgetTracks.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.tableWidgetTracks.setObjectName("tableWidgetTracks")
+        self.tableWidgetTracks.setColumnCount(2)
+        self.tableWidgetTracks.setRowCount(0)
+        item = QtWidgets.QTableWidgetItem()
+        self.tableWidgetTracks.setHorizontalHeaderItem(0, item)
+        item = QtWidgets.QTableWidgetItem()
+        self.tableWidgetTracks.setHorizontalHeaderItem(1, item)
+        self.tableWidgetTracks.horizontalHeader().setStretchLastSection(True)
+        self.tableWidgetTracks.verticalHeader().setVisible(False)
         self.lineEditArtist.raise_()
         self.lineEditAlbum.raise_()
         self.lineEditYear.raise_()
         self.lineEditArtwork.raise_()
         self.pushButtonDownload.raise_()
+        self.pushButtonCancel.raise_()
+        self.labelStatus.raise_()
+        self.progressBarAlbum.raise_()
+        self.tableWidgetTracks.raise_()
         self.lineEditUrl.raise_()
         MainWindow.setCentralWidget(self.centralwidget)
         self.menubar = QtWidgets.QMenuBar(MainWindow)
@@ -58,6 +86,8 @@ class Ui_MainWindow(object):
         MainWindow.setTabOrder(self.lineEditAlbum, self.lineEditYear)
         MainWindow.setTabOrder(self.lineEditYear, self.lineEditArtwork)
         MainWindow.setTabOrder(self.lineEditArtwork, self.pushButtonDownload)
+        MainWindow.setTabOrder(self.pushButtonDownload, self.pushButtonCancel)
+        MainWindow.setTabOrder(self.pushButtonCancel, self.tableWidgetTracks)
 
     def retranslateUi(self, MainWindow):
         _translate = QtCore.QCoreApplication.translate
@@ -69,3 +99,9 @@ class Ui_MainWindow(object):
         self.lineEditArtwork.setPlaceholderText(_translate("MainWindow", "(Optional) Enter Artwork URL"))
         self.pushButtonDownload.setText(_translate("MainWindow", "Download"))
         self.pushButtonDownload.setShortcut(_translate("MainWindow", "Ctrl+D"))
+        self.pushButtonCancel.setText(_translate("MainWindow", "Cancel"))
+        self.labelStatus.setText(_translate("MainWindow", "Ready"))
+        item = self.tableWidgetTracks.horizontalHeaderItem(0)
+        item.setText(_translate("MainWindow", "Track"))
+        item = self.tableWidgetTracks.horizontalHeaderItem(1)
+        item.setText(_translate("MainWindow", "Progress"))